@@ -30,7 +30,7 @@ postgres_host = os.getenv("POSTGRES_HOST", "localhost")
 postgres_port = os.getenv("POSTGRES_PORT", "5432")
 postgres_db = os.getenv("POSTGRES_DB", "spectrum_db")
 
-database_url = f"postgresql://{postgres_user}:{postgres_password}@{postgres_host}:{postgres_port}/{postgres_db}"
+database_url = os.getenv("DATABASE_URL") or f"postgresql://{postgres_user}:{postgres_password}@{postgres_host}:{postgres_port}/{postgres_db}"  # Same database as the app
 config.set_main_option("sqlalchemy.url", database_url)
 
 def run_migrations_offline() -> None:
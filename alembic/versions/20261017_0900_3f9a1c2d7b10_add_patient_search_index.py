@@ -0,0 +1,37 @@
+"""add patient search index
+
+Revision ID: 3f9a1c2d7b10
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Must match search.SEARCH_DOCUMENT_SQL exactly or the planner won't use the index
+SEARCH_DOCUMENT_SQL = (
+    "lower(coalesce(patient_number, '') || ' ' || coalesce(first_name, '') || ' ' || "
+    "coalesce(last_name, '') || ' ' || coalesce(medicaid_id, '') || ' ' || "
+    "coalesce(insurance, '') || ' ' || coalesce(diagnosis, '') || ' ' || coalesce(referal, ''))"
+)
+
+# revision identifiers, used by Alembic.
+revision = '3f9a1c2d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_patients_search_trgm "
+            f"ON patients USING gin (({SEARCH_DOCUMENT_SQL}) gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_patients_search_trgm")
@@ -0,0 +1,37 @@
+"""add service sheet indexes
+
+Revision ID: 8c4e2b7d1a52
+Revises: 3f9a1c2d7b10
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4e2b7d1a52'
+down_revision = '3f9a1c2d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keyset pagination on the sheets orders by (service_date, service_time, id)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_services_category_date_time_id", "services",
+            ["service_category", "service_date", "service_time", "id"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_services_patient_date_time_id", "services",
+            ["patient_id", "service_date", "service_time", "id"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_services_patient_date_time_id", table_name="services", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_services_category_date_time_id", table_name="services", postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,120 @@
+"""add patient files manifest
+
+Revision ID: 5b7d2e9c4a13
+Revises: 8c4e2b7d1a52
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import datetime
+from pathlib import Path
+import hashlib
+import mimetypes
+import os
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7d2e9c4a13'
+down_revision = '8c4e2b7d1a52'
+branch_labels = None
+depends_on = None
+
+# Run from the application directory so this matches the app's UPLOAD_DIR
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+INGEST_BATCH_SIZE = 500
+
+patient_files = sa.table(
+    "patient_files",
+    sa.column("id", sa.String),
+    sa.column("patient_id", sa.Integer),
+    sa.column("filename", sa.String),
+    sa.column("stored_name", sa.String),
+    sa.column("size", sa.BigInteger),
+    sa.column("content_type", sa.String),
+    sa.column("sha256", sa.String),
+    sa.column("created_at", sa.DateTime),
+)
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _legacy_files(patient_ids: set, known_ids: set):
+    """Manifest rows for the files in uploads/<patient_id>/, with names from the .meta sidecars"""
+    if not UPLOAD_DIR.is_dir():
+        return
+    for folder in sorted(UPLOAD_DIR.iterdir()):
+        if not folder.is_dir() or not folder.name.isdigit():
+            continue
+        patient_id = int(folder.name)
+        if patient_id not in patient_ids:
+            print(f"⚠️ Skipping {folder}: no patient {patient_id}")
+            continue
+        for path in sorted(folder.iterdir()):
+            if not path.is_file() or path.suffix == ".meta" or path.stem in known_ids:
+                continue
+            meta_path = folder / f"{path.stem}.meta"
+            filename = meta_path.read_text(encoding="utf-8").strip() if meta_path.exists() else path.name
+            stat = path.stat()
+            yield {
+                "id": path.stem,
+                "patient_id": patient_id,
+                "filename": filename,
+                "stored_name": path.name,
+                "size": stat.st_size,
+                "content_type": mimetypes.guess_type(filename)[0] or "application/octet-stream",
+                "sha256": _sha256(path),
+                "created_at": datetime.utcfromtimestamp(stat.st_mtime),
+            }
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    # The app's create_all() may already have created the table
+    if not sa.inspect(conn).has_table("patient_files"):
+        op.create_table(
+            "patient_files",
+            sa.Column("id", sa.String(length=36), primary_key=True),
+            sa.Column("patient_id", sa.Integer(), sa.ForeignKey("patients.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("filename", sa.String(), nullable=False),
+            sa.Column("stored_name", sa.String(), nullable=False),
+            sa.Column("size", sa.BigInteger(), nullable=False),
+            sa.Column("content_type", sa.String(), nullable=False),
+            sa.Column("sha256", sa.String(length=64), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_patient_files_patient_created", "patient_files", ["patient_id", "created_at"])
+
+    # One-time ingest of the existing uploads/ tree. Already-ingested files are skipped, so
+    # re-running is safe. The .meta sidecars are left on disk (no longer read) for downgrade.
+    patient_ids = set(conn.scalars(sa.text("SELECT id FROM patients")))
+    known_ids = set(conn.scalars(sa.text("SELECT id FROM patient_files")))
+    batch, ingested = [], 0
+    for row in _legacy_files(patient_ids, known_ids):
+        batch.append(row)
+        if len(batch) >= INGEST_BATCH_SIZE:
+            conn.execute(patient_files.insert(), batch)
+            ingested += len(batch)
+            batch = []
+    if batch:
+        conn.execute(patient_files.insert(), batch)
+        ingested += len(batch)
+    print(f"📎 Ingested {ingested} uploaded file(s) into patient_files")
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    # Restore the .meta sidecars the old file endpoints read original names from
+    for patient_id, file_id, filename in conn.execute(sa.text("SELECT patient_id, id, filename FROM patient_files")):
+        folder = UPLOAD_DIR / str(patient_id)
+        meta_path = folder / f"{file_id}.meta"
+        if folder.is_dir() and not meta_path.exists():
+            meta_path.write_text(filename, encoding="utf-8")
+    op.drop_index("ix_patient_files_patient_created", table_name="patient_files")
+    op.drop_table("patient_files")
@@ -0,0 +1,97 @@
+"""add content-addressed upload blobs
+
+Revision ID: 9e1f6a3b8c27
+Revises: 5b7d2e9c4a13
+Create Date: 2026-10-17 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from pathlib import Path
+import os
+import shutil
+
+
+# revision identifiers, used by Alembic.
+revision = '9e1f6a3b8c27'
+down_revision = '5b7d2e9c4a13'
+branch_labels = None
+depends_on = None
+
+# Run from the application directory so these match uploads.UPLOAD_DIR / blob_path()
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+BLOB_DIR = UPLOAD_DIR / "blobs"
+FK_NAME = "fk_patient_files_sha256_upload_blobs"
+
+
+def _blob_path(sha256: str) -> Path:
+    return BLOB_DIR / sha256[:2] / sha256[2:4] / sha256
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    if not sa.inspect(conn).has_table("upload_blobs"):
+        op.create_table(
+            "upload_blobs",
+            sa.Column("sha256", sa.String(length=64), primary_key=True),
+            sa.Column("size", sa.BigInteger(), nullable=False),
+            sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+        )
+
+    # Move every stored file into the blob store; later copies of the same content are deleted
+    moved = deduplicated = 0
+    for patient_id, file_id, stored_name, sha256 in conn.execute(
+        sa.text("SELECT patient_id, id, stored_name, sha256 FROM patient_files ORDER BY created_at, id")
+    ):
+        folder = UPLOAD_DIR / str(patient_id)
+        source = folder / stored_name
+        blob = _blob_path(sha256)
+        if source.is_file():
+            if blob.exists():
+                source.unlink()
+                deduplicated += 1
+            else:
+                blob.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(source, blob)
+                moved += 1
+        (folder / f"{file_id}.meta").unlink(missing_ok=True)
+    print(f"📎 Moved {moved} file(s) into {BLOB_DIR}, removed {deduplicated} duplicate(s)")
+
+    # Reference counts are derived from the manifest, so re-running recomputes them
+    conn.execute(sa.text("DELETE FROM upload_blobs"))
+    conn.execute(sa.text(
+        "INSERT INTO upload_blobs (sha256, size, ref_count, created_at) "
+        "SELECT sha256, MAX(size), COUNT(*), MIN(created_at) FROM patient_files GROUP BY sha256"
+    ))
+
+    with op.batch_alter_table("patient_files") as batch:
+        batch.drop_column("stored_name")
+        batch.create_foreign_key(FK_NAME, "upload_blobs", ["sha256"], ["sha256"])
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    with op.batch_alter_table("patient_files") as batch:
+        batch.drop_constraint(FK_NAME, type_="foreignkey")
+        batch.add_column(sa.Column("stored_name", sa.String(), nullable=True))
+
+    # Give every patient its own copy again, named <file id><original extension>
+    for patient_id, file_id, filename, sha256 in conn.execute(
+        sa.text("SELECT patient_id, id, filename, sha256 FROM patient_files")
+    ):
+        stored_name = f"{file_id}{Path(filename).suffix}"
+        folder = UPLOAD_DIR / str(patient_id)
+        folder.mkdir(parents=True, exist_ok=True)
+        if _blob_path(sha256).is_file():
+            shutil.copyfile(_blob_path(sha256), folder / stored_name)
+        (folder / f"{file_id}.meta").write_text(filename, encoding="utf-8")
+        conn.execute(
+            sa.text("UPDATE patient_files SET stored_name = :stored_name WHERE id = :id"),
+            {"stored_name": stored_name, "id": file_id},
+        )
+
+    with op.batch_alter_table("patient_files") as batch:
+        batch.alter_column("stored_name", existing_type=sa.String(), nullable=False)
+    op.drop_table("upload_blobs")
+    shutil.rmtree(BLOB_DIR, ignore_errors=True)
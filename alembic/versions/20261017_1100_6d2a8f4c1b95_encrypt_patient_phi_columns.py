@@ -0,0 +1,110 @@
+"""encrypt patient phi columns
+
+Revision ID: 6d2a8f4c1b95
+Revises: 9e1f6a3b8c27
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Run from the application directory with the app's ENCRYPTION_KEY (and BLIND_INDEX_KEY, if set)
+import phi
+import search
+
+
+# revision identifiers, used by Alembic.
+revision = '6d2a8f4c1b95'
+down_revision = '9e1f6a3b8c27'
+branch_labels = None
+depends_on = None
+
+ENCRYPTED_FIELDS = ["first_name", "last_name", "ssn", "medicaid_id", "insurance_id", "diagnosis"]
+BATCH_SIZE = 500
+
+# Must match search.SEARCH_DOCUMENT_SQL exactly or the planner won't use the index
+SEARCH_DOCUMENT_SQL = "lower(coalesce(patient_number, '') || ' ' || coalesce(insurance, '') || ' ' || coalesce(referal, ''))"
+PREVIOUS_SEARCH_DOCUMENT_SQL = (
+    "lower(coalesce(patient_number, '') || ' ' || coalesce(first_name, '') || ' ' || "
+    "coalesce(last_name, '') || ' ' || coalesce(medicaid_id, '') || ' ' || "
+    "coalesce(insurance, '') || ' ' || coalesce(diagnosis, '') || ' ' || coalesce(referal, ''))"
+)
+
+patients = sa.table("patients", sa.column("id", sa.Integer), *(sa.column(field, sa.String) for field in ENCRYPTED_FIELDS))
+patient_search_tokens = sa.table("patient_search_tokens", sa.column("token", sa.String), sa.column("patient_id", sa.Integer))
+
+
+def _rewrite_patients(conn, transform, rebuild_tokens: bool) -> int:
+    """Rewrite the PHI columns batch by batch (keyset on id), optionally rebuilding blind-index tokens"""
+    columns = ", ".join(ENCRYPTED_FIELDS)
+    update = (
+        patients.update()
+        .where(patients.c.id == sa.bindparam("row_id"))
+        .values({field: sa.bindparam(field) for field in ENCRYPTED_FIELDS})
+    )
+    last_id, rewritten = 0, 0
+    while True:
+        rows = conn.execute(
+            sa.text(f"SELECT id, {columns} FROM patients WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).all()
+        if not rows:
+            return rewritten
+        updates, tokens = [], []
+        for row in rows:
+            plaintext = dict(zip(ENCRYPTED_FIELDS, phi.decrypt_many(row[1:])))
+            if phi.UNDECRYPTABLE in plaintext.values():
+                # Writing it back would replace the ciphertext with the marker
+                raise RuntimeError(f"Patient {row[0]} holds PHI the configured ENCRYPTION_KEYS cannot decrypt")
+            updates.append({"row_id": row[0], **{field: transform(value) for field, value in plaintext.items()}})
+            if rebuild_tokens:
+                tokens.extend(search.search_token_rows(row[0], plaintext))
+        conn.execute(update, updates)
+        if rebuild_tokens:
+            conn.execute(patient_search_tokens.delete().where(patient_search_tokens.c.patient_id.in_([r[0] for r in rows])))
+            if tokens:
+                conn.execute(patient_search_tokens.insert(), tokens)
+        rewritten += len(rows)
+        last_id = rows[-1][0]
+
+
+def _recreate_search_index(document_sql: str) -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_patients_search_trgm")
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_patients_search_trgm "
+            f"ON patients USING gin (({document_sql}) gin_trgm_ops)"
+        )
+
+
+def upgrade() -> None:
+    if phi.EPHEMERAL_KEY:
+        raise RuntimeError("Set ENCRYPTION_KEY before encrypting patient data (a generated key would be lost)")
+
+    conn = op.get_bind()
+    # The app's create_all() may already have created the table
+    if not sa.inspect(conn).has_table("patient_search_tokens"):
+        op.create_table(
+            "patient_search_tokens",
+            sa.Column("token", sa.String(length=32), primary_key=True),
+            sa.Column("patient_id", sa.Integer(), sa.ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True),
+        )
+        op.create_index("ix_patient_search_tokens_patient_id", "patient_search_tokens", ["patient_id"])
+
+    # Every value is decrypted first (plaintext passes through), so re-running is safe
+    encrypted = _rewrite_patients(conn, phi.encrypt, rebuild_tokens=True)
+    print(f"🔐 Encrypted PHI columns and built blind indexes for {encrypted} patient(s)")
+
+    _recreate_search_index(SEARCH_DOCUMENT_SQL)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    decrypted = _rewrite_patients(conn, lambda value: value, rebuild_tokens=False)
+    print(f"🔓 Decrypted PHI columns for {decrypted} patient(s)")
+    op.drop_index("ix_patient_search_tokens_patient_id", table_name="patient_search_tokens")
+    op.drop_table("patient_search_tokens")
+    _recreate_search_index(PREVIOUS_SEARCH_DOCUMENT_SQL)
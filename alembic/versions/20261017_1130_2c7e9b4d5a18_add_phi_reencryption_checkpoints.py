@@ -0,0 +1,37 @@
+"""add phi reencryption checkpoints
+
+Revision ID: 2c7e9b4d5a18
+Revises: 6d2a8f4c1b95
+Create Date: 2026-10-17 11:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c7e9b4d5a18'
+down_revision = '6d2a8f4c1b95'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The app's create_all() may already have created the table
+    if sa.inspect(op.get_bind()).has_table("phi_reencryption_checkpoints"):
+        return
+    op.create_table(
+        "phi_reencryption_checkpoints",
+        sa.Column("target", sa.String(), primary_key=True),
+        sa.Column("key_id", sa.String(length=12), nullable=False),
+        sa.Column("last_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("rows_scanned", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("rows_rewritten", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("phi_reencryption_checkpoints")
@@ -0,0 +1,69 @@
+"""add authorization usage ledger
+
+Revision ID: 7a3d9c5e2f64
+Revises: 2c7e9b4d5a18
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3d9c5e2f64'
+down_revision = '2c7e9b4d5a18'
+branch_labels = None
+depends_on = None
+
+
+# Same allocation rule as authorization_ledger.reconcile(): each attended service uses a
+# unit of the covering authorization that started last (then the newest)
+BACKFILL_USAGE = """
+INSERT INTO authorization_usage (service_id, authorization_id)
+SELECT service_id, authorization_id FROM (
+    SELECT s.id AS service_id, (
+        SELECT a.id FROM authorizations a
+        WHERE a.patient_id = s.patient_id
+          AND (a.auth_start_date IS NULL OR a.auth_start_date <= s.service_date)
+          AND (a.auth_end_date IS NULL OR a.auth_end_date >= s.service_date)
+        ORDER BY a.auth_start_date DESC NULLS LAST, a.id DESC
+        LIMIT 1
+    ) AS authorization_id
+    FROM services s
+    WHERE s.attended = TRUE
+) charged
+WHERE authorization_id IS NOT NULL
+"""
+
+BACKFILL_UNITS_USED = """
+UPDATE authorizations SET units_used = (
+    SELECT COUNT(*) FROM authorization_usage u WHERE u.authorization_id = authorizations.id
+)
+"""
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    # The app's create_all() may already have created the table (but never adds columns)
+    if "units_used" not in {c["name"] for c in inspector.get_columns("authorizations")}:
+        with op.batch_alter_table("authorizations") as batch:
+            batch.add_column(sa.Column("units_used", sa.Integer(), nullable=False, server_default="0"))
+    if not inspector.has_table("authorization_usage"):
+        op.create_table(
+            "authorization_usage",
+            sa.Column("service_id", sa.Integer(), sa.ForeignKey("services.id", ondelete="CASCADE"), primary_key=True),
+            sa.Column("authorization_id", sa.Integer(), sa.ForeignKey("authorizations.id", ondelete="CASCADE"), nullable=False),
+        )
+        op.create_index("ix_authorization_usage_authorization_id", "authorization_usage", ["authorization_id"])
+
+    # Charge the services attended so far (rebuilt from scratch, so re-running is safe)
+    op.execute("DELETE FROM authorization_usage")
+    op.execute(BACKFILL_USAGE)
+    op.execute(BACKFILL_UNITS_USED)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_authorization_usage_authorization_id", table_name="authorization_usage")
+    op.drop_table("authorization_usage")
+    with op.batch_alter_table("authorizations") as batch:
+        batch.drop_column("units_used")
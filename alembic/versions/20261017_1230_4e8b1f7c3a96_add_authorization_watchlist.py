@@ -0,0 +1,67 @@
+"""add authorization watchlist indexes and snapshot tables
+
+Revision ID: 4e8b1f7c3a96
+Revises: 7a3d9c5e2f64
+Create Date: 2026-10-17 12:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8b1f7c3a96'
+down_revision = '7a3d9c5e2f64'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = {
+    "ix_authorizations_end_date_id": ("authorizations", ["auth_end_date", "id"]),
+    "ix_patients_auth_end_date_id": ("patients", ["auth_end_date", "id"]),
+    # Per-patient authorization lookups (patient view, ledger, "has no authorizations" check)
+    "ix_authorizations_patient_id": ("authorizations", ["patient_id"]),
+}
+
+
+def upgrade() -> None:
+    # Watchlist window queries range-scan auth_end_date and return rows in (auth_end_date, id) order
+    with op.get_context().autocommit_block():
+        for name, (table, columns) in INDEXES.items():
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+    # The app's create_all() may already have created the tables
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table("authorization_watchlist_snapshots"):
+        op.create_table(
+            "authorization_watchlist_snapshots",
+            sa.Column("snapshot_date", sa.Date(), primary_key=True),
+            sa.Column("computed_at", sa.DateTime(), nullable=False),
+            sa.Column("expiry_days", sa.Integer(), nullable=False),
+            sa.Column("low_units", sa.Integer(), nullable=False),
+            sa.Column("entries", sa.Integer(), nullable=False, server_default="0"),
+        )
+    if not inspector.has_table("authorization_watchlist_entries"):
+        op.create_table(
+            "authorization_watchlist_entries",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("authorization_id", sa.Integer(), nullable=True),
+            sa.Column("patient_id", sa.Integer(), sa.ForeignKey("patients.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("auth_number", sa.String(), nullable=True),
+            sa.Column("auth_start_date", sa.Date(), nullable=True),
+            sa.Column("auth_end_date", sa.Date(), nullable=True),
+            sa.Column("auth_units", sa.Integer(), nullable=True),
+            sa.Column("units_used", sa.Integer(), nullable=True),
+            sa.Column("expiring", sa.Boolean(), nullable=False, server_default=sa.false()),
+            sa.Column("low_balance", sa.Boolean(), nullable=False, server_default=sa.false()),
+        )
+        op.create_index("ix_authorization_watchlist_entries_end_date_id", "authorization_watchlist_entries", ["auth_end_date", "id"])
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, (table, _) in INDEXES.items():
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    op.drop_index("ix_authorization_watchlist_entries_end_date_id", table_name="authorization_watchlist_entries")
+    op.drop_table("authorization_watchlist_entries")
+    op.drop_table("authorization_watchlist_snapshots")
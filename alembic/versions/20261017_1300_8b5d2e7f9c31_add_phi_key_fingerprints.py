@@ -0,0 +1,33 @@
+"""add phi key fingerprints
+
+Revision ID: 8b5d2e7f9c31
+Revises: 4e8b1f7c3a96
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5d2e7f9c31'
+down_revision = '4e8b1f7c3a96'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The app's create_all() may already have created the table. The blind-index key
+    # fingerprint is recorded by the app on its next start (phi_rotation.verify_keys)
+    if sa.inspect(op.get_bind()).has_table("phi_key_fingerprints"):
+        return
+    op.create_table(
+        "phi_key_fingerprints",
+        sa.Column("purpose", sa.String(), primary_key=True),
+        sa.Column("key_id", sa.String(length=12), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("phi_key_fingerprints")
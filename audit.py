@@ -0,0 +1,246 @@
+# --- HIPAA Audit Log Pipeline ---
+# Request threads only enqueue audit records (QueueHandler). A QueueListener thread
+# writes them to disk; a sync thread fsyncs the file at a fixed interval, so many
+# events share one fsync instead of each request paying for a flush.
+# Several worker processes may share one audit file: writes are O_APPEND, rotation is
+# serialized with a lock file, and a worker that finds the file rotated reopens it.
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import date
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process only
+    fcntl = None
+
+class AuditFileHandler(logging.FileHandler):
+    """
+    Append-only audit file handler with size- and date-based rotation.
+
+    Rotated files are renamed to <file>.<YYYY-MM-DD>.<n> and never deleted here;
+    retention is handled outside the application (see AUDIT_LOG_RETENTION_DAYS).
+    """
+
+    def __init__(self, filename: str, max_bytes: int = 0, encoding: str = "utf-8"):
+        super().__init__(filename, mode="a", encoding=encoding)
+        self.max_bytes = max_bytes
+        self._file_date = self._current_file_date()
+        self._dirty = False
+
+    def _current_file_date(self) -> date:
+        try:
+            return date.fromtimestamp(os.path.getmtime(self.baseFilename))
+        except OSError:
+            return date.today()
+
+    def should_rollover(self, message: str) -> bool:
+        if self.stream is None:
+            return False
+        if date.today() != self._file_date:
+            return True
+        if self.max_bytes > 0:
+            self.stream.seek(0, 2)
+            if self.stream.tell() + len(message) + 1 > self.max_bytes:
+                return True
+        return False
+
+    def _rotated_elsewhere(self) -> bool:
+        """True if another process renamed the file out from under our open stream"""
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _reopen(self):
+        self._sync_locked()
+        self.stream.close()
+        self.stream = self._open()
+        self._file_date = self._current_file_date()
+
+    def do_rollover(self):
+        lock_file = None
+        if fcntl is not None:
+            lock_file = open(f"{self.baseFilename}.lock", "a")
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if self._rotated_elsewhere():
+                # Another worker rotated first; just follow it to the new file
+                self._reopen()
+                return
+
+            self._sync_locked()
+            self.stream.close()
+            self.stream = None
+
+            suffix = 1
+            while True:
+                rotated = f"{self.baseFilename}.{self._file_date.isoformat()}.{suffix}"
+                if not os.path.exists(rotated):
+                    break
+                suffix += 1
+            os.rename(self.baseFilename, rotated)
+
+            self.stream = self._open()
+            self._file_date = date.today()
+        finally:
+            if lock_file is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def reopen_after_fork(self):
+        """Give a forked worker its own file descriptor"""
+        self.acquire()
+        try:
+            if self.stream is not None:
+                # Not closed: the inherited object shares the parent's descriptor, and
+                # emit() flushes after every record so it holds no unwritten data
+                self.stream = self._open()
+            self._dirty = False
+        finally:
+            self.release()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            message = self.format(record)
+            if self.stream is not None and self._rotated_elsewhere():
+                self._reopen()
+            if self.should_rollover(message):
+                self.do_rollover()
+            self.stream.write(message + self.terminator)
+            # Hand the data to the OS now; fsync is batched by sync()
+            self.stream.flush()
+            self._dirty = True
+        except Exception:
+            self.handleError(record)
+
+    def _sync_locked(self):
+        if self._dirty and self.stream is not None:
+            self.stream.flush()
+            os.fsync(self.stream.fileno())
+            self._dirty = False
+
+    def sync(self):
+        """fsync everything written since the last sync"""
+        self.acquire()
+        try:
+            self._sync_locked()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            self._sync_locked()
+        finally:
+            self.release()
+        super().close()
+
+class AuditQueueListener(logging.handlers.QueueListener):
+    """QueueListener whose stop() waits a bounded time, then drains the rest itself"""
+
+    def stop(self, timeout: float = None):
+        if self._thread is None:
+            return
+        self.enqueue_sentinel()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # Writer is stuck; write what is left from this thread so nothing is lost
+            while True:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is not self._sentinel:
+                    self.handle(record)
+        self._thread = None
+
+class AuditQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues while the pipeline runs; writes synchronously before start/after stop"""
+
+    def __init__(self, pipeline: "AuditPipeline"):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+
+    def emit(self, record: logging.LogRecord):
+        if self.pipeline.running:
+            super().emit(record)
+        else:
+            self.pipeline.file_handler.handle(record)
+            self.pipeline.file_handler.sync()
+
+class AuditPipeline:
+    """Queue-based, non-blocking audit writer with interval fsync and bounded shutdown"""
+
+    def __init__(self, filename: str, max_bytes: int = 0, fsync_interval: float = 1.0,
+                 shutdown_timeout: float = 5.0, formatter: logging.Formatter = None):
+        self.fsync_interval = fsync_interval
+        self.shutdown_timeout = shutdown_timeout
+        # Unbounded on purpose: audit events are never dropped under load
+        self.queue = queue.Queue(-1)
+        self.file_handler = AuditFileHandler(filename, max_bytes=max_bytes)
+        if formatter:
+            self.file_handler.setFormatter(formatter)
+        self.queue_handler = AuditQueueHandler(self)
+        self.listener = AuditQueueListener(self.queue, self.file_handler, respect_handler_level=True)
+        self.running = False
+        self._stop = threading.Event()
+        self._sync_thread = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _after_fork_in_child(self):
+        """Threads do not survive fork(): rebuild the queue and restart the writer in the worker"""
+        was_running = self.running
+        self.running = False
+        self.queue = queue.Queue(-1)
+        self.queue_handler.queue = self.queue
+        self.listener = AuditQueueListener(self.queue, self.file_handler, respect_handler_level=True)
+        self._stop = threading.Event()
+        self._sync_thread = None
+        self.file_handler.reopen_after_fork()
+        if was_running:
+            atexit.unregister(self.stop)
+            self.start()
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            self.file_handler.sync()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.listener.start()
+        self._sync_thread = threading.Thread(target=self._sync_loop, name="hipaa-audit-sync", daemon=True)
+        self._sync_thread.start()
+        self.running = True
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Drain and fsync all pending events, waiting at most shutdown_timeout"""
+        if not self.running:
+            return
+        # New events are written synchronously from here on
+        self.running = False
+        deadline = time.monotonic() + self.shutdown_timeout
+
+        self.listener.stop(timeout=self.shutdown_timeout)
+        # Catch records enqueued while the listener was shutting down
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is not self.listener._sentinel:
+                self.file_handler.handle(record)
+        self._stop.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join(max(0.0, deadline - time.monotonic()))
+            self._sync_thread = None
+        self.file_handler.sync()
+        atexit.unregister(self.stop)
@@ -4,27 +4,45 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Cookie, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, SessionLocal
+import audit
+import hashing
 import models
+import phi
 import schemas
 import os
 import re
 import logging
 import hashlib
 import secrets
-from cryptography.fernet import Fernet
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# HIPAA Compliance Logging
+# HIPAA Compliance Logging - events are queued and written/fsynced off the request thread
+AUDIT_LOG_FILE = os.getenv("AUDIT_LOG_FILE", "hipaa_audit.log")
+AUDIT_LOG_MAX_BYTES = int(os.getenv("AUDIT_LOG_MAX_BYTES", 50 * 1024 * 1024))  # Rotate by size (and daily)
+AUDIT_FSYNC_INTERVAL_SECONDS = float(os.getenv("AUDIT_FSYNC_INTERVAL_SECONDS", 1.0))  # Batched fsync interval
+AUDIT_SHUTDOWN_TIMEOUT_SECONDS = float(os.getenv("AUDIT_SHUTDOWN_TIMEOUT_SECONDS", 5.0))  # Max wait to drain at shutdown
+
 hipaa_logger = logging.getLogger("hipaa_audit")
 hipaa_logger.setLevel(logging.INFO)
-handler = logging.FileHandler("hipaa_audit.log")
 formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-hipaa_logger.addHandler(handler)
+audit_pipeline = audit.AuditPipeline(
+    AUDIT_LOG_FILE,
+    max_bytes=AUDIT_LOG_MAX_BYTES,
+    fsync_interval=AUDIT_FSYNC_INTERVAL_SECONDS,
+    shutdown_timeout=AUDIT_SHUTDOWN_TIMEOUT_SECONDS,
+    formatter=formatter
+)
+hipaa_logger.addHandler(audit_pipeline.queue_handler)
+audit_pipeline.start()
 
 # Security Configuration - HIPAA Compliant
 SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
@@ -35,26 +53,13 @@ MAX_LOGIN_ATTEMPTS = int(os.getenv("MAX_LOGIN_ATTEMPTS", 3))  # Account lockout
 LOCKOUT_DURATION_MINUTES = int(os.getenv("LOCKOUT_DURATION_MINUTES", 15))  # Lockout period
 PASSWORD_MIN_LENGTH = int(os.getenv("PASSWORD_MIN_LENGTH", 12))  # HIPAA requires strong passwords
 SESSION_TIMEOUT_MINUTES = int(os.getenv("SESSION_TIMEOUT_MINUTES", 60))  # Auto-logout after inactivity
+SESSION_CACHE_TTL_SECONDS = int(os.getenv("SESSION_CACHE_TTL_SECONDS", 30))  # How long a verified session skips the DB
+SESSION_CACHE_REVALIDATE_SECONDS = float(os.getenv("SESSION_CACHE_REVALIDATE_SECONDS", 5))  # Re-check a cached session against the users row this often (0 = every request)
+SESSION_ACTIVITY_FLUSH_SECONDS = int(os.getenv("SESSION_ACTIVITY_FLUSH_SECONDS", 5))  # last_activity write-back interval
 
-# Encryption key for PHI data (should be stored securely)
-ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
-if not ENCRYPTION_KEY:
-    # Generate a new key if none exists
-    ENCRYPTION_KEY = Fernet.generate_key().decode()
-    print(f"⚠️  Generated new encryption key: {ENCRYPTION_KEY}")
-    print("⚠️  Add this to your .env file: ENCRYPTION_KEY=" + ENCRYPTION_KEY)
-
-try:
-    if isinstance(ENCRYPTION_KEY, str):
-        cipher_suite = Fernet(ENCRYPTION_KEY.encode())
-    else:
-        cipher_suite = Fernet(ENCRYPTION_KEY)
-except Exception as e:
-    print(f"⚠️  Invalid encryption key, generating new one: {e}")
-    ENCRYPTION_KEY = Fernet.generate_key().decode()
-    cipher_suite = Fernet(ENCRYPTION_KEY.encode())
-    print(f"⚠️  New encryption key: {ENCRYPTION_KEY}")
-    print("⚠️  Update your .env file: ENCRYPTION_KEY=" + ENCRYPTION_KEY)
+# PHI encryption keys are loaded by phi.py (shared with the encrypted model columns)
+ENCRYPTION_KEY = phi.ENCRYPTION_KEY
+cipher_suite = phi.cipher_suite
 
 # Password hashing - Enhanced for HIPAA
 pwd_context = CryptContext(
@@ -63,6 +68,16 @@ pwd_context = CryptContext(
     bcrypt__rounds=12  # Increased rounds for better security
 )
 
+# bcrypt runs on a bounded pool, off the event loop (see hashing.py)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))  # Concurrent hashes
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 64))  # Beyond this, logins get a 503
+password_pool = hashing.PasswordHashPool(
+    pwd_context,
+    max_workers=PASSWORD_HASH_WORKERS,
+    max_pending=PASSWORD_HASH_MAX_PENDING
+)
+PasswordHashPoolBusy = hashing.PasswordHashPoolBusy
+
 # OAuth2 scheme
 security = HTTPBearer(auto_error=False)
 
@@ -94,18 +109,11 @@ def validate_password_strength(password: str) -> bool:
 
 def encrypt_phi_data(data: str) -> str:
     """Encrypt PHI data for storage"""
-    if not data:
-        return data
-    return cipher_suite.encrypt(data.encode()).decode()
+    return phi.encrypt(data)
 
 def decrypt_phi_data(encrypted_data: str) -> str:
     """Decrypt PHI data for use"""
-    if not encrypted_data:
-        return encrypted_data
-    try:
-        return cipher_suite.decrypt(encrypted_data.encode()).decode()
-    except:
-        return encrypted_data  # Return as-is if decryption fails (for backward compatibility)
+    return phi.decrypt(encrypted_data)  # Returns non-ciphertext as-is (for backward compatibility)
 
 def hash_identifier(data: str) -> str:
     """Create a hash of sensitive identifiers for audit purposes"""
@@ -113,11 +121,19 @@ def hash_identifier(data: str) -> str:
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_pool.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    return password_pool.hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a plain password against its hash without blocking the event loop"""
+    return await password_pool.verify_async(plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await password_pool.hash_async(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token with enhanced security"""
@@ -203,6 +219,7 @@ def handle_successful_login(db: Session, user: models.User, ip_address: str = No
     user.last_activity = datetime.utcnow()  # Update last activity on successful login
     user.last_login_ip = ip_address
     db.commit()
+    session_cache.touch(user.id, user.last_activity)
     log_hipaa_event("SUCCESSFUL_LOGIN", user.username, "User logged in successfully", ip_address)
 
 def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
@@ -213,8 +230,8 @@ def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
     """Get user by email"""
     return db.query(models.User).filter(models.User.email == email).first()
 
-def authenticate_user(db: Session, username: str, password: str, ip_address: str = None) -> Optional[models.User]:
-    """Authenticate user with username/email and password - HIPAA compliant"""
+def _load_login_user(db: Session, username: str, ip_address: str = None) -> Optional[models.User]:
+    """Look up the user for a login attempt and enforce lockout"""
     # Try username first
     user = get_user_by_username(db, username)
     if not user:
@@ -229,8 +246,11 @@ def authenticate_user(db: Session, username: str, password: str, ip_address: str
     if check_account_lockout(db, user):
         log_hipaa_event("LOGIN_BLOCKED", user.username, "Account locked", ip_address)
         raise AuthError("Account is temporarily locked due to multiple failed login attempts", 423)
-    
-    if not verify_password(password, user.hashed_password):
+    return user
+
+def _finish_login(db: Session, user: models.User, password_ok: bool, ip_address: str = None) -> Optional[models.User]:
+    """Record the outcome of a login attempt once the password has been checked"""
+    if not password_ok:
         handle_failed_login(db, user, ip_address)
         return None
     
@@ -241,8 +261,23 @@ def authenticate_user(db: Session, username: str, password: str, ip_address: str
     handle_successful_login(db, user, ip_address)
     return user
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    """Create a new user with HIPAA compliance validation"""
+def authenticate_user(db: Session, username: str, password: str, ip_address: str = None) -> Optional[models.User]:
+    """Authenticate user with username/email and password - HIPAA compliant"""
+    user = _load_login_user(db, username, ip_address)
+    if not user:
+        return None
+    return _finish_login(db, user, verify_password(password, user.hashed_password), ip_address)
+
+async def authenticate_user_async(db: Session, username: str, password: str, ip_address: str = None) -> Optional[models.User]:
+    """authenticate_user for async routes: DB work on the threadpool, bcrypt on the hashing pool"""
+    user = await run_in_threadpool(_load_login_user, db, username, ip_address)
+    if not user:
+        return None
+    password_ok = await verify_password_async(password, user.hashed_password)
+    return await run_in_threadpool(_finish_login, db, user, password_ok, ip_address)
+
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str = None) -> models.User:
+    """Create a new user with HIPAA compliance validation (pass hashed_password if already hashed)"""
     # Validate password strength
     # Password validation is now handled in main.py
     
@@ -254,7 +289,8 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     if get_user_by_email(db, user.email):
         raise AuthError("Email already exists", 400)
     
-    hashed_password = get_password_hash(user.password)
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -271,13 +307,175 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     log_hipaa_event("USER_CREATED", user.username, f"New user created with role: {user.role}")
     return db_user
 
-async def get_current_user(
+class SessionCache:
+    """
+    In-memory cache of verified sessions keyed by token jti.
+
+    Holds a snapshot of the user row (without the password hash) so authenticated
+    requests skip loading the full user, and tracks last activity per user so the
+    per-request last_activity write becomes a batched background UPDATE.
+
+    The cache is per process. invalidate_user() clears this worker at once; other
+    workers re-check each cached session against is_active, role and a digest of the
+    password hash at most every SESSION_CACHE_REVALIDATE_SECONDS (one primary key read,
+    see is_current), so a user disabled, deleted, demoted or reset on another worker is
+    locked out there within that interval.
+    """
+
+    # Columns copied into the snapshot; the password hash never enters the cache
+    SNAPSHOT_COLUMNS = [c.key for c in models.User.__table__.columns if c.key != "hashed_password"]
+
+    def __init__(self, ttl_seconds: int = SESSION_CACHE_TTL_SECONDS, flush_seconds: int = SESSION_ACTIVITY_FLUSH_SECONDS,
+                 revalidate_seconds: float = SESSION_CACHE_REVALIDATE_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.flush_seconds = flush_seconds
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        self._sessions = {}         # jti -> [expires_at, snapshot dict, password stamp, revalidate_at] (monotonic times)
+        self._activity = {}         # user id -> latest known activity time
+        self._pending_activity = {} # user id -> activity time not yet written to the DB
+        self._stop = threading.Event()
+        self._flusher = None
+
+    def get(self, jti: str) -> Optional[models.User]:
+        """Return a detached User built from the cached snapshot, or None on miss/expiry"""
+        with self._lock:
+            entry = self._sessions.get(jti)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._sessions[jti]
+                return None
+            snapshot = entry[1]
+        return models.User(**snapshot)
+
+    @staticmethod
+    def _password_stamp(hashed_password: str) -> str:
+        return hashlib.sha256(hashed_password.encode()).hexdigest()
+
+    def put(self, jti: str, user: models.User):
+        snapshot = {key: getattr(user, key) for key in self.SNAPSHOT_COLUMNS}
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[jti] = [now + self.ttl_seconds, snapshot, self._password_stamp(user.hashed_password),
+                                   now + self.revalidate_seconds]
+
+    def is_current(self, db: Session, jti: str, user: models.User) -> bool:
+        """Whether a cached session still matches the users row (changes made by any worker)
+
+        Reads the row only once the session's revalidation interval has passed.
+        """
+        with self._lock:
+            entry = self._sessions.get(jti)
+        if entry is None:
+            return False
+        if entry[3] > time.monotonic():
+            return True
+        row = db.execute(
+            select(models.User.is_active, models.User.role, models.User.hashed_password)
+            .where(models.User.id == user.id)
+        ).first()
+        if row is None:
+            self.forget_user(user.id)  # Deleted by another worker
+            return False
+        current = (row.is_active == user.is_active and row.role == user.role
+                   and self._password_stamp(row.hashed_password) == entry[2])
+        if current:
+            with self._lock:
+                entry[3] = time.monotonic() + self.revalidate_seconds
+        return current
+
+    def last_activity(self, user: models.User) -> Optional[datetime]:
+        """Most recent activity: the newer of the DB value and any not-yet-flushed activity"""
+        with self._lock:
+            cached = self._activity.get(user.id)
+        if cached is None or (user.last_activity and user.last_activity > cached):
+            return user.last_activity
+        return cached
+
+    def touch(self, user_id: int, when: datetime):
+        with self._lock:
+            self._activity[user_id] = when
+            self._pending_activity[user_id] = when
+
+    def invalidate_user(self, user_id: int):
+        """Drop every cached session for a user so the next request reloads from the DB"""
+        with self._lock:
+            stale = [jti for jti, entry in self._sessions.items() if entry[1]["id"] == user_id]
+            for jti in stale:
+                del self._sessions[jti]
+
+    def forget_user(self, user_id: int):
+        """Invalidate and discard activity for a deleted user"""
+        self.invalidate_user(user_id)
+        with self._lock:
+            self._activity.pop(user_id, None)
+            self._pending_activity.pop(user_id, None)
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [jti for jti, entry in self._sessions.items() if entry[0] <= now]
+            for jti in expired:
+                del self._sessions[jti]
+
+    def flush(self):
+        """Write pending last_activity values to the users table in one batch"""
+        with self._lock:
+            pending = self._pending_activity
+            self._pending_activity = {}
+        if not pending:
+            return
+        db = SessionLocal()
+        try:
+            # Core executemany: a user deleted by another worker just matches no row
+            users = models.User.__table__
+            db.execute(
+                update(users).where(users.c.id == bindparam("user_id")).values(last_activity=bindparam("when")),
+                [{"user_id": user_id, "when": when} for user_id, when in pending.items()]
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            # Put the batch back (newer activity recorded meanwhile wins) and retry next tick
+            with self._lock:
+                for user_id, when in pending.items():
+                    if user_id not in self._pending_activity:
+                        self._pending_activity[user_id] = when
+            logging.getLogger(__name__).error(f"Failed to flush session activity: {e}")
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+            self._evict_expired()
+
+    def start(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._stop.clear()
+            self._flusher = threading.Thread(target=self._run, name="session-activity-flusher", daemon=True)
+            self._flusher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=self.flush_seconds + 5)
+            self._flusher = None
+        self.flush()
+
+session_cache = SessionCache()
+
+def get_current_user(
     request: Request,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     session_token: Optional[str] = Cookie(None),
     db: Session = Depends(get_db)
 ) -> models.User:
-    """Get current authenticated user from token or session with HIPAA compliance"""
+    """Get current authenticated user from token or session with HIPAA compliance
+
+    A plain def, so its users reads (a miss, or a cached session due for revalidation) run on the threadpool.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -303,10 +501,17 @@ async def get_current_user(
         log_hipaa_event("INVALID_TOKEN", None, "Invalid token used", client_ip)
         raise credentials_exception
     
-    user = get_user_by_username(db, token_data.username)
+    user = session_cache.get(token_data.jti)
+    if user is not None and not session_cache.is_current(db, token_data.jti, user):
+        # Disabled, deleted, demoted or password reset (possibly by another worker)
+        session_cache.invalidate_user(user.id)
+        user = None
     if user is None:
-        log_hipaa_event("USER_NOT_FOUND", token_data.username, "Token valid but user not found", client_ip)
-        raise credentials_exception
+        user = get_user_by_username(db, token_data.username)
+        if user is None:
+            log_hipaa_event("USER_NOT_FOUND", token_data.username, "Token valid but user not found", client_ip)
+            raise credentials_exception
+        session_cache.put(token_data.jti, user)
     
     if not user.is_active:
         log_hipaa_event("INACTIVE_USER_ACCESS", user.username, "Inactive user attempted access", client_ip)
@@ -316,8 +521,9 @@ async def get_current_user(
         )
     
     # Check session timeout
-    if user.last_activity:
-        inactive_time = datetime.utcnow() - user.last_activity
+    last_activity = session_cache.last_activity(user)
+    if last_activity:
+        inactive_time = datetime.utcnow() - last_activity
         if inactive_time.total_seconds() > (SESSION_TIMEOUT_MINUTES * 60):
             log_hipaa_event("SESSION_TIMEOUT", user.username, "Session timed out", client_ip)
             raise HTTPException(
@@ -325,9 +531,9 @@ async def get_current_user(
                 detail="Session expired due to inactivity"
             )
     
-    # Update last activity
+    # Update last activity (written back to the users table in batches by session_cache)
     user.last_activity = datetime.utcnow()
-    db.commit()
+    session_cache.touch(user.id, user.last_activity)
     
     return user
 
@@ -388,6 +594,7 @@ def change_password(db: Session, user: models.User, old_password: str, new_passw
     user.password_last_changed = datetime.utcnow()
     user.must_change_password = False
     db.commit()
+    session_cache.invalidate_user(user.id)
     
     log_hipaa_event("PASSWORD_CHANGED", user.username, "Password successfully changed")
     return True
@@ -417,6 +624,8 @@ def create_default_admin(db: Session):
             
         except AuthError:
             pass  # User might already exist
+        except IntegrityError:
+            db.rollback()  # Another worker process created it first
 
 # HIPAA Data Access Logging
 def log_phi_access(user: models.User, patient_id: int, action: str, details: str = ""):
@@ -0,0 +1,160 @@
+# --- Authorization Unit Ledger ---
+# Every attended service uses one unit of the authorization covering its date.
+# authorization_usage records which authorization each attended service is charged to,
+# and authorizations.units_used keeps the running count. The service and authorization
+# writers in crud.py call sync_services / sync_patient inside their own transaction,
+# so remaining units are a column read on the patient view instead of a scan of the
+# patient's services. reconcile() rebuilds both from the services table in bulk.
+from collections import Counter, defaultdict
+from sqlalchemy import delete, func, insert, or_, select, text, update
+from sqlalchemy.orm import Session
+import logging
+import models
+
+logger = logging.getLogger(__name__)
+
+def _covers(authorization, service_date) -> bool:
+    return ((authorization.auth_start_date is None or authorization.auth_start_date <= service_date) and
+            (authorization.auth_end_date is None or authorization.auth_end_date >= service_date))
+
+def _charge_to(authorizations: list, service_date):
+    """Id of the authorization a service on service_date uses, or None
+
+    When authorizations overlap, the one that started last wins (then the newest);
+    _covering_authorization_sql is the same rule for reconcile().
+    """
+    covering = [a for a in authorizations if _covers(a, service_date)]
+    if not covering:
+        return None
+    return max(covering, key=lambda a: (a.auth_start_date is not None, a.auth_start_date, a.id)).id
+
+def _covering_authorization_sql():
+    """Correlated subquery: the authorization id an attended services row is charged to"""
+    auth = models.Authorization
+    service_date = models.Service.service_date
+    return (
+        select(auth.id)
+        .where(
+            auth.patient_id == models.Service.patient_id,
+            or_(auth.auth_start_date.is_(None), auth.auth_start_date <= service_date),
+            or_(auth.auth_end_date.is_(None), auth.auth_end_date >= service_date),
+        )
+        .order_by(auth.auth_start_date.desc().nulls_last(), auth.id.desc())
+        .limit(1)
+        .correlate(models.Service)
+        .scalar_subquery()
+    )
+
+def _apply_counts(db: Session, deltas: Counter):
+    for authorization_id, delta in deltas.items():
+        if delta:
+            # updated_at is kept: usage is not an edit of the authorization
+            db.execute(
+                update(models.Authorization)
+                .where(models.Authorization.id == authorization_id)
+                .values(units_used=models.Authorization.units_used + delta,
+                        updated_at=models.Authorization.updated_at)
+            )
+
+def sync_services(db: Session, service_ids: list):
+    """Charge or release units for services whose attended flag, date or patient may have changed
+
+    Call after the change is flushed and before the commit, so the ledger commits with it.
+    """
+    service_ids = list(service_ids)
+    if not service_ids:
+        return
+    services = db.execute(
+        select(models.Service.id, models.Service.patient_id, models.Service.service_date)
+        .where(models.Service.id.in_(service_ids), models.Service.attended.is_(True))
+    ).all()
+    current = dict(db.execute(
+        select(models.AuthorizationUsage.service_id, models.AuthorizationUsage.authorization_id)
+        .where(models.AuthorizationUsage.service_id.in_(service_ids))
+    ).all())
+
+    authorizations = defaultdict(list)
+    if services:
+        for authorization in db.execute(
+            select(models.Authorization.id, models.Authorization.patient_id,
+                   models.Authorization.auth_start_date, models.Authorization.auth_end_date)
+            .where(models.Authorization.patient_id.in_({s.patient_id for s in services}))
+        ):
+            authorizations[authorization.patient_id].append(authorization)
+    wanted = {}
+    for service in services:
+        authorization_id = _charge_to(authorizations[service.patient_id], service.service_date)
+        if authorization_id is not None:
+            wanted[service.id] = authorization_id
+
+    released = [service_id for service_id, authorization_id in current.items() if wanted.get(service_id) != authorization_id]
+    charged = [(service_id, authorization_id) for service_id, authorization_id in wanted.items() if current.get(service_id) != authorization_id]
+    if released:
+        db.execute(delete(models.AuthorizationUsage).where(models.AuthorizationUsage.service_id.in_(released)))
+    if charged:
+        db.execute(insert(models.AuthorizationUsage),
+                   [{"service_id": service_id, "authorization_id": authorization_id} for service_id, authorization_id in charged])
+
+    deltas = Counter()
+    for service_id in released:
+        deltas[current[service_id]] -= 1
+    for _, authorization_id in charged:
+        deltas[authorization_id] += 1
+    _apply_counts(db, deltas)
+
+def sync_patient(db: Session, patient_id: int):
+    """Re-charge a patient's attended services after one of their authorizations was added, changed or removed"""
+    attended = select(models.Service.id).where(models.Service.patient_id == patient_id, models.Service.attended.is_(True))
+    charged = (
+        select(models.AuthorizationUsage.service_id)
+        .join(models.Authorization, models.Authorization.id == models.AuthorizationUsage.authorization_id)
+        .where(models.Authorization.patient_id == patient_id)
+    )
+    sync_services(db, set(db.scalars(attended)) | set(db.scalars(charged)))
+
+def release_authorization(db: Session, authorization_id: int):
+    """Drop the usage rows of an authorization about to be deleted (its services move on via sync_patient)"""
+    db.execute(delete(models.AuthorizationUsage).where(models.AuthorizationUsage.authorization_id == authorization_id))
+
+def release_patient(db: Session, patient_id: int):
+    """Drop a patient's usage rows before the patient (and their services) are deleted"""
+    db.execute(delete(models.AuthorizationUsage).where(models.AuthorizationUsage.authorization_id.in_(
+        select(models.Authorization.id).where(models.Authorization.patient_id == patient_id)
+    )))
+
+def reconcile(db: Session) -> dict:
+    """Rebuild the whole ledger from the services table (set-based, one transaction)
+
+    Fixes drift from writes that bypassed crud.py (imports, manual SQL). Returns the number
+    of attended services charged and of authorizations whose units_used was wrong.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # Attendance writes wait for the rebuild instead of landing in the middle of it
+        db.execute(text("LOCK TABLE authorization_usage IN SHARE ROW EXCLUSIVE MODE"))
+    before = dict(db.execute(select(models.Authorization.id, models.Authorization.units_used)).all())
+
+    db.execute(delete(models.AuthorizationUsage))
+    covering = _covering_authorization_sql()
+    db.execute(
+        insert(models.AuthorizationUsage).from_select(
+            ["service_id", "authorization_id"],
+            select(models.Service.id, covering).where(models.Service.attended.is_(True), covering.is_not(None))
+        )
+    )
+    used = (
+        select(func.count())
+        .where(models.AuthorizationUsage.authorization_id == models.Authorization.id)
+        .correlate(models.Authorization)
+        .scalar_subquery()
+    )
+    db.execute(
+        update(models.Authorization).values(units_used=used, updated_at=models.Authorization.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+
+    after = dict(db.execute(select(models.Authorization.id, models.Authorization.units_used)).all())
+    charged = db.scalar(select(func.count()).select_from(models.AuthorizationUsage))
+    db.commit()
+    corrected = sum(1 for authorization_id, units in after.items() if before.get(authorization_id) != units)
+    logger.info(f"📒 Authorization ledger rebuilt: {charged} attended service(s) charged, {corrected} balance(s) corrected")
+    return {"services_charged": charged, "authorizations_corrected": corrected, "authorizations": len(after)}
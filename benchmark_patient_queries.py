@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Query-count check and timing for the patient read paths.
+
+Serializes pages of patients the way the API does (schemas.Patient with
+authorizations, or schemas.PatientSummary for the table view) and counts the
+SQL statements each path issues, for every PATIENT_AUTHORIZATIONS_LOADING mode.
+Exits non-zero if a path goes over its query budget. The same budgets are
+asserted by tests/test_patient_queries.py (python -m pytest tests); this script
+adds timings on a larger data set.
+
+Usage:
+    python benchmark_patient_queries.py --check      # budgets only, a few seconds
+    python benchmark_patient_queries.py
+    python benchmark_patient_queries.py --patients 1000 --page 100 --runs 10
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+import crud
+import models
+import schemas
+from query_counter import QueryCounter
+
+def seed(engine, count):
+    with engine.begin() as conn:
+        conn.execute(insert(models.Patient), [
+            {
+                "patient_number": f"P{i:06d}",
+                "first_name": "Test",
+                "last_name": f"Patient{i}",
+                "address": "123 Main St, Miami, FL 33101 " * 4,
+                "diagnosis": "F33.1 Major depressive disorder, recurrent, moderate " * 8,
+                "notes": "Session notes. " * 200,
+            }
+            for i in range(count)
+        ])
+        conn.execute(insert(models.Authorization), [
+            {
+                "patient_id": patient_id,
+                "auth_number": f"{patient_id}{n}",
+                "auth_units": 24,
+                "auth_start_date": date(2025, 1, 1) + timedelta(days=90 * n),
+                "auth_end_date": date(2025, 3, 31) + timedelta(days=90 * n),
+            }
+            for patient_id in range(1, count + 1)
+            for n in range(2)
+        ])
+
+def run_paths(page):
+    """(name, query budget, callable) for each read path; budgets are per page"""
+    return [
+        ("list, lazy (previous)", None,
+         lambda db: [schemas.Patient.model_validate(p) for p in crud.get_patients(db, limit=page, strategy="lazy")]),
+        ("list, selectin", 2,
+         lambda db: [schemas.Patient.model_validate(p) for p in crud.get_patients(db, limit=page, strategy="selectin")]),
+        ("list, joined", 1,
+         lambda db: [schemas.Patient.model_validate(p) for p in crud.get_patients(db, limit=page, strategy="joined")]),
+        ("summary projection", 1,
+         lambda db: [schemas.PatientSummary.model_validate(p) for p in crud.get_patient_summaries(db, limit=page)]),
+        ("search, selectin", 3,  # blind-index lookup, page of patients, authorizations
+         lambda db: [schemas.Patient.model_validate(p) for p in crud.search_patients(db, "p00001", limit=page, strategy="selectin")]),
+        ("search, joined", 2,
+         lambda db: [schemas.Patient.model_validate(p) for p in crud.search_patients(db, "p00001", limit=page, strategy="joined")]),
+        ("single patient, lazy", 2,
+         lambda db: schemas.Patient.model_validate(crud.get_patient(db, 1, strategy="lazy"))),
+        ("single patient, selectin", 2,
+         lambda db: schemas.Patient.model_validate(crud.get_patient(db, 1, strategy="selectin"))),
+        ("single patient, joined", 1,
+         lambda db: schemas.Patient.model_validate(crud.get_patient(db, 1, strategy="joined"))),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--check", action="store_true", help="Only check query budgets (small data set, one run)")
+    args = parser.parse_args()
+    if args.check:
+        args.patients, args.page, args.runs = 50, 20, 1
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{tmpdir}/bench_patients.db")
+        models.Base.metadata.create_all(bind=engine)
+        seed(engine, args.patients)
+        Session = sessionmaker(bind=engine)
+
+        # Build the in-process search index outside the measured runs
+        with Session() as db:
+            crud.search_patients(db, "warmup")
+
+        print(f"👥 Patient read paths, page of {args.page} ({args.patients} patients, {args.runs} runs)")
+        print("=" * 66)
+        print(f"{'':<26}{'queries':>10}{'budget':>10}{'median (ms)':>14}")
+        for name, budget, fn in run_paths(args.page):
+            samples = []
+            queries = 0
+            for _ in range(args.runs):
+                with Session() as db:
+                    with QueryCounter(engine) as counter:
+                        started = time.perf_counter()
+                        fn(db)
+                        samples.append((time.perf_counter() - started) * 1000)
+                    queries = counter.count
+            status = "" if budget is None or queries <= budget else "  ❌ over budget"
+            if status:
+                failures.append(name)
+            print(f"{name:<26}{queries:>10}{budget if budget is not None else '-':>10}"
+                  f"{statistics.median(samples):>14.1f}{status}")
+        print("=" * 66)
+        engine.dispose()
+
+    if failures:
+        print(f"❌ Query budget exceeded: {', '.join(failures)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON encoding and response compression on a 10k-row service sheet.
+
+Encoding: FastAPI's previous default path (jsonable_encoder + JSONResponse, i.e.
+json.dumps) against the sheet endpoints' ORJSONResponse. Compression: payload size and
+time for identity, gzip (COMPRESSION_GZIP_LEVEL) and brotli (COMPRESSION_BROTLI_QUALITY)
+as applied by compression.CompressionMiddleware.
+
+Usage:
+    python benchmark_response_encoding.py
+    python benchmark_response_encoding.py --rows 10000 --runs 5
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+import compression
+import crud
+import models
+from serializers import serialize_service_rows
+
+def seed(engine, rows):
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Patient), [
+            {"patient_number": f"P{i:05d}", "first_name": "Test", "last_name": f"Patient{i}"}
+            for i in range(200)
+        ])
+        start = date(2025, 1, 6)
+        conn.execute(insert(models.Service), [
+            {
+                "patient_id": rng.randint(1, 200),
+                "service_type": rng.choice(["PSR", "TMS"]),
+                "service_date": start + timedelta(days=rng.randint(0, 700)),
+                "service_time": f"{rng.randint(8, 17):02d}:{rng.choice(['00', '15', '30', '45'])}",
+                "sheet_type": "attendance",
+                "service_category": "attendance",
+                "week_start_date": start,
+                "attended": rng.choice([True, False, None]),
+                "is_recurring": False,
+                "created_at": datetime.utcnow(),
+            }
+            for _ in range(rows)
+        ])
+
+def load_sheet(Session):
+    """The sheet rows in the shape the /attendance and /appointments endpoints return"""
+    db = Session()
+    try:
+        rows = db.query(*crud.SERVICE_SHEET_COLUMNS).order_by(
+            models.Service.service_date, models.Service.service_time, models.Service.id
+        ).all()
+        return serialize_service_rows(rows)
+    finally:
+        db.close()
+
+def bench(fn, runs):
+    samples = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{tmpdir}/bench_encoding.db")
+        models.Base.metadata.create_all(bind=engine)
+        seed(engine, args.rows)
+        sheet = load_sheet(sessionmaker(bind=engine))
+        engine.dispose()
+
+    legacy_ms, legacy_body = bench(lambda: JSONResponse(jsonable_encoder(sheet)).body, args.runs)
+    orjson_ms, orjson_body = bench(lambda: ORJSONResponse(sheet).body, args.runs)
+
+    encodings = [("identity", None), ("gzip", "gzip")]
+    if compression.brotli is not None:
+        encodings.append(("br", "br"))
+    compressed = []
+    for label, encoding in encodings:
+        if encoding is None:
+            compressed.append((label, 0.0, len(orjson_body)))
+            continue
+        ms, body = bench(lambda: compression._Compressor(encoding).compress(orjson_body, final=True), args.runs)
+        compressed.append((label, ms, len(body)))
+
+    print(f"📦 Service sheet, {args.rows} rows ({args.runs} runs, medians)")
+    print("=" * 60)
+    print(f"{'encoder':<28}{'encode (ms)':>15}{'bytes':>15}")
+    print(f"{'jsonable_encoder + json':<28}{legacy_ms:>15.1f}{len(legacy_body):>15,}")
+    print(f"{'orjson (ORJSONResponse)':<28}{orjson_ms:>15.1f}{len(orjson_body):>15,}")
+    print("-" * 60)
+    print(f"{'Content-Encoding':<28}{'compress (ms)':>15}{'bytes':>15}")
+    for label, ms, size in compressed:
+        ratio = f" ({size / len(orjson_body):.0%})" if label != "identity" else ""
+        print(f"{label:<28}{ms:>15.1f}{size:>15,}{ratio}")
+    if compression.brotli is None:
+        print("   (install Brotli to compare br)")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
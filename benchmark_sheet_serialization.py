@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark the /appointments sheet serialization on a 10k-row sheet.
+
+Compares the previous per-row path (ORM entities, __dict__ copy, per-row INFO
+logging, schemas.Service re-validation) with the shared column-projection path
+in serializers.serialize_service_rows.
+
+Usage:
+    python benchmark_sheet_serialization.py
+    python benchmark_sheet_serialization.py --rows 10000 --runs 5
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+import crud
+import models
+import schemas
+from serializers import format_time_12hr, serialize_service_rows
+
+# Route the legacy per-row logging somewhere cheap but real (the app logs to stderr)
+legacy_logger = logging.getLogger("benchmark.legacy_sheet")
+legacy_logger.setLevel(logging.INFO)
+legacy_logger.addHandler(logging.StreamHandler(open(os.devnull, "w")))
+legacy_logger.propagate = False
+
+def legacy_appointment_sheet(db):
+    """The previous get_appointment_sheet loop body, minus the datetime branches that never fired"""
+    services = db.query(models.Service).filter(
+        models.Service.service_category == "appointment"
+    ).order_by(models.Service.service_date, models.Service.service_time).all()
+    formatted_services = []
+    for s in services:
+        service_dict = s.__dict__.copy()
+        legacy_logger.info(f"🔍 Appointment Service {s.id} RAW DATA:")
+        legacy_logger.info(f"  - service_time: {getattr(s, 'service_time', 'NOT SET')} (type: {type(getattr(s, 'service_time', None))})")
+        legacy_logger.info(f"  - service_date: {getattr(s, 'service_date', 'NOT SET')} (type: {type(getattr(s, 'service_date', None))})")
+        time_val = s.service_time
+        legacy_logger.info(f"  - Using service_time: {time_val}")
+        formatted_time = format_time_12hr(time_val)
+        service_dict['service_time_formatted'] = formatted_time
+        service_dict['service_time'] = formatted_time
+        legacy_logger.info(f"🔍 Appointment Service {s.id}: raw_time='{time_val}', formatted='{formatted_time}'")
+        formatted_services.append(schemas.Service.model_validate(service_dict))
+    return formatted_services
+
+def shared_appointment_sheet(db):
+    return serialize_service_rows(crud.get_appointment_services(db), label="Appointment Service")
+
+def seed(engine, rows):
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Patient), [
+            {"patient_number": f"P{i:05d}", "first_name": "Test", "last_name": f"Patient{i}"}
+            for i in range(200)
+        ])
+        start = date(2025, 1, 6)
+        conn.execute(insert(models.Service), [
+            {
+                "patient_id": rng.randint(1, 200),
+                "service_type": rng.choice(["Evaluations", "Individual Therapy"]),
+                "service_date": start + timedelta(days=rng.randint(0, 700)),
+                "service_time": f"{rng.randint(8, 17):02d}:{rng.choice(['00', '15', '30', '45'])}",
+                "sheet_type": "appointment",
+                "service_category": "appointment",
+                "is_recurring": False,
+                "created_at": datetime.utcnow(),
+            }
+            for _ in range(rows)
+        ])
+
+def bench(fn, Session, runs):
+    samples = []
+    for _ in range(runs):
+        db = Session()
+        try:
+            started = time.perf_counter()
+            fn(db)
+            samples.append((time.perf_counter() - started) * 1000)
+        finally:
+            db.close()
+    return statistics.median(samples), min(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        engine = create_engine(f"sqlite:///{tmpdir}/bench_sheet.db")
+        models.Base.metadata.create_all(bind=engine)
+        seed(engine, args.rows)
+        Session = sessionmaker(bind=engine)
+
+        legacy = bench(legacy_appointment_sheet, Session, args.runs)
+        shared = bench(shared_appointment_sheet, Session, args.runs)
+        engine.dispose()
+
+    print(f"📋 Appointment sheet, {args.rows} rows ({args.runs} runs)")
+    print("=" * 60)
+    print(f"{'':<28}{'median (ms)':>15}{'best (ms)':>15}")
+    print(f"{'legacy per-row path':<28}{legacy[0]:>15.1f}{legacy[1]:>15.1f}")
+    print(f"{'shared serialization':<28}{shared[0]:>15.1f}{shared[1]:>15.1f}")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# --- Response Compression ---
+# Negotiated brotli/gzip for JSON, NDJSON and text responses of COMPRESSION_MIN_BYTES or
+# more, so the big patient and sheet lists cross slow clinic links in a fraction of the
+# bytes. Streaming responses (exports) are compressed chunk by chunk and flushed, so they
+# still arrive incrementally. File downloads are left alone: they advertise byte ranges
+# and strong ETags, which only hold for the stored bytes.
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip is offered
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))  # Smaller bodies are sent as is
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))  # 0-11; above ~5 costs more CPU than it saves on the wire
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "image/svg+xml", "text/")
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Codings the client accepts (q > 0) from an Accept-Encoding header"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip())
+    return accepted
+
+def choose_encoding(accept_encoding: str):
+    """"br" or "gzip" (in that order of preference), or None"""
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._brotli = None
+            self._gzip = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """Compressed bytes for data; without final, flushed so the client can decode what it has"""
+        if self._brotli is not None:
+            return self._brotli.process(data) + (self._brotli.finish() if final else self._brotli.flush())
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class CompressionMiddleware:
+    """ASGI middleware compressing eligible responses with the client's preferred coding"""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None  # Set once the response is being compressed
+        passthrough = False
+
+        async def send_compressed(message: Message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=message["headers"])
+                passthrough = (
+                    "content-encoding" in headers
+                    or "accept-ranges" in headers or "content-range" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                    or "no-transform" in headers.get("cache-control", "")
+                )
+                if passthrough:
+                    await send(start)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "etag" in headers and not headers["etag"].startswith("W/"):
+                    headers["ETag"] = "W/" + headers["etag"]  # Same content, different bytes
+                if more_body:
+                    del headers["Content-Length"]
+                    compressed = compressor.compress(body, final=False)
+                else:
+                    compressed = compressor.compress(body, final=True)
+                    headers["Content-Length"] = str(len(compressed))
+                await send(start)
+                await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+                return
+
+            await send({"type": "http.response.body", "body": compressor.compress(body, final=not more_body),
+                        "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
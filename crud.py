@@ -1,16 +1,61 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, desc
+from sqlalchemy.orm import Session, joinedload, lazyload, noload, selectinload
+from sqlalchemy import desc, delete, insert, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import models
 import schemas
+import search
+import authorization_ledger
+import os
 import json
-from datetime import timedelta, date
+import base64
+from collections import Counter
+from datetime import datetime, timedelta, date
 import calendar
 
-def get_patient(db: Session, patient_id: int):
-    return db.query(models.Patient).filter(models.Patient.id == patient_id).first()
+# How patient.authorizations is loaded on the patient read paths:
+# "selectin" (one extra IN query per page), "joined" (LEFT OUTER JOIN) or "lazy" (one query per patient)
+PATIENT_AUTHORIZATIONS_LOADING = os.getenv("PATIENT_AUTHORIZATIONS_LOADING", "selectin")
 
-def get_patients(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Patient).offset(skip).limit(limit).all()
+PATIENT_LOADER_STRATEGIES = {
+    "selectin": selectinload,
+    "joined": joinedload,
+    "lazy": lazyload,
+    "noload": noload,  # Callers that never read authorizations (summary views)
+}
+
+def patient_loader_options(strategy: str = None):
+    """ORM loader options for reading patients with their authorizations"""
+    strategy = strategy or PATIENT_AUTHORIZATIONS_LOADING
+    if strategy not in PATIENT_LOADER_STRATEGIES:
+        raise ValueError(f"Unknown patient loading strategy: {strategy}")
+    return (PATIENT_LOADER_STRATEGIES[strategy](models.Patient.authorizations),)
+
+def get_patient(db: Session, patient_id: int, strategy: str = None):
+    return db.query(models.Patient).options(
+        *patient_loader_options(strategy)
+    ).filter(models.Patient.id == patient_id).first()
+
+def get_patients(db: Session, skip: int = 0, limit: int = 100, strategy: str = None):
+    return db.query(models.Patient).options(
+        *patient_loader_options(strategy)
+    ).order_by(models.Patient.id).offset(skip).limit(limit).all()
+
+# Columns for the patient table view: no PHI blobs (address, diagnosis, notes) and no authorizations
+PATIENT_SUMMARY_COLUMNS = [
+    models.Patient.id,
+    models.Patient.patient_number,
+    models.Patient.first_name,
+    models.Patient.last_name,
+    models.Patient.phone,
+    models.Patient.insurance,
+    models.Patient.auth_end_date,
+    models.Patient.updated_at,
+]
+
+def get_patient_summaries(db: Session, skip: int = 0, limit: int = 100):
+    """Lightweight patient rows for list views"""
+    return db.query(*PATIENT_SUMMARY_COLUMNS).order_by(models.Patient.id).offset(skip).limit(limit).all()
 
 def create_patient(db: Session, patient: schemas.PatientCreate):
     # Log all the patient data being received
@@ -75,25 +120,20 @@ def update_patient(db: Session, patient_id: int, patient: schemas.PatientUpdate)
         db.refresh(db_patient)
     return db_patient
 
-def delete_patient(db: Session, patient_id: int):
+def delete_patient(db: Session, patient_id: int, commit: bool = True):
     db_patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
     if db_patient:
+        authorization_ledger.release_patient(db, patient_id)
         db.delete(db_patient)
-        db.commit()
+        if commit:
+            db.commit()
+        else:
+            db.flush()
     return db_patient
 
-def search_patients(db: Session, query: str):
-    return db.query(models.Patient).filter(
-        or_(
-            models.Patient.patient_number.contains(query),
-            models.Patient.first_name.contains(query),
-            models.Patient.last_name.contains(query),
-            models.Patient.medicaid_id.contains(query),
-            models.Patient.insurance.contains(query),
-            models.Patient.diagnosis.contains(query),
-            models.Patient.referal.contains(query)
-        )
-    ).all()
+def search_patients(db: Session, query: str, skip: int = 0, limit: int = search.SEARCH_DEFAULT_LIMIT, strategy: str = None):
+    """Ranked, paginated patient search (trigram index on PostgreSQL, n-gram index elsewhere)"""
+    return search.search_patients(db, query, skip=skip, limit=limit, options=patient_loader_options(strategy))
 
 def get_patient_by_number(db: Session, patient_number: str):
     """Get patient by patient number"""
@@ -107,8 +147,8 @@ def get_patient_with_financials(db: Session, patient_id: int):
         return patient
     return None
 
-def add_service_entry(db: Session, patient_id: int, service: schemas.ServiceCreate):
-    db_service = models.Service(
+def _build_service(patient_id: int, service: schemas.ServiceCreate) -> models.Service:
+    return models.Service(
         patient_id=patient_id,
         service_type=service.service_type,
         service_date=service.service_date,
@@ -122,38 +162,48 @@ def add_service_entry(db: Session, patient_id: int, service: schemas.ServiceCrea
         recurring_end_date=service.recurring_end_date,
         parent_service_id=service.parent_service_id
     )
+
+def add_service_entry(db: Session, patient_id: int, service: schemas.ServiceCreate):
+    db_service = _build_service(patient_id, service)
     db.add(db_service)
+    if db_service.attended:
+        db.flush()
+        authorization_ledger.sync_services(db, [db_service.id])
     db.commit()
     db.refresh(db_service)
     return db_service
 
+# Changing any of these can move a service's unit to another authorization (or release it)
+LEDGER_SERVICE_FIELDS = {"attended", "service_date", "patient_id"}
+
 def update_service_entry(db: Session, service_id: int, service_update: dict):
     db_service = db.query(models.Service).filter(models.Service.id == service_id).first()
     if db_service:
         for key, value in service_update.items():
             if hasattr(db_service, key):
                 setattr(db_service, key, value)
+        if LEDGER_SERVICE_FIELDS & service_update.keys():
+            db.flush()
+            authorization_ledger.sync_services(db, [service_id])
         db.commit()
         db.refresh(db_service)
     return db_service
 
-def create_recurring_appointments(db: Session, parent_service: models.Service, recurring_type: str, recurring_days: list, weeks_count: int = 0, months_count: int = 0):
+def generate_recurring_dates(start_date: date, recurring_type: str, recurring_days: list, weeks_count: int = 0, months_count: int = 0):
     """
-    Create recurring appointments based on parent service
+    Compute the occurrence dates of a recurring series (the start date itself excluded)
     
     Parameters:
-    - db: Database session
-    - parent_service: Parent service object to base recurring appointments on
+    - start_date: Date of the parent (first) appointment
     - recurring_type: 'weekly' or 'monthly'
     - recurring_days: List of weekdays (0=Monday, 6=Sunday) for weekly recurrence or list of days for monthly recurrence
     - weeks_count: Number of weeks to repeat (for weekly)
     - months_count: Number of months to repeat (for monthly)
     
     Returns:
-    - List of created service IDs
+    - List of dates, in creation order
     """
-    created_services = []
-    start_date = parent_service.service_date
+    dates = []
     
     # For weekly recurrence
     if recurring_type == 'weekly' and weeks_count > 0:
@@ -190,20 +240,7 @@ def create_recurring_appointments(db: Session, parent_service: models.Service, r
                     # For subsequent weeks, calculate from Monday
                     day_date = current_date + timedelta(days=day)
                 
-                # Create a new service for this date
-                new_service = models.Service(
-                    patient_id=parent_service.patient_id,
-                    service_type=parent_service.service_type,
-                    service_date=day_date,
-                    service_time=parent_service.service_time,
-                    sheet_type=parent_service.sheet_type,
-                    is_recurring=False,  # Children aren't themselves recurring
-                    parent_service_id=parent_service.id
-                )
-                
-                db.add(new_service)
-                db.flush()  # Get ID without committing
-                created_services.append(new_service.id)
+                dates.append(day_date)
     
     # For monthly recurrence
     elif recurring_type == 'monthly' and months_count > 0:
@@ -231,58 +268,204 @@ def create_recurring_appointments(db: Session, parent_service: models.Service, r
             if next_date.weekday() >= 5:  # Saturday or Sunday
                 continue
             
-            # Create a new service for this date
-            new_service = models.Service(
-                patient_id=parent_service.patient_id,
-                service_type=parent_service.service_type,
-                service_date=next_date,
-                service_time=parent_service.service_time,
-                sheet_type=parent_service.sheet_type,
-                is_recurring=False,  # Children aren't themselves recurring
-                parent_service_id=parent_service.id
-            )
-            
-            db.add(new_service)
-            db.flush()  # Get ID without committing
-            created_services.append(new_service.id)
+            dates.append(next_date)
     
-    # Commit all new services
-    if created_services:
+    return dates
+
+def create_recurring_appointments(db: Session, parent_service: models.Service, recurring_type: str, recurring_days: list, weeks_count: int = 0, months_count: int = 0, commit: bool = True):
+    """
+    Create recurring appointments based on parent service
+    
+    All occurrences are inserted with a single multi-row INSERT ... RETURNING id.
+    Pass commit=False to leave the transaction open (e.g. to commit with the parent).
+    
+    Returns:
+    - List of created service IDs
+    """
+    occurrence_dates = generate_recurring_dates(
+        parent_service.service_date, recurring_type, recurring_days,
+        weeks_count=weeks_count, months_count=months_count
+    )
+    if not occurrence_dates:
+        return []
+    
+    rows = [
+        {
+            "patient_id": parent_service.patient_id,
+            "service_type": parent_service.service_type,
+            "service_date": occurrence_date,
+            "service_time": parent_service.service_time,
+            "sheet_type": parent_service.sheet_type,
+            "is_recurring": False,  # Children aren't themselves recurring
+            "parent_service_id": parent_service.id
+        }
+        for occurrence_date in occurrence_dates
+    ]
+    created_services = list(db.scalars(insert(models.Service).returning(models.Service.id), rows))
+    
+    if commit:
         db.commit()
         
     return created_services
 
-def add_attendance_week(db: Session, patient_id: int, attendance_data: schemas.AttendanceWeekCreate):
-    """Create attendance entries for a full week with selected days"""
-    created_services = []
+def create_recurring_service(db: Session, patient_id: int, service: schemas.ServiceCreate, recurring_type: str, recurring_days: list, weeks_count: int = 0, months_count: int = 0):
+    """
+    Create a recurring parent service and all of its occurrences in one transaction
     
-    # Calculate dates for the selected days
-    for day_offset in attendance_data.selected_days:
-        service_date = attendance_data.week_start_date + timedelta(days=day_offset)
+    Either the whole series is stored or nothing is (no parent without children).
+    
+    Returns:
+    - (parent service, list of created occurrence IDs)
+    """
+    try:
+        db_service = _build_service(patient_id, service)
+        db.add(db_service)
+        db.flush()  # Children need the parent's ID
         
-        # Create a service entry for each selected day
-        service = schemas.ServiceCreate(
-            service_type=attendance_data.service_type,
-            service_date=service_date,
-            service_time=attendance_data.service_time,
-            sheet_type="attendance",
-            service_category="attendance",
-            week_start_date=attendance_data.week_start_date,
-            attended=True,  # Mark selected days as attended
-            is_recurring=False,
-            recurring_pattern=None,
-            recurring_end_date=None,
-            parent_service_id=None
+        created_ids = create_recurring_appointments(
+            db, parent_service=db_service,
+            recurring_type=recurring_type,
+            recurring_days=recurring_days,
+            weeks_count=weeks_count,
+            months_count=months_count,
+            commit=False
         )
-        
-        db_service = add_service_entry(db, patient_id, service)
-        created_services.append(db_service)
+        if db_service.attended:
+            authorization_ledger.sync_services(db, [db_service.id])  # Occurrences start unmarked
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
     
-    return created_services
+    db.refresh(db_service)
+    return db_service, created_ids
+
+def _attendance_rows(patient_id: int, service_type: str, week_start_date: date, service_time: str, selected_days: list):
+    """Service rows for the selected days of one patient's attendance week"""
+    return [
+        {
+            "patient_id": patient_id,
+            "service_type": service_type,
+            "service_date": week_start_date + timedelta(days=day_offset),
+            "service_time": service_time,
+            "sheet_type": "attendance",
+            "service_category": "attendance",
+            "week_start_date": week_start_date,
+            "attended": True,  # Mark selected days as attended
+            "is_recurring": False
+        }
+        for day_offset in selected_days
+    ]
+
+def _insert_attendance_rows(db: Session, rows: list):
+    """Bulk-insert attendance rows and commit them as one transaction"""
+    if not rows:
+        return []
+    try:
+        # Returning columns (not entities) keeps the rows usable after commit without reloads
+        created_services = db.execute(
+            insert(models.Service).returning(*SERVICE_SHEET_COLUMNS), rows
+        ).all()
+        authorization_ledger.sync_services(db, [row.id for row in created_services if row.attended])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return sorted(created_services, key=lambda row: (row.patient_id, row.service_date))
+
+def add_attendance_week(db: Session, patient_id: int, attendance_data: schemas.AttendanceWeekCreate):
+    """Create attendance entries for a full week with selected days (one transaction)"""
+    rows = _attendance_rows(
+        patient_id, attendance_data.service_type, attendance_data.week_start_date,
+        attendance_data.service_time, attendance_data.selected_days
+    )
+    return _insert_attendance_rows(db, rows)
+
+def add_attendance_roster(db: Session, roster: schemas.AttendanceRosterCreate):
+    """Create a week of attendance for every patient in a group (one transaction)"""
+    rows = []
+    for entry in roster.entries:
+        rows.extend(_attendance_rows(
+            entry.patient_id, roster.service_type, roster.week_start_date,
+            roster.service_time, entry.selected_days
+        ))
+    return _insert_attendance_rows(db, rows)
+
+def get_existing_patient_ids(db: Session, patient_ids: list):
+    """Return the subset of patient_ids that exist"""
+    if not patient_ids:
+        return set()
+    rows = db.query(models.Patient.id).filter(models.Patient.id.in_(patient_ids)).all()
+    return {row.id for row in rows}
+
+# Columns returned by the service sheet endpoints (everything schemas.Service needs).
+# Selecting columns instead of entities skips ORM identity-map and instance overhead.
+SERVICE_SHEET_COLUMNS = [
+    models.Service.id,
+    models.Service.patient_id,
+    models.Service.service_type,
+    models.Service.service_date,
+    models.Service.service_time,
+    models.Service.sheet_type,
+    models.Service.service_category,
+    models.Service.week_start_date,
+    models.Service.attended,
+    models.Service.is_recurring,
+    models.Service.recurring_pattern,
+    models.Service.recurring_end_date,
+    models.Service.parent_service_id,
+    models.Service.created_at,
+]
+
+def get_patient_services(db: Session, patient_id: int, sheet_type: str = None, service_category: str = None):
+    """Get service sheet rows for a patient, newest first"""
+    query = db.query(*SERVICE_SHEET_COLUMNS).filter(models.Service.patient_id == patient_id)
+    
+    if sheet_type:
+        query = query.filter(models.Service.sheet_type == sheet_type)
+    if service_category:
+        query = query.filter(models.Service.service_category == service_category)
+    
+    return query.order_by(models.Service.service_date.desc()).all()
+
+# Sheet pagination: keyset (cursor) over (service_date, service_time, id)
+SHEET_DEFAULT_PAGE_SIZE = 500
+SHEET_MAX_PAGE_SIZE = 1000
+
+def encode_sheet_cursor(row) -> str:
+    """Opaque cursor pointing just past a sheet row"""
+    key = [row.service_date.isoformat(), row.service_time, row.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
 
-def get_attendance_services(db: Session, patient_id: int = None, service_type: str = None, week_start: date = None):
-    """Get attendance-based services with optional filters"""
-    query = db.query(models.Service).filter(models.Service.service_category == "attendance")
+def decode_sheet_cursor(cursor: str):
+    """Decode a sheet cursor; raises ValueError if it is malformed"""
+    try:
+        service_date, service_time, service_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return date.fromisoformat(service_date), str(service_time), int(service_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def clamp_sheet_limit(limit: int) -> int:
+    return max(1, min(limit or SHEET_DEFAULT_PAGE_SIZE, SHEET_MAX_PAGE_SIZE))
+
+def _sheet_page(query, start_date: date = None, end_date: date = None, cursor: str = None, limit: int = SHEET_DEFAULT_PAGE_SIZE):
+    """Apply the date window, keyset cursor and page size shared by the sheet queries"""
+    if start_date:
+        query = query.filter(models.Service.service_date >= start_date)
+    if end_date:
+        query = query.filter(models.Service.service_date <= end_date)
+    if cursor:
+        query = query.filter(
+            tuple_(models.Service.service_date, models.Service.service_time, models.Service.id) > decode_sheet_cursor(cursor)
+        )
+    return query.order_by(
+        models.Service.service_date, models.Service.service_time, models.Service.id
+    ).limit(clamp_sheet_limit(limit)).all()
+
+def get_attendance_services(db: Session, patient_id: int = None, service_type: str = None, week_start: date = None,
+                            start_date: date = None, end_date: date = None, cursor: str = None, limit: int = SHEET_DEFAULT_PAGE_SIZE):
+    """Get a page of attendance-based service sheet rows with optional filters"""
+    query = db.query(*SERVICE_SHEET_COLUMNS).filter(models.Service.service_category == "attendance")
     
     if patient_id:
         query = query.filter(models.Service.patient_id == patient_id)
@@ -291,18 +474,37 @@ def get_attendance_services(db: Session, patient_id: int = None, service_type: s
     if week_start:
         query = query.filter(models.Service.week_start_date == week_start)
     
-    return query.order_by(models.Service.service_date).all()
+    return _sheet_page(query, start_date=start_date, end_date=end_date, cursor=cursor, limit=limit)
 
-def get_appointment_services(db: Session, patient_id: int = None, service_type: str = None):
-    """Get appointment-based services with optional filters"""
-    query = db.query(models.Service).filter(models.Service.service_category == "appointment")
+def get_appointment_services(db: Session, patient_id: int = None, service_type: str = None,
+                             start_date: date = None, end_date: date = None, cursor: str = None, limit: int = SHEET_DEFAULT_PAGE_SIZE):
+    """Get a page of appointment-based service sheet rows with optional filters"""
+    query = db.query(*SERVICE_SHEET_COLUMNS).filter(models.Service.service_category == "appointment")
     
     if patient_id:
         query = query.filter(models.Service.patient_id == patient_id)
     if service_type:
         query = query.filter(models.Service.service_type == service_type)
     
-    return query.order_by(models.Service.service_date, models.Service.service_time).all()
+    return _sheet_page(query, start_date=start_date, end_date=end_date, cursor=cursor, limit=limit)
+
+def get_services_for_month(db: Session, year: int, month: int, service_category: str = "appointment"):
+    """Get all services in a calendar month joined with their patient's name and number"""
+    first_day = date(year, month, 1)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    
+    return db.query(
+        models.Service,
+        models.Patient.first_name,
+        models.Patient.last_name,
+        models.Patient.patient_number
+    ).join(
+        models.Patient, models.Service.patient_id == models.Patient.id
+    ).filter(
+        models.Service.service_category == service_category,
+        models.Service.service_date >= first_day,
+        models.Service.service_date <= last_day
+    ).order_by(models.Service.service_date, models.Service.service_time).all()
 
 # Authorization CRUD functions
 def get_authorizations(db: Session, patient_id: int):
@@ -317,6 +519,8 @@ def create_authorization(db: Session, patient_id: int, authorization: schemas.Au
     """Create a new authorization for a patient"""
     db_authorization = models.Authorization(**authorization.dict(), patient_id=patient_id)
     db.add(db_authorization)
+    db.flush()
+    authorization_ledger.sync_patient(db, patient_id)  # Earlier attended services may fall in its dates
     db.commit()
     db.refresh(db_authorization)
     return db_authorization
@@ -328,6 +532,9 @@ def update_authorization(db: Session, authorization_id: int, authorization: sche
         update_data = authorization.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_authorization, field, value)
+        if {"auth_start_date", "auth_end_date"} & update_data.keys():
+            db.flush()
+            authorization_ledger.sync_patient(db, db_authorization.patient_id)
         db.commit()
         db.refresh(db_authorization)
     return db_authorization
@@ -336,7 +543,57 @@ def delete_authorization(db: Session, authorization_id: int):
     """Delete an authorization"""
     db_authorization = db.query(models.Authorization).filter(models.Authorization.id == authorization_id).first()
     if db_authorization:
+        authorization_ledger.release_authorization(db, authorization_id)
         db.delete(db_authorization)
+        db.flush()
+        authorization_ledger.sync_patient(db, db_authorization.patient_id)  # Its services may fall under another one
         db.commit()
         return True
-    return False
\ No newline at end of file
+    return False
+
+# --- Upload blob references ---
+def acquire_blob_refs(db: Session, files: list):
+    """Add a reference to each file's content blob (no commit; locks the blob rows until commit)"""
+    counts = Counter(f["sha256"] for f in files)
+    sizes = {f["sha256"]: f["size"] for f in files}
+    dialect_insert = postgresql_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+    # Sorted so concurrent uploads lock upload_blobs rows in the same order
+    stmt = dialect_insert(models.UploadBlob).values([
+        {"sha256": sha256, "size": sizes[sha256], "ref_count": count, "created_at": datetime.utcnow()}
+        for sha256, count in sorted(counts.items())
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.UploadBlob.sha256],
+        set_={"ref_count": models.UploadBlob.ref_count + stmt.excluded.ref_count}
+    ))
+
+def add_patient_files(db: Session, files: list):
+    """Insert manifest rows and commit (after acquire_blob_refs and placing the blobs)"""
+    rows = db.scalars(
+        insert(models.PatientFile).returning(models.PatientFile),
+        [{key: value for key, value in f.items() if key != "staged_path"} for f in files]
+    ).all()
+    db.commit()
+    return rows
+
+def release_patient_files(db: Session, patient_id: int) -> list:
+    """Delete a patient's file rows and their blob references (no commit).
+
+    Returns the hashes of blobs nobody references any more; their upload_blobs rows are
+    deleted here and the caller removes the blob files before committing.
+    """
+    hashes = db.scalars(
+        delete(models.PatientFile).where(models.PatientFile.patient_id == patient_id).returning(models.PatientFile.sha256)
+    ).all()
+    if not hashes:
+        return []
+    for sha256, count in sorted(Counter(hashes).items()):
+        db.execute(
+            update(models.UploadBlob).where(models.UploadBlob.sha256 == sha256)
+            .values(ref_count=models.UploadBlob.ref_count - count)
+        )
+    return db.scalars(
+        delete(models.UploadBlob).where(
+            models.UploadBlob.sha256.in_(set(hashes)), models.UploadBlob.ref_count <= 0
+        ).returning(models.UploadBlob.sha256)
+    ).all()
@@ -0,0 +1,178 @@
+# --- Async read paths (AsyncSession) ---
+# select()-based counterparts of the crud.py read functions for async def routes.
+# They share crud's column lists, loader options and cursor helpers, so both
+# paths return the same rows in the same order. Writes (including the patient file
+# manifest) stay in crud.py on the sync Session.
+from datetime import date
+import calendar
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud
+import models
+import search
+
+def _patient_loader_options(strategy: str = None):
+    # Lazy loads cannot run on an AsyncSession, so "lazy" falls back to selectin here
+    strategy = strategy or crud.PATIENT_AUTHORIZATIONS_LOADING
+    return crud.patient_loader_options("selectin" if strategy == "lazy" else strategy)
+
+async def get_patient(db: AsyncSession, patient_id: int, strategy: str = None):
+    result = await db.scalars(
+        select(models.Patient).options(*_patient_loader_options(strategy)).where(models.Patient.id == patient_id)
+    )
+    return result.unique().first()
+
+async def patient_exists(db: AsyncSession, patient_id: int) -> bool:
+    return await db.scalar(select(models.Patient.id).where(models.Patient.id == patient_id)) is not None
+
+async def get_patients(db: AsyncSession, skip: int = 0, limit: int = 100, strategy: str = None):
+    result = await db.scalars(
+        select(models.Patient).options(*_patient_loader_options(strategy))
+        .order_by(models.Patient.id).offset(skip).limit(limit)
+    )
+    return result.unique().all()
+
+async def get_patient_summaries(db: AsyncSession, skip: int = 0, limit: int = 100):
+    """Lightweight patient rows for list views"""
+    result = await db.execute(
+        select(*crud.PATIENT_SUMMARY_COLUMNS).order_by(models.Patient.id).offset(skip).limit(limit)
+    )
+    return result.all()
+
+async def search_patients(db: AsyncSession, query: str, skip: int = 0, limit: int = search.SEARCH_DEFAULT_LIMIT, strategy: str = None):
+    """Ranked, paginated patient search (the search engine runs on the session's sync facade)"""
+    options = _patient_loader_options(strategy)
+    return await db.run_sync(
+        lambda session: search.search_patients(session, query, skip=skip, limit=limit, options=options)
+    )
+
+async def get_patient_services(db: AsyncSession, patient_id: int, sheet_type: str = None, service_category: str = None):
+    """Get service sheet rows for a patient, newest first"""
+    stmt = select(*crud.SERVICE_SHEET_COLUMNS).where(models.Service.patient_id == patient_id)
+
+    if sheet_type:
+        stmt = stmt.where(models.Service.sheet_type == sheet_type)
+    if service_category:
+        stmt = stmt.where(models.Service.service_category == service_category)
+
+    result = await db.execute(stmt.order_by(models.Service.service_date.desc()))
+    return result.all()
+
+async def _sheet_page(db: AsyncSession, stmt, start_date: date = None, end_date: date = None, cursor: str = None, limit: int = crud.SHEET_DEFAULT_PAGE_SIZE):
+    """Apply the date window, keyset cursor and page size shared by the sheet queries"""
+    if start_date:
+        stmt = stmt.where(models.Service.service_date >= start_date)
+    if end_date:
+        stmt = stmt.where(models.Service.service_date <= end_date)
+    if cursor:
+        stmt = stmt.where(
+            tuple_(models.Service.service_date, models.Service.service_time, models.Service.id) > crud.decode_sheet_cursor(cursor)
+        )
+    result = await db.execute(
+        stmt.order_by(
+            models.Service.service_date, models.Service.service_time, models.Service.id
+        ).limit(crud.clamp_sheet_limit(limit))
+    )
+    return result.all()
+
+async def get_attendance_services(db: AsyncSession, patient_id: int = None, service_type: str = None, week_start: date = None,
+                                  start_date: date = None, end_date: date = None, cursor: str = None, limit: int = crud.SHEET_DEFAULT_PAGE_SIZE):
+    """Get a page of attendance-based service sheet rows with optional filters"""
+    stmt = select(*crud.SERVICE_SHEET_COLUMNS).where(models.Service.service_category == "attendance")
+
+    if patient_id:
+        stmt = stmt.where(models.Service.patient_id == patient_id)
+    if service_type:
+        stmt = stmt.where(models.Service.service_type == service_type)
+    if week_start:
+        stmt = stmt.where(models.Service.week_start_date == week_start)
+
+    return await _sheet_page(db, stmt, start_date=start_date, end_date=end_date, cursor=cursor, limit=limit)
+
+async def get_appointment_services(db: AsyncSession, patient_id: int = None, service_type: str = None,
+                                   start_date: date = None, end_date: date = None, cursor: str = None, limit: int = crud.SHEET_DEFAULT_PAGE_SIZE):
+    """Get a page of appointment-based service sheet rows with optional filters"""
+    stmt = select(*crud.SERVICE_SHEET_COLUMNS).where(models.Service.service_category == "appointment")
+
+    if patient_id:
+        stmt = stmt.where(models.Service.patient_id == patient_id)
+    if service_type:
+        stmt = stmt.where(models.Service.service_type == service_type)
+
+    return await _sheet_page(db, stmt, start_date=start_date, end_date=end_date, cursor=cursor, limit=limit)
+
+async def get_services_for_month(db: AsyncSession, year: int, month: int, service_category: str = "appointment"):
+    """Get all services in a calendar month joined with their patient's name and number"""
+    first_day = date(year, month, 1)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+
+    result = await db.execute(
+        select(
+            models.Service,
+            models.Patient.first_name,
+            models.Patient.last_name,
+            models.Patient.patient_number
+        ).join(
+            models.Patient, models.Service.patient_id == models.Patient.id
+        ).where(
+            models.Service.service_category == service_category,
+            models.Service.service_date >= first_day,
+            models.Service.service_date <= last_day
+        ).order_by(models.Service.service_date, models.Service.service_time)
+    )
+    return result.all()
+
+async def get_authorizations(db: AsyncSession, patient_id: int):
+    """Get all authorizations for a patient"""
+    result = await db.scalars(select(models.Authorization).where(models.Authorization.patient_id == patient_id))
+    return result.all()
+
+async def get_authorization(db: AsyncSession, authorization_id: int):
+    """Get a specific authorization by ID"""
+    return await db.get(models.Authorization, authorization_id)
+
+async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100):
+    result = await db.scalars(select(models.User).order_by(models.User.id).offset(skip).limit(limit))
+    return result.all()
+
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
+
+# --- Patient file manifest ---
+async def get_patient_files(db: AsyncSession, patient_id: int):
+    """A patient's files, oldest first"""
+    result = await db.scalars(
+        select(models.PatientFile).where(models.PatientFile.patient_id == patient_id)
+        .order_by(models.PatientFile.created_at, models.PatientFile.id)
+    )
+    return result.all()
+
+async def get_patient_file(db: AsyncSession, patient_id: int, file_id: str):
+    result = await db.scalars(
+        select(models.PatientFile).where(models.PatientFile.id == file_id, models.PatientFile.patient_id == patient_id)
+    )
+    return result.first()
+
+async def get_patient_storage_bytes(db: AsyncSession, patient_id: int) -> int:
+    """Total size of a patient's stored files (for upload quotas)"""
+    total = await db.scalar(
+        select(func.coalesce(func.sum(models.PatientFile.size), 0)).where(models.PatientFile.patient_id == patient_id)
+    )
+    return int(total)
+
+async def get_storage_stats(db: AsyncSession) -> dict:
+    """Logical (per patient file) vs. stored (per distinct blob) upload sizes"""
+    files, logical_bytes = (await db.execute(
+        select(func.count(models.PatientFile.id), func.coalesce(func.sum(models.PatientFile.size), 0))
+    )).one()
+    blobs, stored_bytes = (await db.execute(
+        select(func.count(models.UploadBlob.sha256), func.coalesce(func.sum(models.UploadBlob.size), 0))
+    )).one()
+    return {
+        "files": files,
+        "logical_bytes": int(logical_bytes),
+        "blobs": blobs,
+        "stored_bytes": int(stored_bytes),
+        "saved_bytes": int(logical_bytes) - int(stored_bytes),
+        "dedup_ratio": round(int(logical_bytes) / int(stored_bytes), 2) if stored_bytes else 1.0,
+    }
@@ -1,9 +1,13 @@
-# --- PostgreSQL-Only Database Configuration ---
+# --- Database Configuration ---
+# PostgreSQL (from POSTGRES_*) unless DATABASE_URL names another database, e.g.
+# sqlite:///./people.db for local runs. The sync and async engines always point at the
+# same database; only the driver differs.
 import os
 from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.engine import Engine
 from sqlalchemy.pool import QueuePool
 
 # Load environment variables
@@ -13,29 +17,100 @@ POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 POSTGRES_DB = os.getenv("POSTGRES_DB", "spectrum_db")
 
-SQLALCHEMY_DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=int(os.getenv("POSTGRES_POOL_SIZE", 20)),
-    max_overflow=int(os.getenv("POSTGRES_MAX_OVERFLOW", 30)),
-    pool_pre_ping=True,
-    pool_recycle=int(os.getenv("POSTGRES_POOL_RECYCLE", 1800)),
-    echo=os.getenv("POSTGRES_ECHO_SQL", "False").lower() == "true",
-    future=True
+# --- Connection budget ---
+# With several worker processes every pool is multiplied by the worker count. Set
+# DB_CONNECTION_BUDGET to the connections this deployment may hold in total (e.g.
+# max_connections minus headroom for admin and migrations) and the per-worker pools are
+# derived from it. Explicit POSTGRES_*POOL_SIZE / *MAX_OVERFLOW settings still win.
+DB_CONNECTION_BUDGET = int(os.getenv("DB_CONNECTION_BUDGET", 0))  # 0 = use the fixed pool sizes below
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))  # Worker processes (set by gunicorn.conf.py)
+DB_ASYNC_POOL_SHARE = float(os.getenv("DB_ASYNC_POOL_SHARE", 0.4))  # Share of each worker's budget for the async engine
+
+def pool_limits(size_var: str, overflow_var: str, default_size: int, default_overflow: int, share: float):
+    """(pool_size, max_overflow) for one engine in one worker"""
+    if DB_CONNECTION_BUDGET > 0:
+        per_engine = max(2, int(DB_CONNECTION_BUDGET / WEB_CONCURRENCY * share))
+        # Keep two thirds open, allow the rest as overflow under bursts
+        default_size = max(1, per_engine * 2 // 3)
+        default_overflow = per_engine - default_size
+    return int(os.getenv(size_var, default_size)), int(os.getenv(overflow_var, default_overflow))
+
+POOL_SIZE, POOL_MAX_OVERFLOW = pool_limits(
+    "POSTGRES_POOL_SIZE", "POSTGRES_MAX_OVERFLOW", 20, 30, 1 - DB_ASYNC_POOL_SHARE
+)
+ASYNC_POOL_SIZE, ASYNC_POOL_MAX_OVERFLOW = pool_limits(
+    "POSTGRES_ASYNC_POOL_SIZE", "POSTGRES_ASYNC_MAX_OVERFLOW", 10, 20, DB_ASYNC_POOL_SHARE
+)
+
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or (
+    f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 )
 
+# Async driver for each supported backend
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_database_url(url: str) -> str:
+    """The same database URL with the backend's async driver"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Unsupported database backend for DATABASE_URL: {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = async_database_url(SQLALCHEMY_DATABASE_URL)
+IS_POSTGRESQL = make_url(SQLALCHEMY_DATABASE_URL).get_backend_name() == "postgresql"
+ECHO_SQL = os.getenv("POSTGRES_ECHO_SQL", "False").lower() == "true"
+
+if IS_POSTGRESQL:
+    engine_options = {
+        "poolclass": QueuePool,
+        "pool_size": POOL_SIZE,
+        "max_overflow": POOL_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": int(os.getenv("POSTGRES_POOL_RECYCLE", 1800)),
+    }
+else:
+    engine_options = {"connect_args": {"check_same_thread": False}}  # Sessions move between threadpool threads
+engine = create_engine(SQLALCHEMY_DATABASE_URL, echo=ECHO_SQL, future=True, **engine_options)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# --- Async engine (asyncpg / aiosqlite) for async def routes ---
+async_engine_options = {"echo": ECHO_SQL}
+if IS_POSTGRESQL:
+    async_engine_options.update(
+        pool_size=ASYNC_POOL_SIZE,
+        max_overflow=ASYNC_POOL_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=int(os.getenv("POSTGRES_POOL_RECYCLE", 1800)),
+    )
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_options)
+
+# expire_on_commit=False: async routes serialize ORM objects after the session is done,
+# and expired attributes cannot be lazily reloaded outside the event loop's await points
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # PostgreSQL-specific settings
-@event.listens_for(Engine, "connect")
 def set_postgresql_search_path(dbapi_connection, connection_record):
     if hasattr(dbapi_connection, 'cursor'):
         cursor = dbapi_connection.cursor()
         cursor.execute("SET search_path TO public")
         cursor.close()
 
+if IS_POSTGRESQL:
+    event.listen(engine, "connect", set_postgresql_search_path)
+    event.listen(async_engine.sync_engine, "connect", set_postgresql_search_path)
+
+# Pooled connections must not be shared across fork(): a worker forked from a preloaded
+# master starts with fresh, empty pools (the master's connections are left to the master)
+def _reset_pools_after_fork():
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
@@ -44,6 +119,11 @@ def get_db():
     finally:
         db.close()
 
+# Dependency to get an async DB session (for async def routes)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Health check function
 def check_database_connection():
     try:
@@ -58,7 +138,7 @@ def check_database_connection():
 # Get database info
 def get_database_info():
     return {
-        "database_type": "postgresql",
+        "database_type": engine.dialect.name,
         "database_url": SQLALCHEMY_DATABASE_URL.split("@")[-1] if "@" in SQLALCHEMY_DATABASE_URL else SQLALCHEMY_DATABASE_URL,
         "engine_pool_size": getattr(engine.pool, 'size', None),
         "engine_pool_checked_out": getattr(engine.pool, 'checkedout', None),
@@ -0,0 +1,114 @@
+# --- Data Exports (CSV / NDJSON) ---
+# Streams patients, services or authorizations straight from a server-side cursor
+# (yield_per + stream_results): rows are fetched EXPORT_FETCH_SIZE at a time, encoded
+# and sent, so memory stays flat whatever the export size. Each export is written to
+# the HIPAA audit log once, when the stream ends, with the number of rows actually sent.
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from sqlalchemy import select
+import csv
+import json
+import os
+import database
+import models
+
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", 1000))  # Rows per cursor fetch (and per chunk sent)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",  # Starlette adds "; charset=utf-8"
+    "ndjson": "application/x-ndjson",
+}
+
+class ExportRejected(Exception):
+    """Invalid export request (unknown dataset, column or date range)"""
+
+# dataset -> (model, date-range column, extra columns joined from the patient)
+EXPORT_DATASETS = {
+    "patients": (models.Patient, "created_at", ()),
+    "services": (models.Service, "service_date", ("patient_number",)),
+    "authorizations": (models.Authorization, "auth_start_date", ("patient_number",)),
+}
+
+def available_columns(dataset: str) -> list:
+    model, _, joined = EXPORT_DATASETS[dataset]
+    return [c.key for c in model.__table__.columns] + list(joined)
+
+def build_export_query(dataset: str, columns: list = None, start_date: date = None, end_date: date = None):
+    """SELECT for an export, in id order; raises ExportRejected for invalid input
+
+    start_date/end_date are inclusive and filter on the dataset's date column.
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise ExportRejected(f"Unknown export '{dataset}'. Available: {', '.join(EXPORT_DATASETS)}")
+    if start_date and end_date and start_date > end_date:
+        raise ExportRejected("start_date must be on or before end_date")
+    model, date_field, joined = EXPORT_DATASETS[dataset]
+    allowed = available_columns(dataset)
+    columns = columns or allowed
+    unknown = [c for c in columns if c not in allowed]
+    if unknown:
+        raise ExportRejected(f"Unknown column(s) for {dataset}: {', '.join(unknown)}")
+
+    selected = [
+        getattr(models.Patient, c).label(c) if c in joined else getattr(model, c)
+        for c in columns
+    ]
+    stmt = select(*selected)
+    if any(c in joined for c in columns):
+        stmt = stmt.join(models.Patient, models.Patient.id == model.patient_id)
+
+    date_column = getattr(model, date_field)
+    is_datetime = date_column.type.python_type is datetime
+    if start_date:
+        stmt = stmt.where(date_column >= (datetime.combine(start_date, time.min) if is_datetime else start_date))
+    if end_date:
+        # Inclusive end date: for timestamps, everything before the next midnight
+        if is_datetime:
+            stmt = stmt.where(date_column < datetime.combine(end_date + timedelta(days=1), time.min))
+        else:
+            stmt = stmt.where(date_column <= end_date)
+    return stmt.order_by(model.id), columns
+
+def _json_value(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return str(value)
+
+def _encode_csv(columns: list, rows, include_header: bool) -> str:
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        writer.writerow(columns)
+    writer.writerows(
+        ["" if value is None else value.isoformat() if isinstance(value, (date, datetime)) else value for value in row]
+        for row in rows
+    )
+    return buffer.getvalue()
+
+def _encode_ndjson(columns: list, rows) -> str:
+    return "".join(json.dumps(dict(zip(columns, row)), default=_json_value) + "\n" for row in rows)
+
+def stream_export(stmt, columns: list, export_format: str, on_finish):
+    """Generator of encoded chunks, one per cursor fetch
+
+    Runs in the threadpool (StreamingResponse iterates sync generators there) with its
+    own session, so the cursor stays open for the whole response. on_finish(row_count,
+    completed) is called exactly once, also when the client disconnects mid-stream.
+    """
+    db = database.SessionLocal()
+    sent, completed = 0, False
+    try:
+        result = db.execute(stmt.execution_options(yield_per=EXPORT_FETCH_SIZE, stream_results=True))
+        if export_format == "csv":
+            yield _encode_csv(columns, (), include_header=True).encode()
+        for rows in result.partitions():
+            if export_format == "csv":
+                chunk = _encode_csv(columns, rows, include_header=False)
+            else:
+                chunk = _encode_ndjson(columns, rows)
+            yield chunk.encode()
+            sent += len(rows)
+        completed = True
+    finally:
+        db.close()
+        on_finish(sent, completed)
@@ -0,0 +1,54 @@
+# --- Gunicorn configuration: multi-process serving ---
+#   gunicorn -c gunicorn.conf.py main:app
+#
+# One master forks WEB_CONCURRENCY uvicorn workers (default: one per CPU core).
+# With preload_app the app is imported once in the master, so every worker forks
+# with the same SECRET_KEY / ENCRYPTION_KEY; the keys are also exported to the
+# environment here, so recycled or non-preloaded workers read the same values.
+import multiprocessing
+import os
+import secrets
+from cryptography.fernet import Fernet
+from dotenv import load_dotenv
+
+# Same source of configuration as the app (auth.py loads .env too)
+load_dotenv()
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = os.getenv("GUNICORN_PRELOAD", "True").lower() == "true"
+
+# Worker recycling: restart each worker after a jittered number of requests so slow
+# leaks can't accumulate and workers don't all restart at the same moment
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 500))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))  # Kill a worker that stops responding
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))  # Drain in-flight requests on restart
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+
+# database.py sizes each worker's pools from DB_CONNECTION_BUDGET / WEB_CONCURRENCY
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+def _shared_key(name: str, generate):
+    """Make sure every worker sees the same key; never generate one in production"""
+    if os.getenv(name):
+        return
+    if os.getenv("ENVIRONMENT", "development").lower() == "production":
+        raise RuntimeError(f"{name} must be set in production (workers would not share a generated key)")
+    os.environ[name] = generate()
+    print(f"⚠️  {name} not set: generated one for this server run only. "
+          f"Tokens/ciphertext will not survive a restart; set {name} in .env")
+
+_shared_key("SECRET_KEY", lambda: secrets.token_urlsafe(32))
+if not os.getenv("ENCRYPTION_KEYS"):  # The rotation form of the setting (see phi.py)
+    _shared_key("ENCRYPTION_KEY", lambda: Fernet.generate_key().decode())
+
+def when_ready(server):
+    server.log.info(f"🚀 Serving with {workers} workers (preload={preload_app}, max_requests={max_requests})")
+
+def post_fork(server, worker):
+    server.log.info(f"👷 Worker {worker.pid} started")
+
+def worker_exit(server, worker):
+    server.log.info(f"👋 Worker {worker.pid} exited")
@@ -0,0 +1,104 @@
+# --- Password Hashing Pool ---
+# bcrypt at 12 rounds costs ~250 ms of CPU per hash or verify. Hashing runs on a small,
+# bounded thread pool (bcrypt releases the GIL) so it never blocks the event loop, and a
+# cap on pending work turns a login storm into quick 503s instead of an unbounded backlog.
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+class PasswordHashPoolBusy(Exception):
+    """Raised when more than max_pending hash/verify calls are already waiting"""
+
+class PasswordHashPool:
+    """Bounded pool for passlib hash/verify calls, with queueing metrics"""
+
+    def __init__(self, context, max_workers: int = 2, max_pending: int = 64):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0  # Queued + running
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._work_total = 0.0
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork_in_child)
+
+    def _after_fork_in_child(self):
+        # Worker threads do not survive fork(); give each worker process its own pool
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise PasswordHashPoolBusy(f"{self._pending} password operations already pending")
+            self._pending += 1
+        enqueued_at = time.monotonic()
+
+        def run():
+            started_at = time.monotonic()
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                finished_at = time.monotonic()
+                waited = started_at - enqueued_at
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+                    self._completed += 1
+                    self._wait_total += waited
+                    self._wait_max = max(self._wait_max, waited)
+                    self._work_total += finished_at - started_at
+
+        try:
+            return self._executor.submit(run)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Blocking verify for synchronous callers (runs on the pool)"""
+        return self._submit(self.context.verify, plain_password, hashed_password).result()
+
+    def hash(self, password: str) -> str:
+        """Blocking hash for synchronous callers (runs on the pool)"""
+        return self._submit(self.context.hash, password).result()
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        """Verify without blocking the event loop"""
+        return await asyncio.wrap_future(self._submit(self.context.verify, plain_password, hashed_password))
+
+    async def hash_async(self, password: str) -> str:
+        """Hash without blocking the event loop"""
+        return await asyncio.wrap_future(self._submit(self.context.hash, password))
+
+    def metrics(self) -> dict:
+        with self._lock:
+            completed = self._completed
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "running": self._running,
+                "queued": self._pending - self._running,
+                "completed": completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_total / completed * 1000, 1) if completed else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 1),
+                "avg_hash_ms": round(self._work_total / completed * 1000, 1) if completed else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Bulk-import patients (and their authorizations) from a CSV file.
+
+The header row names PatientCreate fields (patient_number, first_name and last_name are
+required; "Patient Number" style headers work too). Rows with auth_* values also get an
+Authorization. Invalid rows and patient numbers that already exist are skipped and
+listed in the report; everything else is loaded IMPORT_BATCH_SIZE rows per transaction.
+
+Usage:
+    python import_patients.py new_contract.csv --dry-run     # validate only
+    python import_patients.py new_contract.csv
+    python import_patients.py new_contract.csv --batch-size 1000 --report import_report.json
+"""
+import argparse
+import json
+from database import SessionLocal
+import patient_import
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV file (UTF-8, with or without a BOM)")
+    parser.add_argument("--batch-size", type=int, default=patient_import.IMPORT_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Validate the file without writing anything")
+    parser.add_argument("--report", help="Write the full report (including row errors) to this JSON file")
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as f:
+            report = patient_import.import_patients_csv(
+                db, patient_import.open_csv_text(f), batch_size=args.batch_size, dry_run=args.dry_run
+            )
+    except patient_import.ImportRejected as e:
+        parser.error(str(e))
+    finally:
+        db.close()
+
+    verb = "Would import" if args.dry_run else "Imported"
+    print(f"📥 {verb} {report['imported']} of {report['rows']} patient row(s) "
+          f"and {report['authorizations']} authorization(s); {report['failed']} rejected")
+    if report["ignored_columns"]:
+        print(f"   Ignored column(s): {', '.join(report['ignored_columns'])}")
+    for error in report["errors"][:20]:
+        print(f"   line {error['row']} ({error['patient_number'] or 'no patient_number'}): {'; '.join(error['errors'])}")
+    if report["failed"] > 20:
+        print(f"   ... {report['failed'] - 20} more")
+    if report["aborted"]:
+        print(f"⚠️  {report['aborted']}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"   Report written to {args.report}")
+
+if __name__ == "__main__":
+    main()
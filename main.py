@@ -1,59 +1,40 @@
-def format_time_12hr(dt):
-    """Format a datetime, time object, or string to 12-hour AM/PM string."""
-    if dt is None or dt == '':
-        return 'No time specified'
-    
-    if isinstance(dt, datetime):
-        return dt.strftime("%I:%M %p").lstrip('0')
-    elif hasattr(dt, 'hour') and hasattr(dt, 'minute'):
-        return f"{(dt.hour % 12 or 12)}:{dt.minute:02d} {'AM' if dt.hour < 12 else 'PM'}"
-    elif isinstance(dt, str):
-        # Handle empty or whitespace strings
-        if not dt.strip():
-            return 'No time specified'
-        
-        # Try to parse string time like '16:30' or '08:05'
-        import re
-        match = re.match(r"^(\d{1,2}):(\d{2})$", dt.strip())
-        if match:
-            hour = int(match.group(1))
-            minute = int(match.group(2))
-            ampm = 'AM' if hour < 12 else 'PM'
-            hour12 = (hour % 12) or 12
-            return f"{hour12}:{minute:02d} {ampm}"
-        
-        # If it's already formatted (contains AM/PM), return as-is
-        if 'AM' in dt.upper() or 'PM' in dt.upper():
-            return dt
-            
-        return 'No time specified'  # fallback for unrecognized format
-    
-    return 'No time specified'
 from fastapi import FastAPI, HTTPException, Depends, status, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse, HTMLResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, RedirectResponse, HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.exceptions import RequestValidationError
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, desc, extract
 from datetime import datetime, timedelta, date
 from pydantic import ValidationError
 import models
 import schemas
 import crud
-from database import SessionLocal, engine, get_db
+import crud_async
+import compression
+import authorization_ledger
+import exports
+import patient_import
+import phi
+import phi_rotation
+import search
+import uploads
+import watchlist
+from serializers import format_time_12hr, serialize_service_rows
+from database import SessionLocal, engine, async_engine, get_db, get_async_db
 import auth
 from auth import get_current_active_user, create_access_token
 import logging
 import os
 from pydantic import ValidationError
 from fastapi import UploadFile, File
-from fastapi.responses import FileResponse
 from pathlib import Path
 from typing import List
 import shutil
-import uuid
 import calendar
+import re
 import json
 
 # Set up logging
@@ -67,16 +48,22 @@ models.Base.metadata.create_all(bind=engine)
 app = FastAPI(
     title="Spectrum Mental Health - Patient Management API",
     description="Professional patient management system with multi-user authentication and financial tracking",
-    version="2.1.0"
+    version="2.1.0",
+    default_response_class=ORJSONResponse  # orjson: several times faster than json.dumps on large lists
 )
 
+# Negotiated brotli/gzip for JSON and text bodies over COMPRESSION_MIN_BYTES (see compression.py)
+app.add_middleware(compression.CompressionMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Location", "Upload-Offset", "Upload-Length", "Upload-Expires",
+                    "ETag", "Content-Range", "Accept-Ranges", "Content-Disposition"],
 )
 
 # Custom exception handler for validation errors
@@ -121,6 +108,12 @@ async def log_requests(request: Request, call_next):
     logger.info(f"📤 Response: {response.status_code}")
     return response
 
+# Decrypted PHI values are cached for the duration of one request (bounded, see phi.py)
+@app.middleware("http")
+async def phi_plaintext_cache(request: Request, call_next):
+    with phi.plaintext_cache():
+        return await call_next(request)
+
 # HIPAA Compliance: Add security headers middleware
 @app.middleware("http")
 async def add_security_headers(request: Request, call_next):
@@ -141,12 +134,31 @@ async def add_security_headers(request: Request, call_next):
     
     return response
 
+@app.exception_handler(auth.PasswordHashPoolBusy)
+async def password_hash_busy_handler(request: Request, exc: auth.PasswordHashPoolBusy):
+    logger.warning(f"⚠️ Password hashing pool saturated on {request.method} {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-in requests right now, please try again in a moment"},
+        headers={"Retry-After": "1"}
+    )
+
+@app.exception_handler(uploads.UploadRejected)
+async def upload_rejected_handler(request: Request, exc: uploads.UploadRejected):
+    logger.warning(f"⚠️ Upload rejected on {request.method} {request.url.path}: {exc.detail}")
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+
 # Create default admin user on startup
 @app.on_event("startup")
 async def startup_event():
     db = SessionLocal()
     try:
+        # Never write PHI with keys that cannot read what is already stored
+        phi_rotation.verify_keys(db)
         auth.create_default_admin(db)
+        auth.session_cache.start()
+        uploads.partial_upload_sweeper.start()
+        watchlist.watchlist_refresher.start()
         logger.info("🚀 Application started successfully")
         logger.info("=" * 60)
         logger.info("🌐 Available URLs:")
@@ -159,6 +171,18 @@ async def startup_event():
     finally:
         db.close()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Write back any last_activity values still buffered in the session cache
+    auth.session_cache.stop()
+    uploads.partial_upload_sweeper.stop()
+    watchlist.watchlist_refresher.stop()
+    phi_rotation.reencryption_job.stop()
+    # Drain and fsync queued audit events (bounded by AUDIT_SHUTDOWN_TIMEOUT_SECONDS)
+    auth.audit_pipeline.stop()
+    auth.password_pool.shutdown()
+    await async_engine.dispose()
+
 # Root routes
 @app.get("/")
 def read_root():
@@ -182,6 +206,14 @@ def health_check():
         "static_directory": os.path.exists("static")
     }
 
+@app.get("/metrics")
+def get_metrics(current_user: models.User = Depends(get_current_active_user)):
+    """Runtime metrics (password hashing pool queueing)"""
+    return {
+        "timestamp": datetime.utcnow(),
+        "password_hashing": auth.password_pool.metrics()
+    }
+
 # Authentication Routes
 @app.post("/auth/login", response_model=schemas.LoginResponse)
 async def login(
@@ -194,7 +226,8 @@ async def login(
     logger.info(f"Login attempt for user: {login_data.username}")
     
     try:
-        user = auth.authenticate_user(db, login_data.username, login_data.password)
+        # bcrypt and the DB work both run off the event loop
+        user = await auth.authenticate_user_async(db, login_data.username, login_data.password)
         if not user:
             logger.warning(f"Failed login attempt for user: {login_data.username}")
             return schemas.LoginResponse(
@@ -202,9 +235,8 @@ async def login(
                 message="Invalid username or password"
             )
         
-        # Update last login
-        user.last_login = datetime.utcnow()
-        db.commit()
+        # last_login was set by handle_successful_login; reload the committed row off the loop
+        user_data = await run_in_threadpool(schemas.User.model_validate, user)
         
         # Create access token
         access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -217,12 +249,14 @@ async def login(
         return schemas.LoginResponse(
             success=True,
             message="Login successful",
-            user=schemas.User.model_validate(user),
+            user=user_data,
             access_token=access_token,
             token_type="bearer",
             redirect_url="/static/index.html"
         )
         
+    except auth.PasswordHashPoolBusy:
+        raise
     except Exception as e:
         logger.error(f"Login error: {str(e)}")
         return schemas.LoginResponse(
@@ -250,11 +284,11 @@ async def create_new_user(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """Create a new user"""
+    """Create a new user (DB work on the threadpool, bcrypt on the hashing pool)"""
     # Allow system admin to create any user, including other admins
     try:
         # Check if username already exists
-        existing_user = db.query(models.User).filter(models.User.username == user_data.username).first()
+        existing_user = await run_in_threadpool(auth.get_user_by_username, db, user_data.username)
         if existing_user:
             logger.error(f"Attempt to create user with existing username: {user_data.username}")
             raise HTTPException(status_code=400, detail="Username already exists")
@@ -281,9 +315,12 @@ async def create_new_user(
         if not re.search(r"[^A-Za-z0-9]", password):
             logger.error("Password missing special character")
             raise HTTPException(status_code=400, detail="Password must contain a special character")
-        user = auth.create_user(db, user_data)
+        hashed_password = await auth.get_password_hash_async(password)
+        user = await run_in_threadpool(auth.create_user, db, user_data, hashed_password=hashed_password)
         logger.info(f"New user created: {user.username} by {current_user.username}")
-        return schemas.User.model_validate(user)
+        return await run_in_threadpool(schemas.User.model_validate, user)
+    except auth.PasswordHashPoolBusy:
+        raise
     except auth.AuthError as e:
         logger.error(f"AuthError creating user: {e.message}")
         raise HTTPException(status_code=e.status_code, detail=e.message)
@@ -293,7 +330,7 @@ async def create_new_user(
 
 # Edit user endpoint
 @app.put("/users/{user_id}", response_model=schemas.User)
-async def edit_user(
+def edit_user(
     user_id: int,
     user_update: schemas.UserUpdate,
     db: Session = Depends(get_db),
@@ -314,6 +351,7 @@ async def edit_user(
         setattr(user, field, value)
     db.commit()
     db.refresh(user)
+    auth.session_cache.invalidate_user(user.id)
     logger.info(f"User {user.username} updated by {current_user.username}")
     return schemas.User.model_validate(user)
 
@@ -321,28 +359,28 @@ async def edit_user(
 async def list_users(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
     """List all users"""
-    users = db.query(models.User).offset(skip).limit(limit).all()
+    users = await crud_async.get_users(db, skip=skip, limit=limit)
     logger.info(f"User list requested by: {current_user.username}")
     return [schemas.User.model_validate(user) for user in users]
 
 @app.get("/users/{user_id}", response_model=schemas.User)
 async def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
     """Get specific user by ID"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await crud_async.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return schemas.User.model_validate(user)
 
 @app.put("/users/{user_id}", response_model=schemas.User)
-async def update_user(
+def update_user(
     user_id: int,
     user_update: schemas.UserUpdate,
     db: Session = Depends(get_db),
@@ -360,12 +398,13 @@ async def update_user(
     
     db.commit()
     db.refresh(user)
+    auth.session_cache.invalidate_user(user.id)
     
     logger.info(f"User {user.username} updated by {current_user.username}")
     return schemas.User.model_validate(user)
 
 @app.delete("/users/{user_id}")
-async def delete_user(
+def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
@@ -380,8 +419,10 @@ async def delete_user(
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     
     username = user.username
+    user_id = user.id
     db.delete(user)
     db.commit()
+    auth.session_cache.forget_user(user_id)
     
     logger.info(f"User {username} deleted by {current_user.username}")
     return {"message": f"User {username} deleted successfully"}
@@ -393,8 +434,8 @@ async def reset_user_password(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """Reset user password"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    """Reset user password (DB work on the threadpool, bcrypt on the hashing pool)"""
+    user = await run_in_threadpool(db.get, models.User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -405,14 +446,16 @@ async def reset_user_password(
     if len(new_password) < 8:
         raise HTTPException(status_code=400, detail="Password must be at least 8 characters long")
     
-    user.hashed_password = auth.get_password_hash(new_password)
-    db.commit()
+    user.hashed_password = await auth.get_password_hash_async(new_password)
+    username = user.username  # Read before the commit expires the row
+    await run_in_threadpool(db.commit)
+    auth.session_cache.invalidate_user(user_id)
     
-    logger.info(f"Password reset for user {user.username} by {current_user.username}")
-    return {"message": f"Password reset successfully for user {user.username}"}
+    logger.info(f"Password reset for user {username} by {current_user.username}")
+    return {"message": f"Password reset successfully for user {username}"}
 
 @app.post("/users/{user_id}/toggle-status")
-async def toggle_user_status(
+def toggle_user_status(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
@@ -428,6 +471,7 @@ async def toggle_user_status(
     
     user.is_active = not user.is_active
     db.commit()
+    auth.session_cache.invalidate_user(user.id)
     
     status_text = "enabled" if user.is_active else "disabled"
     logger.info(f"User {user.username} {status_text} by {current_user.username}")
@@ -435,21 +479,35 @@ async def toggle_user_status(
 
 # Patient Routes (NO ROLE RESTRICTIONS - ALL LOGGED-IN USERS HAVE SAME ACCESS)
 @app.get("/patients/", response_model=list[schemas.Patient])
-def read_patients(
+async def read_patients(
     skip: int = 0,
     limit: int = 100,
     q: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
     logger.info(f"Loading patients for user: {current_user.username}")
     if q:
         # Use the same search logic as /search/ endpoint
-        patients = crud.search_patients(db, query=q)
+        patients = await crud_async.search_patients(db, query=q, skip=skip, limit=limit)
         return patients
-    patients = crud.get_patients(db, skip=skip, limit=limit)
+    patients = await crud_async.get_patients(db, skip=skip, limit=limit)
     return patients
 
+@app.get("/patients/summary", response_model=list[schemas.PatientSummary])
+async def read_patient_summaries(
+    skip: int = 0,
+    limit: int = 100,
+    q: str = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Lightweight patient list for the patient table (no notes, diagnosis, address or authorizations)"""
+    logger.info(f"Loading patient summaries for user: {current_user.username}")
+    if q:
+        return await crud_async.search_patients(db, query=q, skip=skip, limit=limit, strategy="noload")
+    return await crud_async.get_patient_summaries(db, skip=skip, limit=limit)
+
 @app.post("/patients/", response_model=schemas.Patient)
 def create_patient(
     patient: schemas.PatientCreate, 
@@ -492,14 +550,46 @@ def create_patient(
         logger.error(f"❌ Error creating patient: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating patient: {str(e)}")
 
+@app.post("/patients/import")
+def import_patients(
+    file: UploadFile = File(...),
+    dry_run: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.require_role(["admin", "staff"]))
+):
+    """Bulk-create patients (and their authorizations) from a CSV file
+
+    The header row names PatientCreate fields; rows that fail validation or whose
+    patient_number already exists are skipped and listed in the report. With dry_run
+    the file is validated without writing anything.
+    """
+    logger.info(f"Importing patients from {file.filename} (dry_run={dry_run}) by user: {current_user.username}")
+    text_stream = patient_import.open_csv_text(file.file)
+    try:
+        report = patient_import.import_patients_csv(db, text_stream, dry_run=dry_run)
+    except patient_import.ImportRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        text_stream.detach()  # The upload is closed by FastAPI
+
+    # One audit record per import (the rows themselves are not logged)
+    auth.log_hipaa_event(
+        "BULK_IMPORT" if not dry_run else "BULK_IMPORT_DRY_RUN",
+        current_user.username,
+        f"Imported {report['imported']} of {report['rows']} patient row(s), "
+        f"{report['authorizations']} authorization(s), {report['failed']} rejected"
+    )
+    logger.info(f"📥 Patient import: {report['imported']} imported, {report['failed']} rejected")
+    return report
+
 @app.get("/patients/{patient_id}", response_model=schemas.Patient)
-def read_patient(
+async def read_patient(
     patient_id: int, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
     logger.info(f"Reading patient {patient_id} by user: {current_user.username}")
-    db_patient = crud.get_patient(db, patient_id=patient_id)
+    db_patient = await crud_async.get_patient(db, patient_id=patient_id)
     if db_patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
     return db_patient
@@ -527,8 +617,20 @@ def delete_patient(
     db_patient = crud.get_patient(db, patient_id=patient_id)
     if db_patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
-    crud.delete_patient(db=db, patient_id=patient_id)
-    # Delete patient files from uploads directory
+    # Drop the patient's file references; blobs no other patient uses are garbage collected
+    released = crud.release_patient_files(db, patient_id)
+    crud.delete_patient(db=db, patient_id=patient_id, commit=False)
+    retired = uploads.retire_blobs(released)
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        uploads.restore_blobs(retired)
+        raise
+    uploads.purge_blobs(retired)
+    if retired:
+        logger.info(f"🧹 Removed {len(retired)} unreferenced upload blob(s) with patient {patient_id}")
+    # Delete in-progress uploads from the patient's folder
     patient_folder = Path(UPLOAD_DIR) / str(patient_id)
     if patient_folder.exists() and patient_folder.is_dir():
         shutil.rmtree(patient_folder)
@@ -536,88 +638,280 @@ def delete_patient(
     return {"message": "Patient deleted successfully"}
 
 @app.get("/search/")
-def search_patients(
+async def search_patients(
     q: str, 
-    db: Session = Depends(get_db),
+    skip: int = 0,
+    limit: int = search.SEARCH_DEFAULT_LIMIT,
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
     logger.info(f"Search query '{q}' by user: {current_user.username}")
-    patients = crud.search_patients(db, query=q)
+    patients = await crud_async.search_patients(db, query=q, skip=skip, limit=limit)
     return patients
 
 # --- PATIENT FILE UPLOAD ENDPOINTS ---
-UPLOAD_DIR = "uploads"
-if not os.path.exists(UPLOAD_DIR):
-    os.makedirs(UPLOAD_DIR)
+UPLOAD_DIR = uploads.UPLOAD_DIR
 
 @app.post("/patients/{patient_id}/files")
 async def upload_patient_file(
     patient_id: int,
-    file: UploadFile = File(...),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    write_db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Upload one or more files for a patient (multipart, streamed to disk with size and quota limits)"""
+    if not await crud_async.patient_exists(db, patient_id):
+        raise HTTPException(status_code=404, detail="Patient not found")
+    stored_bytes = await crud_async.get_patient_storage_bytes(db, patient_id)
+    staged = await uploads.receive_patient_files(request, patient_id, stored_bytes)
+    files = await run_in_threadpool(_record_patient_files, write_db, staged)
+    logger.info(f"📎 {len(files)} file(s) uploaded for patient {patient_id} by user: {current_user.username}")
+    if len(files) == 1:
+        # Single-file uploads keep the original response shape
+        return {**files[0], "files": files}
+    return {"files": files}
+
+def _record_patient_files(db: Session, staged: list) -> list:
+    """Reference each staged file's content blob, store new content and write the manifest rows"""
+    try:
+        crud.acquire_blob_refs(db, staged)
+        # Placed while the upload_blobs rows are locked, so a concurrent delete cannot remove them.
+        # If the commit then fails, a new blob is left unreferenced and is reused by the next upload.
+        uploads.place_blobs(staged)
+        rows = crud.add_patient_files(db, staged)
+    except Exception:
+        db.rollback()
+        uploads.discard_staged(staged)
+        raise
+    return [schemas.PatientFile.model_validate(row).model_dump(mode="json") for row in rows]
+
+# --- RESUMABLE UPLOADS (tus-style: create, PATCH at offset, finalize) ---
+def _upload_headers(upload: dict) -> dict:
+    return {
+        "Upload-Offset": str(upload["offset"]),
+        "Upload-Length": str(upload["length"]),
+        "Upload-Expires": upload["expires_at"],
+        "Cache-Control": "no-store",
+    }
+
+@app.post("/patients/{patient_id}/uploads", status_code=201)
+async def create_resumable_upload(
+    patient_id: int,
+    upload: schemas.ResumableUploadCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Start a resumable upload; send the bytes with PATCH, then POST .../finalize"""
+    if not await crud_async.patient_exists(db, patient_id):
+        raise HTTPException(status_code=404, detail="Patient not found")
+    stored_bytes = await crud_async.get_patient_storage_bytes(db, patient_id)
+    created = await run_in_threadpool(
+        uploads.create_partial_upload, patient_id, upload.filename, upload.length, current_user.username,
+        stored_bytes, upload.content_type
+    )
+    location = f"/patients/{patient_id}/uploads/{created['id']}"
+    logger.info(f"📎 Resumable upload {created['id']} ({upload.length} bytes) started for patient {patient_id} by user: {current_user.username}")
+    return JSONResponse(status_code=201, content=created, headers={"Location": location, **_upload_headers(created)})
+
+@app.head("/patients/{patient_id}/uploads/{upload_id}")
+async def get_resumable_upload_offset(
+    patient_id: int,
+    upload_id: str,
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Current offset of a resumable upload (resume from Upload-Offset)"""
+    upload = await run_in_threadpool(uploads.get_partial_upload, patient_id, upload_id)
+    return Response(status_code=200, headers=_upload_headers(upload))
+
+@app.patch("/patients/{patient_id}/uploads/{upload_id}", status_code=204)
+async def append_resumable_upload(
+    patient_id: int,
+    upload_id: str,
+    request: Request,
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Append the raw request body at the Upload-Offset header"""
+    if request.headers.get("content-type") != "application/offset+octet-stream":
+        raise HTTPException(status_code=415, detail="Content-Type must be application/offset+octet-stream")
+    offset = request.headers.get("upload-offset", "")
+    if not offset.isdigit():
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required")
+    await uploads.append_to_partial_upload(request, patient_id, upload_id, int(offset))
+    upload = await run_in_threadpool(uploads.get_partial_upload, patient_id, upload_id)
+    return Response(status_code=204, headers=_upload_headers(upload))
+
+@app.post("/patients/{patient_id}/uploads/{upload_id}/finalize")
+async def finalize_resumable_upload(
+    patient_id: int,
+    upload_id: str,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """Upload a file for a patient (single file per request, saves .meta for original filename)"""
-    patient_folder = Path(UPLOAD_DIR) / str(patient_id)
-    patient_folder.mkdir(parents=True, exist_ok=True)
-    file_id = str(uuid.uuid4())
-    ext = Path(file.filename).suffix
-    save_path = patient_folder / f"{file_id}{ext}"
-    with open(save_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    # Save original filename as .meta
-    meta_path = patient_folder / f"{file_id}.meta"
-    with open(meta_path, "w", encoding="utf-8") as meta:
-        meta.write(file.filename)
-    return {"id": file_id, "filename": file.filename}
-
-@app.get("/patients/{patient_id}/files")
-def list_patient_files(
+    """Complete a fully received upload and add it to the patient's files"""
+    staged = await run_in_threadpool(uploads.finalize_partial_upload, patient_id, upload_id)
+    files = await run_in_threadpool(_record_patient_files, db, [staged])
+    logger.info(f"📎 Resumable upload {upload_id} finalized for patient {patient_id} by user: {current_user.username}")
+    return files[0]
+
+@app.delete("/patients/{patient_id}/uploads/{upload_id}", status_code=204)
+async def abort_resumable_upload(
     patient_id: int,
+    upload_id: str,
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Abort a resumable upload and delete the received bytes"""
+    await run_in_threadpool(uploads.discard_partial_upload, patient_id, upload_id)
+    return Response(status_code=204)
+
+@app.get("/admin/storage")
+async def get_upload_storage_stats(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(auth.require_role(["admin"]))
+):
+    """Upload storage use and the bytes saved by deduplicating identical files"""
+    return await crud_async.get_storage_stats(db)
+
+@app.get("/admin/phi/keys")
+def get_phi_key_status(
     db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.require_role(["admin"]))
+):
+    """Configured PHI encryption keys (fingerprints only) and re-encryption progress"""
+    return {
+        "primary_key_id": phi.PRIMARY_KEY_ID,
+        "key_ids": phi.KEY_IDS,
+        "blind_index_key_id": phi.BLIND_INDEX_KEY_ID,
+        "ephemeral_key": phi.EPHEMERAL_KEY,
+        "reencryption_running": phi_rotation.reencryption_job.running,
+        "checkpoints": phi_rotation.checkpoint_status(db)
+    }
+
+@app.post("/admin/phi/reencrypt", status_code=202)
+def start_phi_reencryption(
+    restart: bool = False,
+    current_user: models.User = Depends(auth.require_role(["admin"]))
+):
+    """Start the throttled re-encryption job in this worker (progress: GET /admin/phi/keys)"""
+    if phi.EPHEMERAL_KEY:
+        raise HTTPException(status_code=409, detail="Set ENCRYPTION_KEYS before re-encrypting patient data")
+    if not phi_rotation.reencryption_job.start(restart=restart):
+        raise HTTPException(status_code=409, detail="PHI re-encryption is already running")
+    auth.log_hipaa_event("PHI_REENCRYPTION_STARTED", current_user.username, f"Primary key {phi.PRIMARY_KEY_ID}")
+    return {"status": "started", "primary_key_id": phi.PRIMARY_KEY_ID}
+
+@app.post("/admin/authorizations/reconcile")
+def reconcile_authorization_ledger(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.require_role(["admin"]))
+):
+    """Rebuild the authorization unit ledger (units_used) from attended services"""
+    result = authorization_ledger.reconcile(db)
+    auth.log_hipaa_event(
+        "AUTHORIZATION_LEDGER_RECONCILED", current_user.username,
+        f"{result['services_charged']} service(s) charged, {result['authorizations_corrected']} balance(s) corrected"
+    )
+    return result
+
+@app.get("/exports/{dataset}")
+def export_data(
+    dataset: str,
+    format: str = "csv",
+    columns: str = None,
+    start_date: date = None,
+    end_date: date = None,
+    current_user: models.User = Depends(auth.require_role(["admin", "staff"]))
+):
+    """Stream patients, services or authorizations as CSV or NDJSON
+
+    columns is a comma-separated subset (default: all); start_date/end_date are inclusive
+    and filter patients by created_at, services by service_date and authorizations by
+    auth_start_date.
+    """
+    if format not in exports.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(exports.EXPORT_FORMATS)}")
+    requested = [c.strip() for c in columns.split(",") if c.strip()] if columns else None
+    try:
+        stmt, selected = exports.build_export_query(dataset, requested, start_date, end_date)
+    except exports.ExportRejected as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    description = (f"{dataset} ({format}, {start_date or 'any'} to {end_date or 'any'}, "
+                   f"columns: {','.join(selected)})")
+
+    def audit_export(row_count: int, completed: bool):
+        # One audit record per export, written when the stream ends
+        auth.log_data_export(current_user, description if completed else f"{description} [interrupted]", row_count)
+        logger.info(f"📤 Exported {row_count} {dataset} row(s) as {format} for user: {current_user.username}")
+
+    filename = f"{dataset}_{date.today().isoformat()}.{format}"
+    return StreamingResponse(
+        exports.stream_export(stmt, selected, format, audit_export),
+        media_type=exports.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
+    )
+
+@app.get("/patients/{patient_id}/files", response_model=list[schemas.PatientFile])
+async def list_patient_files(
+    patient_id: int,
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """List all files for a patient"""
-    patient_folder = Path(UPLOAD_DIR) / str(patient_id)
-    if not patient_folder.exists():
-        return []
-    files = []
-    for f in patient_folder.iterdir():
-        if f.is_file() and not f.name.endswith('.meta'):
-            file_id = f.stem
-            ext = f.suffix
-            meta_path = patient_folder / f"{file_id}.meta"
-            if meta_path.exists():
-                with open(meta_path, "r", encoding="utf-8") as meta:
-                    orig_name = meta.read().strip()
-            else:
-                orig_name = f.name
-            files.append({"id": file_id, "filename": orig_name})
-    return files
+    """List all files for a patient with their size and content type"""
+    return await crud_async.get_patient_files(db, patient_id)
+
+@app.get("/patients/{patient_id}/files/archive")
+async def download_patient_files_archive(
+    patient_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Stream all of a patient's files as one zip, built on the fly"""
+    patient = await crud_async.get_patient(db, patient_id, strategy="noload")
+    if patient is None:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    patient_files = await crud_async.get_patient_files(db, patient_id)
+    paths = [uploads.blob_path(f.sha256) for f in patient_files]
+    present = await run_in_threadpool(lambda: [path.is_file() for path in paths])
+    entries = []
+    for patient_file, name, path, exists in zip(
+        patient_files, uploads.archive_names([f.filename for f in patient_files]), paths, present
+    ):
+        if exists:
+            entries.append((name, path, patient_file.created_at))
+        else:
+            logger.error(f"❌ Blob for file {patient_file.id} of patient {patient_id} is missing; left out of the archive")
+    if not entries:
+        raise HTTPException(status_code=404, detail="No files for this patient")
+
+    auth.log_data_export(current_user, f"patient_files (patient {auth.hash_identifier(str(patient_id))})", len(entries))
+    logger.info(f"📦 Streaming {len(entries)} file(s) of patient {patient_id} as a zip for user: {current_user.username}")
+    archive_name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"patient_{patient.patient_number}_files.zip")
+    return StreamingResponse(
+        uploads.stream_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{archive_name}"', "Cache-Control": "no-store"}
+    )
 
 @app.get("/patients/{patient_id}/files/{file_id}")
-def get_patient_file(
+async def get_patient_file(
     patient_id: int,
     file_id: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """Download a file for a patient by file id"""
-    patient_folder = Path(UPLOAD_DIR) / str(patient_id)
-    matches = list(patient_folder.glob(f"{file_id}.*"))
-    matches = [f for f in matches if not f.name.endswith('.meta')]
-    if not matches:
+    """Download a file for a patient by file id (supports Range, If-None-Match and If-Range)"""
+    patient_file = await crud_async.get_patient_file(db, patient_id, file_id)
+    if patient_file is None:
         raise HTTPException(status_code=404, detail="File not found")
-    file_path = matches[0]
-    meta_path = patient_folder / f"{file_id}.meta"
-    if meta_path.exists():
-        with open(meta_path, "r", encoding="utf-8") as meta:
-            orig_name = meta.read().strip()
-    else:
-        orig_name = file_path.name
-    response = FileResponse(file_path)
-    response.headers["Content-Disposition"] = f'inline; filename="{orig_name}"'
-    return response
+    file_path = uploads.blob_path(patient_file.sha256)
+    try:
+        stat_result = await run_in_threadpool(file_path.stat)
+    except FileNotFoundError:
+        logger.error(f"❌ Blob for file {file_id} of patient {patient_id} is missing on disk")
+        raise HTTPException(status_code=404, detail="File not found")
+    return uploads.patient_file_response(request, file_path, stat_result, patient_file)
 
 @app.post("/patients/{patient_id}/services")
 def add_service_entry(
@@ -646,74 +940,20 @@ def add_service_entry(
     return {"success": True, "service": schemas.Service.model_validate(db_service)}
 
 @app.get("/patients/{patient_id}/services")
-def get_patient_services(
+async def get_patient_services(
     patient_id: int,
     sheet_type: str = None,
     service_category: str = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
     """Get services for a specific patient with optional filters"""
-    db_patient = crud.get_patient(db, patient_id)
-    if not db_patient:
+    if not await crud_async.patient_exists(db, patient_id):
         raise HTTPException(status_code=404, detail="Patient not found")
     
     try:
-        # Start with base query for this patient
-        query = db.query(models.Service).filter(models.Service.patient_id == patient_id)
-        
-        # Apply filters if provided
-        if sheet_type:
-            query = query.filter(models.Service.sheet_type == sheet_type)
-        if service_category:
-            query = query.filter(models.Service.service_category == service_category)
-        
-        # Get the services ordered by date
-        services = query.order_by(models.Service.service_date.desc()).all()
-        formatted_services = []
-        for s in services:
-            service_dict = s.__dict__.copy() if hasattr(s, '__dict__') else dict(s)
-            
-            # Extract time value with better logic
-            time_val = None
-            
-            # Debug: Log raw database values for patient services
-            logger.info(f"🔍 Patient Service {s.id} RAW DATA:")
-            logger.info(f"  - service_time: {getattr(s, 'service_time', 'NOT SET')} (type: {type(getattr(s, 'service_time', None))})")
-            logger.info(f"  - service_date: {getattr(s, 'service_date', 'NOT SET')} (type: {type(getattr(s, 'service_date', None))})")
-            
-            # First, try to get service_time directly
-            if hasattr(s, 'service_time') and s.service_time:
-                time_val = s.service_time
-                logger.info(f"  - Using service_time: {time_val}")
-            # If no service_time, try to extract from service_date if it's a datetime
-            elif hasattr(s, 'service_date') and s.service_date:
-                if isinstance(s.service_date, datetime):
-                    # Extract time portion from datetime
-                    time_val = f"{s.service_date.hour:02d}:{s.service_date.minute:02d}"
-                    logger.info(f"  - Extracted from service_date datetime: {time_val}")
-                elif hasattr(s.service_date, 'time'):
-                    # If service_date has a time component
-                    time_obj = s.service_date.time()
-                    time_val = f"{time_obj.hour:02d}:{time_obj.minute:02d}"
-                    logger.info(f"  - Extracted from service_date time: {time_val}")
-                else:
-                    logger.info(f"  - service_date is not datetime: {type(s.service_date)}")
-            else:
-                logger.info(f"  - No time data found")
-            
-            # Format the time
-            formatted_time = format_time_12hr(time_val)
-            service_dict['service_time_formatted'] = formatted_time
-            
-            # Always provide both fields for frontend compatibility
-            service_dict['service_time'] = formatted_time
-            
-            # Debug logging to see what we're sending to frontend
-            logger.info(f"🔍 Patient Service {s.id}: raw_time='{time_val}', formatted='{formatted_time}'")
-            
-            formatted_services.append(schemas.Service.model_validate(service_dict))
-        return formatted_services
+        services = await crud_async.get_patient_services(db, patient_id=patient_id, sheet_type=sheet_type, service_category=service_category)
+        return sheet_response(services, label="Patient Service")
     except Exception as e:
         logger.error(f"Error fetching patient services: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching services: {str(e)}")
@@ -745,108 +985,129 @@ def add_attendance_week(
         logger.error(f"Error creating attendance week: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating attendance entries: {str(e)}")
 
+@app.post("/attendance/roster")
+def add_attendance_roster(
+    roster: schemas.AttendanceRosterCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Add a week of attendance for a whole group of patients in one transaction"""
+    # Validate service type is attendance-based
+    if roster.service_type not in ["PSR", "TMS"]:
+        raise HTTPException(status_code=400, detail="Service type must be PSR or TMS for attendance tracking")
+    
+    patient_ids = [entry.patient_id for entry in roster.entries]
+    if not patient_ids:
+        raise HTTPException(status_code=400, detail="Roster must include at least one patient")
+    if len(set(patient_ids)) != len(patient_ids):
+        raise HTTPException(status_code=400, detail="Each patient may appear only once in a roster")
+    
+    missing_ids = set(patient_ids) - crud.get_existing_patient_ids(db, patient_ids)
+    if missing_ids:
+        raise HTTPException(status_code=404, detail=f"Patients not found: {sorted(missing_ids)}")
+    
+    try:
+        created_services = crud.add_attendance_roster(db, roster=roster)
+        return {
+            "success": True,
+            "message": f"Created {len(created_services)} attendance entries for {len(patient_ids)} patients",
+            "services": [schemas.Service.model_validate(s) for s in created_services]
+        }
+    except Exception as e:
+        logger.error(f"Error creating attendance roster: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error creating attendance entries: {str(e)}")
+
+def sheet_response(rows, label: str, limit: int = None) -> ORJSONResponse:
+    """Sheet rows as JSON, encoded by orjson directly (dates and datetimes natively)
+
+    Returning the response skips FastAPI's jsonable_encoder walk over every row. For
+    paged sheets (limit given), the next-page cursor is exposed in X-Next-Cursor when
+    the page came back full.
+    """
+    response = ORJSONResponse(serialize_service_rows(rows, label=label))
+    if limit is not None and rows and len(rows) >= crud.clamp_sheet_limit(limit):
+        response.headers["X-Next-Cursor"] = crud.encode_sheet_cursor(rows[-1])
+    return response
+
 @app.get("/attendance")
-def get_attendance_sheet(
+async def get_attendance_sheet(
     patient_id: int = None,
     service_type: str = None,
     week_start: date = None,
-    db: Session = Depends(get_db),
+    start_date: date = None,
+    end_date: date = None,
+    cursor: str = None,
+    limit: int = crud.SHEET_DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """Get attendance sheet data with optional filters"""
+    """Get a page of attendance sheet data with optional filters (next page via X-Next-Cursor)"""
     try:
-        services = crud.get_attendance_services(db, patient_id=patient_id, service_type=service_type, week_start=week_start)
-        formatted_services = []
-        for s in services:
-            service_dict = s.__dict__.copy() if hasattr(s, '__dict__') else dict(s)
-            
-            # Extract time value with better logic
-            time_val = None
-            
-            # First, try to get service_time directly
-            if hasattr(s, 'service_time') and s.service_time:
-                time_val = s.service_time
-            # If no service_time, try to extract from service_date if it's a datetime
-            elif hasattr(s, 'service_date') and s.service_date:
-                if isinstance(s.service_date, datetime):
-                    # Extract time portion from datetime
-                    time_val = f"{s.service_date.hour:02d}:{s.service_date.minute:02d}"
-                elif hasattr(s.service_date, 'time'):
-                    # If service_date has a time component
-                    time_obj = s.service_date.time()
-                    time_val = f"{time_obj.hour:02d}:{time_obj.minute:02d}"
-            
-            # Format the time
-            formatted_time = format_time_12hr(time_val)
-            service_dict['service_time_formatted'] = formatted_time
-            
-            # Always provide both fields for frontend compatibility
-            service_dict['service_time'] = formatted_time
-            
-            formatted_services.append(schemas.Service.model_validate(service_dict))
-        return formatted_services
+        services = await crud_async.get_attendance_services(
+            db, patient_id=patient_id, service_type=service_type, week_start=week_start,
+            start_date=start_date, end_date=end_date, cursor=cursor, limit=limit
+        )
+        return sheet_response(services, label="Attendance Service", limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching attendance data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching attendance data: {str(e)}")
 
 @app.get("/appointments") 
-def get_appointment_sheet(
+async def get_appointment_sheet(
     patient_id: int = None,
     service_type: str = None,
-    db: Session = Depends(get_db),
+    start_date: date = None,
+    end_date: date = None,
+    cursor: str = None,
+    limit: int = crud.SHEET_DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """Get appointment sheet data with optional filters"""
+    """Get a page of appointment sheet data with optional filters (next page via X-Next-Cursor)"""
     try:
-        services = crud.get_appointment_services(db, patient_id=patient_id, service_type=service_type)
-        formatted_services = []
-        for s in services:
-            service_dict = s.__dict__.copy() if hasattr(s, '__dict__') else dict(s)
-            
-            # Extract time value with better logic
-            time_val = None
-            
-            # Debug: Log raw database values for appointments
-            logger.info(f"🔍 Appointment Service {s.id} RAW DATA:")
-            logger.info(f"  - service_time: {getattr(s, 'service_time', 'NOT SET')} (type: {type(getattr(s, 'service_time', None))})")
-            logger.info(f"  - service_date: {getattr(s, 'service_date', 'NOT SET')} (type: {type(getattr(s, 'service_date', None))})")
-            
-            # First, try to get service_time directly
-            if hasattr(s, 'service_time') and s.service_time:
-                time_val = s.service_time
-                logger.info(f"  - Using service_time: {time_val}")
-            # If no service_time, try to extract from service_date if it's a datetime
-            elif hasattr(s, 'service_date') and s.service_date:
-                if isinstance(s.service_date, datetime):
-                    # Extract time portion from datetime
-                    time_val = f"{s.service_date.hour:02d}:{s.service_date.minute:02d}"
-                    logger.info(f"  - Extracted from service_date datetime: {time_val}")
-                elif hasattr(s.service_date, 'time'):
-                    # If service_date has a time component
-                    time_obj = s.service_date.time()
-                    time_val = f"{time_obj.hour:02d}:{time_obj.minute:02d}"
-                    logger.info(f"  - Extracted from service_date time: {time_val}")
-                else:
-                    logger.info(f"  - service_date is not datetime: {type(s.service_date)}")
-            else:
-                logger.info(f"  - No time data found")
-            
-            # Format the time
-            formatted_time = format_time_12hr(time_val)
-            service_dict['service_time_formatted'] = formatted_time
-            
-            # Always provide both fields for frontend compatibility
-            service_dict['service_time'] = formatted_time
-            
-            # Debug logging to see what we're sending to frontend
-            logger.info(f"🔍 Appointment Service {s.id}: raw_time='{time_val}', formatted='{formatted_time}'")
-            
-            formatted_services.append(schemas.Service.model_validate(service_dict))
-        return formatted_services
+        services = await crud_async.get_appointment_services(
+            db, patient_id=patient_id, service_type=service_type,
+            start_date=start_date, end_date=end_date, cursor=cursor, limit=limit
+        )
+        return sheet_response(services, label="Appointment Service", limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching appointment data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching appointment data: {str(e)}")
 
+@app.get("/calendar/{year}/{month}", response_model=dict[str, list[schemas.CalendarService]])
+async def get_calendar_month(
+    year: int,
+    month: int,
+    service_category: str = "appointment",
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Get a month of services grouped by date, with patient names joined in (month is 1-12)"""
+    if year < 1 or year > 9999:
+        raise HTTPException(status_code=400, detail="Year must be between 1 and 9999")
+    if month < 1 or month > 12:
+        raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
+
+    try:
+        rows = await crud_async.get_services_for_month(db, year=year, month=month, service_category=service_category)
+        services_by_date = {}
+        for s, first_name, last_name, patient_number in rows:
+            service_dict = schemas.Service.model_validate(s).model_dump()
+            service_dict['service_time_formatted'] = format_time_12hr(s.service_time)
+            service_dict['patient_name'] = f"{first_name} {last_name}"
+            service_dict['patient_number'] = patient_number
+            services_by_date.setdefault(s.service_date.isoformat(), []).append(
+                schemas.CalendarService(**service_dict)
+            )
+        return services_by_date
+    except Exception as e:
+        logger.error(f"Error fetching calendar data: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching calendar data: {str(e)}")
+
 @app.put("/services/{service_id}")
 def update_service_entry(
     service_id: int,
@@ -904,13 +1165,11 @@ def add_recurring_service_entry(
             day = min(service_date.day, calendar.monthrange(year, month)[1])
             service.recurring_end_date = date(year, month, day)
         
-        # Create parent service
-        db_service = crud.add_service_entry(db, patient_id=patient_id, service=service)
-        
-        # Create all recurring instances
-        created_ids = crud.create_recurring_appointments(
+        # Create the parent service and all recurring instances in one transaction
+        db_service, created_ids = crud.create_recurring_service(
             db=db, 
-            parent_service=db_service,
+            patient_id=patient_id,
+            service=service,
             recurring_type=recurring_type,
             recurring_days=recurring_days,
             weeks_count=weeks_count,
@@ -932,16 +1191,15 @@ def add_recurring_service_entry(
 
 # Authorization Endpoints
 @app.get("/patients/{patient_id}/authorizations", response_model=list[schemas.Authorization])
-def get_patient_authorizations(
+async def get_patient_authorizations(
     patient_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
     """Get all authorizations for a patient"""
-    db_patient = crud.get_patient(db, patient_id=patient_id)
-    if db_patient is None:
+    if not await crud_async.patient_exists(db, patient_id):
         raise HTTPException(status_code=404, detail="Patient not found")
-    return crud.get_authorizations(db, patient_id=patient_id)
+    return await crud_async.get_authorizations(db, patient_id=patient_id)
 
 @app.post("/patients/{patient_id}/authorizations", response_model=schemas.Authorization)
 def create_patient_authorization(
@@ -1025,6 +1283,35 @@ def create_patient_authorization(
         logger.error(f"Error creating authorization: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error creating authorization: {str(e)}")
 
+@app.get("/authorizations/watchlist")
+def get_authorization_watchlist(
+    days: int = watchlist.WATCHLIST_EXPIRY_DAYS,
+    low_units: int = watchlist.WATCHLIST_LOW_UNITS,
+    skip: int = 0,
+    limit: int = watchlist.WATCHLIST_DEFAULT_PAGE_SIZE,
+    live: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Authorizations expiring within `days` or with `low_units` or fewer units left, soonest expiry first
+
+    Served from the daily snapshot when days/low_units are the configured defaults
+    (as_of tells when it was computed); other values or live=true query the tables.
+    """
+    if days < 0 or skip < 0:
+        raise HTTPException(status_code=400, detail="days and skip must not be negative")
+    return watchlist.get_watchlist(db, expiry_days=days, low_units=low_units, skip=skip, limit=limit, live=live)
+
+@app.post("/authorizations/watchlist/refresh")
+def refresh_authorization_watchlist(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.require_role(["admin"]))
+):
+    """Recompute today's watchlist snapshot now (it is otherwise refreshed once a day)"""
+    watchlist.refresh_snapshot(db, force=True)
+    snapshot = db.get(models.WatchlistSnapshot, date.today())
+    return {"snapshot_date": snapshot.snapshot_date, "computed_at": snapshot.computed_at, "entries": snapshot.entries}
+
 @app.get("/authorizations/{authorization_id}", response_model=schemas.Authorization)
 def get_authorization(
     authorization_id: int,
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Date, Float, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, Boolean, Date, Float, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy.orm import relationship, backref, configure_mappers
 from datetime import datetime
+from phi import EncryptedString, EncryptedText
 
 Base = declarative_base()
 
@@ -10,15 +11,17 @@ class Patient(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     patient_number = Column(String, unique=True, index=True, nullable=False)
-    first_name = Column(String, nullable=False)  # Should be encrypted in production
-    last_name = Column(String, nullable=False)   # Should be encrypted in production
+    # EncryptedString/EncryptedText columns hold Fernet ciphertext: search them via
+    # patient_search_tokens (search.py), never with SQL filters or ORDER BY
+    first_name = Column(EncryptedString, nullable=False)
+    last_name = Column(EncryptedString, nullable=False)
     address = Column(Text)                       # Should be encrypted in production
     date_of_birth = Column(Date)                 # Should be encrypted in production
     phone = Column(String)                       # Should be encrypted in production
-    ssn = Column(String)                         # Should be encrypted in production
-    medicaid_id = Column(String)                 # Should be encrypted in production
+    ssn = Column(EncryptedString)
+    medicaid_id = Column(EncryptedString)
     insurance = Column(String)
-    insurance_id = Column(String)                # Should be encrypted in production
+    insurance_id = Column(EncryptedString)
     referal = Column(String)
     psr_date = Column(Date)
     authorization = Column(String)
@@ -27,7 +30,7 @@ class Patient(Base):
     auth_start_date = Column(Date)
     auth_end_date = Column(Date)
     auth_diagnosis_code = Column(String)
-    diagnosis = Column(Text)                     # Should be encrypted in production
+    diagnosis = Column(EncryptedText)
     start_date = Column(Date)
     end_date = Column(Date)
     code1 = Column(String)
@@ -48,6 +51,11 @@ class Patient(Base):
         backref=backref("patient"),
         cascade="all, delete-orphan"
     )
+    
+    # Watchlist: patient-level authorizations expiring in a date window
+    __table_args__ = (
+        Index("ix_patients_auth_end_date_id", "auth_end_date", "id"),
+    )
 
 class User(Base):
     __tablename__ = "users"
@@ -91,6 +99,12 @@ class Service(Base):
     recurring_end_date = Column(Date, nullable=True)  # End date for recurring series
     parent_service_id = Column(Integer, ForeignKey("services.id", ondelete="SET NULL"), nullable=True)  # Parent service for recurring series
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Sheet queries filter by category (and optionally patient) and page by (date, time, id)
+    __table_args__ = (
+        Index("ix_services_category_date_time_id", "service_category", "service_date", "service_time", "id"),
+        Index("ix_services_patient_date_time_id", "patient_id", "service_date", "service_time", "id"),
+    )
 
 class Authorization(Base):
     __tablename__ = "authorizations"
@@ -102,8 +116,111 @@ class Authorization(Base):
     auth_start_date = Column(Date, nullable=True)
     auth_end_date = Column(Date, nullable=True)
     auth_diagnosis_code = Column(String, nullable=True)
+    units_used = Column(Integer, nullable=False, default=0, server_default="0")  # Attended services charged (authorization_ledger.py)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship to patient
-    patient = relationship("Patient", backref=backref("authorizations", cascade="all, delete-orphan"))
\ No newline at end of file
+    patient = relationship("Patient", backref=backref("authorizations", cascade="all, delete-orphan"))
+    
+    # Watchlist: authorizations expiring in a date window, in expiry order; per-patient lookups
+    __table_args__ = (
+        Index("ix_authorizations_end_date_id", "auth_end_date", "id"),
+        Index("ix_authorizations_patient_id", "patient_id"),
+    )
+
+class AuthorizationUsage(Base):
+    """Ledger entry: the authorization an attended service uses a unit of (see authorization_ledger.py)"""
+    __tablename__ = "authorization_usage"
+    
+    service_id = Column(Integer, ForeignKey("services.id", ondelete="CASCADE"), primary_key=True)
+    authorization_id = Column(Integer, ForeignKey("authorizations.id", ondelete="CASCADE"), nullable=False, index=True)
+
+class WatchlistSnapshot(Base):
+    """The day's precomputed authorization watchlist (see watchlist.py); one row"""
+    __tablename__ = "authorization_watchlist_snapshots"
+    
+    snapshot_date = Column(Date, primary_key=True)
+    computed_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expiry_days = Column(Integer, nullable=False)   # Settings the entries were computed with
+    low_units = Column(Integer, nullable=False)
+    entries = Column(Integer, nullable=False, default=0)
+
+class WatchlistEntry(Base):
+    """An authorization on the current watchlist snapshot (ids and dates only, no PHI)"""
+    __tablename__ = "authorization_watchlist_entries"
+    
+    id = Column(Integer, primary_key=True)
+    authorization_id = Column(Integer, nullable=True)  # None: patient-level authorization fields
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False)
+    auth_number = Column(String, nullable=True)
+    auth_start_date = Column(Date, nullable=True)
+    auth_end_date = Column(Date, nullable=True)
+    auth_units = Column(Integer, nullable=True)
+    units_used = Column(Integer, nullable=True)
+    expiring = Column(Boolean, nullable=False, default=False)
+    low_balance = Column(Boolean, nullable=False, default=False)
+    
+    # Pages are read in expiry order
+    __table_args__ = (
+        Index("ix_authorization_watchlist_entries_end_date_id", "auth_end_date", "id"),
+    )
+
+class UploadBlob(Base):
+    """One stored copy of an uploaded file's content (UPLOAD_DIR/blobs/, keyed by SHA-256)"""
+    __tablename__ = "upload_blobs"
+    
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # patient_files rows pointing at this blob
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PatientFile(Base):
+    """Manifest row for an uploaded patient document (a reference to its content blob)"""
+    __tablename__ = "patient_files"
+    
+    id = Column(String(36), primary_key=True)  # UUID
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), nullable=False)
+    filename = Column(String, nullable=False)  # Original name as uploaded
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=False, default="application/octet-stream")
+    sha256 = Column(String(64), ForeignKey("upload_blobs.sha256"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    patient = relationship("Patient", backref=backref("files", cascade="all, delete-orphan"))
+    
+    # File lists are per patient, oldest first
+    __table_args__ = (
+        Index("ix_patient_files_patient_created", "patient_id", "created_at"),
+    )
+
+class PatientSearchToken(Base):
+    """HMAC blind-index token for one of a patient's encrypted fields (see phi.blind_index_tokens)"""
+    __tablename__ = "patient_search_tokens"
+
+    token = Column(String(32), primary_key=True)  # Searches look up by token first
+    patient_id = Column(Integer, ForeignKey("patients.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+class ReencryptionCheckpoint(Base):
+    """Progress of the PHI re-encryption job for one table (see phi_rotation.py)"""
+    __tablename__ = "phi_reencryption_checkpoints"
+
+    target = Column(String, primary_key=True)       # Table being walked, e.g. "patients"
+    key_id = Column(String(12), nullable=False)     # Primary key fingerprint the rows are moved to
+    last_id = Column(Integer, nullable=False, default=0)  # Keyset position: rows up to here are done
+    rows_scanned = Column(Integer, nullable=False, default=0)
+    rows_rewritten = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+class PhiKeyFingerprint(Base):
+    """Fingerprint of a key that stored data depends on, checked at startup (see phi_rotation.verify_keys)"""
+    __tablename__ = "phi_key_fingerprints"
+
+    purpose = Column(String, primary_key=True)      # e.g. "blind_index": the key patient_search_tokens were built with
+    key_id = Column(String(12), nullable=False)     # phi.key_id() of that key
+    recorded_at = Column(DateTime, default=datetime.utcnow)
+
+# Resolve backrefs (e.g. Patient.authorizations) now so they can be used in loader options
+configure_mappers()
@@ -0,0 +1,209 @@
+# --- Bulk Patient Import ---
+# CSV intake for new contracts (POST /patients/import and import_patients.py). The file
+# is parsed as a stream, validated IMPORT_BATCH_SIZE rows at a time against
+# schemas.PatientCreate / schemas.AuthorizationCreate, and every batch is loaded in one
+# transaction: a multi-row INSERT ... RETURNING for patients, then their search tokens
+# and Authorization rows. Bad rows are skipped and listed in the report; they never
+# block the rest of the file.
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import List
+import csv
+import io
+import os
+import models
+import schemas
+import search
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))  # Rows validated and committed together
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", 1000))  # Row errors listed in the report
+
+REQUIRED_COLUMNS = {"patient_number", "first_name", "last_name"}
+PATIENT_COLUMNS = set(schemas.PatientCreate.model_fields)
+AUTHORIZATION_FIELDS = ["auth_number", "auth_units", "auth_start_date", "auth_end_date", "auth_diagnosis_code"]
+
+_patients_adapter = TypeAdapter(List[schemas.PatientCreate])
+_authorizations_adapter = TypeAdapter(List[schemas.AuthorizationCreate])
+
+class ImportRejected(Exception):
+    """The file cannot be imported at all (e.g. missing required columns)"""
+
+def _column_name(header: str) -> str:
+    """"Patient Number" / "patient-number" -> patient_number"""
+    return "_".join(header.strip().lower().replace("-", " ").split())
+
+def _error_messages(error: dict) -> str:
+    field = ".".join(str(part) for part in error["loc"][1:]) or "row"
+    return f"{field}: {error['msg']}"
+
+class ImportReport:
+    def __init__(self, dry_run: bool):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.imported = 0
+        self.authorizations = 0
+        self.failed = 0
+        self.errors = []
+        self.ignored_columns = []
+        self.aborted = None  # Why reading stopped early (earlier batches stay imported)
+
+    def reject(self, line: int, patient_number, messages: list):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"row": line, "patient_number": patient_number, "errors": messages})
+
+    def as_dict(self) -> dict:
+        return {
+            "dry_run": self.dry_run,
+            "rows": self.rows,
+            "imported": self.imported,
+            "authorizations": self.authorizations,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda e: e["row"]),
+            "errors_truncated": self.failed > len(self.errors),
+            "ignored_columns": self.ignored_columns,
+            "aborted": self.aborted,
+        }
+
+def _validate(batch: list, report: ImportReport) -> list:
+    """Validate a batch in one call per schema; returns (line, patient, authorization or None) for valid rows"""
+    lines = [line for line, _ in batch]
+    raw = [row for _, row in batch]
+    problems = {}
+
+    def collect(adapter, values, positions):
+        try:
+            return adapter.validate_python(values)
+        except ValidationError as e:
+            for error in e.errors():
+                messages = problems.setdefault(positions[error["loc"][0]], [])
+                message = _error_messages(error)
+                if message not in messages:  # auth_* dates are checked by both schemas
+                    messages.append(message)
+            return None
+
+    positions = list(range(len(raw)))
+    auth_positions = [i for i in positions if any(raw[i].get(f) is not None for f in AUTHORIZATION_FIELDS)]
+    collect(_patients_adapter, raw, positions)
+    collect(_authorizations_adapter, [{f: raw[i].get(f) for f in AUTHORIZATION_FIELDS} for i in auth_positions], auth_positions)
+
+    # Validation errors carry no partial results: validate the good rows again
+    valid = [i for i in positions if i not in problems]
+    patients = _patients_adapter.validate_python([raw[i] for i in valid])
+    auth_valid = [i for i in auth_positions if i not in problems]
+    authorizations = dict(zip(auth_valid, _authorizations_adapter.validate_python(
+        [{f: raw[i].get(f) for f in AUTHORIZATION_FIELDS} for i in auth_valid]
+    )))
+
+    for i, messages in sorted(problems.items()):
+        report.reject(lines[i], raw[i].get("patient_number"), messages)
+    return [(lines[i], patient, authorizations.get(i)) for i, patient in zip(valid, patients)]
+
+def _insert_batch(db: Session, rows: list) -> tuple:
+    """Insert patients, their search tokens and authorizations; returns (patient values, authorizations inserted)"""
+    values = [patient.model_dump() for _, patient, _ in rows]
+    created = db.execute(
+        insert(models.Patient).returning(models.Patient.id, models.Patient.patient_number), values
+    ).all()
+    ids = {row.patient_number: row.id for row in created}
+    for patient in values:
+        patient["id"] = ids[patient["patient_number"]]
+    search.insert_search_tokens(db, values)
+
+    authorizations = [
+        {**authorization.model_dump(), "patient_id": ids[patient.patient_number]}
+        for _, patient, authorization in rows if authorization is not None
+    ]
+    if authorizations:
+        db.execute(insert(models.Authorization), authorizations)
+    return values, len(authorizations)
+
+def _load(db: Session, rows: list, report: ImportReport):
+    """Load one validated batch in its own transaction"""
+    numbers = [patient.patient_number for _, patient, _ in rows]
+    existing = set(db.scalars(select(models.Patient.patient_number).where(models.Patient.patient_number.in_(numbers))))
+    for line, patient, _ in rows:
+        if patient.patient_number in existing:
+            report.reject(line, patient.patient_number, ["patient_number: already exists"])
+    rows = [row for row in rows if row[1].patient_number not in existing]
+    if not rows or report.dry_run:
+        report.imported += len(rows)
+        report.authorizations += sum(1 for row in rows if row[2] is not None)
+        return
+
+    try:
+        patients, authorizations = _insert_batch(db, rows)
+        db.commit()
+    except IntegrityError:
+        # Lost a race with another writer: load the batch row by row to find the culprits
+        db.rollback()
+        patients, authorizations = [], 0
+        for row in rows:
+            try:
+                inserted = _insert_batch(db, [row])
+                db.commit()
+            except IntegrityError as e:
+                db.rollback()
+                report.reject(row[0], row[1].patient_number, [f"database: {e.orig}"])
+                continue
+            patients.extend(inserted[0])
+            authorizations += inserted[1]
+    for patient in patients:
+        search.ngram_index.upsert_values(patient["id"], patient)
+    report.imported += len(patients)
+    report.authorizations += authorizations
+
+def import_patients_csv(db: Session, text_stream, batch_size: int = IMPORT_BATCH_SIZE, dry_run: bool = False) -> dict:
+    """Import patients from a CSV text stream (header row = PatientCreate field names)
+
+    Rows are read lazily, so memory use depends on batch_size, not on the file size.
+    Raises ImportRejected if the header lacks the required columns.
+    """
+    reader = csv.reader(text_stream)
+    try:
+        header = next(reader, None)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportRejected(f"Unreadable header row (expected a UTF-8 CSV file): {e}")
+    if not header:
+        raise ImportRejected("The file is empty")
+    columns = [_column_name(h) for h in header]
+    missing = REQUIRED_COLUMNS - set(columns)
+    if missing:
+        raise ImportRejected(f"Missing required column(s): {', '.join(sorted(missing))}")
+
+    report = ImportReport(dry_run)
+    report.ignored_columns = sorted(set(c for c in columns if c and c not in PATIENT_COLUMNS))
+    seen_numbers = set()
+    batch = []
+    try:
+        for values in reader:
+            if not any(v.strip() for v in values):
+                continue  # Blank line
+            report.rows += 1
+            line = reader.line_num
+            row = {
+                column: (value.strip() or None)
+                for column, value in zip(columns, values) if column in PATIENT_COLUMNS
+            }
+            number = row.get("patient_number")
+            if number in seen_numbers:
+                report.reject(line, number, ["patient_number: duplicated earlier in the file"])
+                continue
+            if number:
+                seen_numbers.add(number)
+            batch.append((line, row))
+            if len(batch) >= batch_size:
+                _load(db, _validate(batch, report), report)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        batch = []  # The batch in progress is dropped with the unreadable part of the file
+        report.aborted = f"Stopped reading after line {reader.line_num}: {e}"
+    if batch:
+        _load(db, _validate(batch, report), report)
+    return report.as_dict()
+
+def open_csv_text(binary_file) -> io.TextIOWrapper:
+    """Text view of an uploaded/opened CSV file (UTF-8, with or without a BOM)"""
+    return io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
@@ -0,0 +1,278 @@
+# --- PHI Column Encryption ---
+# Fernet-encrypted patient columns (EncryptedString) plus HMAC blind indexes, so
+# identifiers stay searchable by exact value and prefix without decrypting rows.
+# Blind-index tokens live in patient_search_tokens and are maintained by search.py.
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from dotenv import load_dotenv
+from sqlalchemy import String, Text
+from sqlalchemy.types import TypeDecorator
+import hashlib
+import hmac
+import logging
+import os
+import re
+import time
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Encryption keys for PHI data (should be stored securely). ENCRYPTION_KEYS lists every
+# key in use, newest first: new values are encrypted with the first, reads try each in
+# turn, and phi_rotation.py re-encrypts old rows so retired keys can be removed.
+# A single ENCRYPTION_KEY is the one-key form of the same setting.
+_configured_keys = [key.strip() for key in os.getenv("ENCRYPTION_KEYS", "").split(",") if key.strip()]
+if not _configured_keys and os.getenv("ENCRYPTION_KEY"):
+    _configured_keys = [os.getenv("ENCRYPTION_KEY")]
+EPHEMERAL_KEY = not _configured_keys  # True when data encrypted now is unreadable after a restart
+if not _configured_keys:
+    # Generate a new key if none exists (main.py refuses to start if patients hold ciphertext)
+    _configured_keys = [Fernet.generate_key().decode()]
+    print(f"⚠️  Generated new encryption key: {_configured_keys[0]}")
+    print("⚠️  Add this to your .env file: ENCRYPTION_KEY=" + _configured_keys[0])
+
+def key_id(key: str) -> str:
+    """Short, non-secret fingerprint naming a key in logs, status and checkpoints"""
+    return hashlib.sha256(key.encode()).hexdigest()[:12]
+
+_fernets = []
+for _position, _key in enumerate(_configured_keys):
+    try:
+        _fernets.append(Fernet(_key.encode()))
+    except (ValueError, TypeError) as e:
+        # Never swap in a generated key: data written with it would orphan the existing ciphertext
+        raise ValueError(f"Invalid encryption key #{_position + 1} in ENCRYPTION_KEYS/ENCRYPTION_KEY: {e}") from None
+
+ENCRYPTION_KEY = _configured_keys[0]  # Primary key: every new value is encrypted with it
+KEY_IDS = [key_id(key) for key in _configured_keys]
+PRIMARY_KEY_ID = KEY_IDS[0]
+primary_cipher = _fernets[0]
+cipher_suite = MultiFernet(_fernets)
+
+# HMAC key for blind indexes. Defaults to one derived from the oldest configured key, so
+# adding a new primary key keeps existing tokens valid; set BLIND_INDEX_KEY (e.g. to
+# `python rotate_phi_keys.py --print-blind-index-key`) before retiring that key.
+# Changing it requires rebuilding patient_search_tokens (alembic downgrade/upgrade of
+# the encryption revision)
+BLIND_INDEX_KEY = os.getenv("BLIND_INDEX_KEY") or hmac.new(
+    _configured_keys[-1].encode(), b"patient-blind-index", hashlib.sha256
+).hexdigest()
+BLIND_INDEX_KEY_ID = key_id(BLIND_INDEX_KEY)  # Recorded with the tokens; a different key finds none of them
+BLIND_INDEX_TOKEN_LENGTH = 32  # Hex characters kept from each HMAC-SHA256 (128 bits)
+BLIND_INDEX_MIN_PREFIX = int(os.getenv("BLIND_INDEX_MIN_PREFIX", 3))   # Shorter prefixes are not indexed (they leak too much)
+BLIND_INDEX_MAX_PREFIX = int(os.getenv("BLIND_INDEX_MAX_PREFIX", 24))  # Longer search words match on their first N characters
+PHI_PLAINTEXT_CACHE_SIZE = int(os.getenv("PHI_PLAINTEXT_CACHE_SIZE", 4096))  # Decrypted values remembered per request
+UNDECRYPTABLE_LOG_INTERVAL_SECONDS = 60  # Undecryptable values are logged at most this often (with a count)
+
+# Read in place of ciphertext that none of the configured keys can decrypt. EncryptedString
+# refuses to write it back, so a form round-trip cannot overwrite the stored ciphertext.
+UNDECRYPTABLE = "[undecryptable]"
+
+# Encrypted patient columns that get blind indexes, and how they can be searched:
+# "prefix" fields match any word by prefix (names, diagnosis words) or the whole
+# normalized identifier by prefix; "exact" fields only match the whole identifier.
+BLIND_INDEX_FIELDS = {
+    "first_name": ("words", "prefix"),
+    "last_name": ("words", "prefix"),
+    "diagnosis": ("words", "prefix"),
+    "medicaid_id": ("identifier", "prefix"),
+    "ssn": ("identifier", "exact"),
+    "insurance_id": ("identifier", "exact"),
+}
+
+_WORD_SPLIT = re.compile(r"[\W_]+")
+_FERNET_PREFIX = "gAAAAA"  # Version byte 0x80 plus the high timestamp bytes, base64-encoded
+
+def _words(value: str) -> list:
+    return [word for word in _WORD_SPLIT.split(value.lower()) if word]
+
+def _identifier(value: str) -> str:
+    """Identifiers compare without case, spaces or punctuation ("123-45-6789" == "123456789")"""
+    return "".join(_WORD_SPLIT.split(value.lower()))
+
+def _token(field: str, text: str) -> str:
+    message = f"{field}\x00{text}".encode()
+    return hmac.new(BLIND_INDEX_KEY.encode(), message, hashlib.sha256).hexdigest()[:BLIND_INDEX_TOKEN_LENGTH]
+
+def _prefix_tokens(field: str, term: str) -> set:
+    if len(term) < BLIND_INDEX_MIN_PREFIX:
+        return {_token(field, term)}
+    return {_token(field, term[:n]) for n in range(BLIND_INDEX_MIN_PREFIX, min(len(term), BLIND_INDEX_MAX_PREFIX) + 1)}
+
+def blind_index_tokens(field: str, value) -> set:
+    """Every token stored for one plaintext field value"""
+    if not value:
+        return set()
+    normalizer, match = BLIND_INDEX_FIELDS[field]
+    terms = _words(str(value)) if normalizer == "words" else [_identifier(str(value))]
+    tokens = set()
+    for term in terms:
+        if not term:
+            continue
+        tokens |= _prefix_tokens(field, term) if match == "prefix" else {_token(field, term)}
+    return tokens
+
+def query_tokens(query: str):
+    """Tokens to look up for a search query
+
+    Returns (word_tokens, identifier_tokens): a patient matches when every query word
+    hits one of its word tokens, or when the whole query hits an identifier token.
+    """
+    word_tokens = []
+    for word in _words(query):
+        term = word[:BLIND_INDEX_MAX_PREFIX]
+        word_tokens.append({
+            _token(field, term) for field, (normalizer, _) in BLIND_INDEX_FIELDS.items() if normalizer == "words"
+        })
+
+    identifier = _identifier(query)
+    identifier_tokens = set()
+    if identifier:
+        for field, (normalizer, match) in BLIND_INDEX_FIELDS.items():
+            if normalizer != "identifier":
+                continue
+            if match == "prefix":
+                identifier_tokens.add(_token(field, identifier[:BLIND_INDEX_MAX_PREFIX]))
+            else:
+                identifier_tokens.add(_token(field, identifier))
+    return word_tokens, identifier_tokens
+
+# --- Encryption and request-scoped plaintext cache ---
+
+class PlaintextCache:
+    """Bounded LRU of ciphertext -> plaintext"""
+
+    def __init__(self, max_size: int = PHI_PLAINTEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self._values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        value = self._values.get(token)
+        if value is not None:
+            self._values.move_to_end(token)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return value
+
+    def put(self, token: str, value: str):
+        self._values[token] = value
+        self._values.move_to_end(token)
+        while len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+
+_request_cache: ContextVar = ContextVar("phi_plaintext_cache", default=None)
+
+@contextmanager
+def plaintext_cache(max_size: int = PHI_PLAINTEXT_CACHE_SIZE):
+    """Scope a plaintext cache to a block (one per request); it is dropped on exit"""
+    cache = PlaintextCache(max_size)
+    reset_token = _request_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _request_cache.reset(reset_token)
+
+def is_encrypted(value) -> bool:
+    return isinstance(value, str) and value.startswith(_FERNET_PREFIX)
+
+def encrypt(value: str) -> str:
+    if not value:
+        return value
+    return cipher_suite.encrypt(value.encode()).decode()
+
+def needs_rotation(value) -> bool:
+    """True for plaintext and for ciphertext not written with the primary key"""
+    if not value:
+        return False
+    if not is_encrypted(value):
+        return True
+    try:
+        primary_cipher.decrypt(value.encode())
+        return False
+    except InvalidToken:
+        return True
+
+def rotate(value: str) -> str:
+    """Re-encrypt a value with the primary key (plaintext is encrypted)"""
+    if not is_encrypted(value):
+        return encrypt(value)
+    return cipher_suite.rotate(value.encode()).decode()
+
+_undecryptable = {"count": 0, "logged_at": None}
+
+def _report_undecryptable():
+    """Log (throttled) that stored ciphertext could not be decrypted: a wrong or missing key"""
+    _undecryptable["count"] += 1
+    now = time.monotonic()
+    if _undecryptable["logged_at"] is None or now - _undecryptable["logged_at"] >= UNDECRYPTABLE_LOG_INTERVAL_SECONDS:
+        logger.error(
+            f"❌ {_undecryptable['count']} PHI value(s) could not be decrypted with keys {', '.join(KEY_IDS)}; "
+            "add the key this data was written with to ENCRYPTION_KEYS"
+        )
+        _undecryptable["count"] = 0
+        _undecryptable["logged_at"] = now
+
+def _decrypt_uncached(value: str) -> str:
+    if not is_encrypted(value):
+        return value  # Rows written before the encryption migration
+    try:
+        return cipher_suite.decrypt(value.encode()).decode()
+    except InvalidToken:
+        _report_undecryptable()
+        return UNDECRYPTABLE
+
+def decrypt(value: str) -> str:
+    if not value:
+        return value
+    cache = _request_cache.get()
+    if cache is None:
+        return _decrypt_uncached(value)
+    plaintext = cache.get(value)
+    if plaintext is None:
+        plaintext = _decrypt_uncached(value)
+        cache.put(value, plaintext)
+    return plaintext
+
+def decrypt_many(values) -> list:
+    """Decrypt a batch of ciphertexts, decrypting each distinct value once"""
+    cache = _request_cache.get()
+    plaintexts = {}
+    for value in values:
+        if not value or value in plaintexts:
+            continue
+        plaintext = cache.get(value) if cache is not None else None
+        if plaintext is None:
+            plaintext = _decrypt_uncached(value)
+            if cache is not None:
+                cache.put(value, plaintext)
+        plaintexts[value] = plaintext
+    return [plaintexts.get(value, value) for value in values]
+
+class EncryptedString(TypeDecorator):
+    """String column stored as Fernet ciphertext; reads return plaintext
+
+    Ciphertext is randomized, so SQL comparisons (==, LIKE, ORDER BY) on these columns
+    are meaningless: search them through the blind index in search.py instead.
+    """
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value == UNDECRYPTABLE:
+            raise ValueError("Refusing to store the undecryptable-value marker over encrypted PHI")
+        return encrypt(str(value))
+
+    def process_result_value(self, value, dialect):
+        return decrypt(value)
+
+class EncryptedText(EncryptedString):
+    impl = Text
+    cache_ok = True
@@ -0,0 +1,227 @@
+# --- PHI Key Rotation ---
+# Online re-encryption of the encrypted PHI columns with the primary key from ENCRYPTION_KEYS.
+# Each target table is walked in keyset-paginated batches, one short transaction per batch:
+# no table locks, and a row changed by a clinician since it was read is skipped (their write
+# already used the primary key). Batches are throttled to PHI_REENCRYPT_ROWS_PER_SECOND and
+# the position is checkpointed in phi_reencryption_checkpoints, so the job resumes where it
+# stopped. Uploaded files are stored unencrypted; once they are, they become another target.
+from datetime import datetime
+from cryptography.fernet import InvalidToken
+from sqlalchemy import and_, column, select, table, text, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+import database
+import logging
+import os
+import threading
+import time
+import models
+import phi
+
+logger = logging.getLogger(__name__)
+
+PHI_REENCRYPT_BATCH_SIZE = int(os.getenv("PHI_REENCRYPT_BATCH_SIZE", 200))  # Rows per transaction
+PHI_REENCRYPT_ROWS_PER_SECOND = float(os.getenv("PHI_REENCRYPT_ROWS_PER_SECOND", 500))  # Scan rate limit (0 = unthrottled)
+PHI_REENCRYPT_LOCK_TIMEOUT_MS = int(os.getenv("PHI_REENCRYPT_LOCK_TIMEOUT_MS", 2000))  # PostgreSQL: give way to clinician writes
+
+# Tables with encrypted columns, walked in this order
+TARGET_MODELS = {
+    "patients": models.Patient,
+}
+
+def _target_table(model):
+    """Untyped table clause for a model's encrypted columns
+
+    Values pass through as stored ciphertext (no EncryptedString processing) and
+    updates leave ORM onupdate columns such as updated_at alone.
+    """
+    names = [c.name for c in model.__table__.columns if isinstance(c.type, phi.EncryptedString)]
+    return table(model.__tablename__, column("id"), *(column(name) for name in names)), names
+
+def verify_keys(db: Session):
+    """Refuse to run with keys that cannot read the data already stored
+
+    Checks the first and last patients with encrypted values, and that the blind-index
+    key is the one patient_search_tokens were built with. Raises RuntimeError, since
+    writing with the wrong key would leave two unreadable halves.
+    """
+    verify_blind_index_key(db)
+    patients, names = _target_table(models.Patient)
+    for order in (patients.c.id, patients.c.id.desc()):
+        row = db.execute(select(*(patients.c[name] for name in names)).order_by(order).limit(1)).first()
+        for value in row or ():
+            if not phi.is_encrypted(value):
+                continue
+            try:
+                phi.cipher_suite.decrypt(value.encode())
+            except InvalidToken:
+                raise RuntimeError(
+                    "None of the configured ENCRYPTION_KEYS/ENCRYPTION_KEY can decrypt existing patient data; "
+                    "add the key it was written with"
+                ) from None
+
+def verify_blind_index_key(db: Session):
+    """Check BLIND_INDEX_KEY against the fingerprint recorded with the search tokens
+
+    A different key finds none of the existing tokens (encrypted-field search returns
+    nothing) and writes new ones alongside them. The fingerprint is recorded on first
+    start, or re-recorded while there are no tokens to protect.
+    """
+    recorded = db.get(models.PhiKeyFingerprint, "blind_index")
+    if recorded is not None and recorded.key_id == phi.BLIND_INDEX_KEY_ID:
+        return
+    has_tokens = db.scalar(select(models.PatientSearchToken.patient_id).limit(1)) is not None
+    if recorded is not None and has_tokens:
+        raise RuntimeError(
+            f"The blind-index key ({phi.BLIND_INDEX_KEY_ID}) is not the one the patient search tokens were built with "
+            f"({recorded.key_id}). Set BLIND_INDEX_KEY to that key (it defaults to one derived from the oldest "
+            "ENCRYPTION_KEYS entry), or rebuild the tokens (alembic downgrade/upgrade of the encryption revision)"
+        )
+    if recorded is None:
+        recorded = models.PhiKeyFingerprint(purpose="blind_index")
+        db.add(recorded)
+    recorded.key_id = phi.BLIND_INDEX_KEY_ID
+    recorded.recorded_at = datetime.utcnow()
+    db.commit()
+    logger.info(f"🔑 Recorded blind-index key {phi.BLIND_INDEX_KEY_ID} for patient search tokens")
+
+def _reencrypt_batch(db: Session, target, names: list, last_id: int, batch_size: int):
+    """Re-encrypt one batch of rows after last_id; returns (rows read, rows rewritten)"""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text(f"SET LOCAL lock_timeout = '{PHI_REENCRYPT_LOCK_TIMEOUT_MS}ms'"))
+    rows = db.execute(
+        select(target.c.id, *(target.c[name] for name in names))
+        .where(target.c.id > last_id).order_by(target.c.id).limit(batch_size)
+    ).all()
+    rewritten = 0
+    for row in rows:
+        stored = dict(zip(names, row[1:]))
+        changes = {name: phi.rotate(value) for name, value in stored.items() if phi.needs_rotation(value)}
+        if not changes:
+            continue
+        # Compare-and-set on the values read, so concurrent edits are never overwritten
+        unchanged = and_(*(target.c[name].is_not_distinct_from(value) for name, value in stored.items()))
+        result = db.execute(update(target).where(target.c.id == row[0], unchanged).values(changes))
+        rewritten += result.rowcount
+    return rows, rewritten
+
+def checkpoint_status(db: Session) -> list:
+    return [
+        {
+            "target": c.target,
+            "key_id": c.key_id,
+            "current_key": c.key_id == phi.PRIMARY_KEY_ID,
+            "last_id": c.last_id,
+            "rows_scanned": c.rows_scanned,
+            "rows_rewritten": c.rows_rewritten,
+            "started_at": c.started_at,
+            "updated_at": c.updated_at,
+            "completed_at": c.completed_at,
+        }
+        for c in db.query(models.ReencryptionCheckpoint).order_by(models.ReencryptionCheckpoint.target)
+    ]
+
+class ReencryptionJob:
+    """Moves PHI ciphertext to the primary key, in the background or in the foreground (rotate_phi_keys.py)"""
+
+    def __init__(self, batch_size: int = PHI_REENCRYPT_BATCH_SIZE, rows_per_second: float = PHI_REENCRYPT_ROWS_PER_SECOND):
+        self.batch_size = batch_size
+        self.rows_per_second = rows_per_second
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _checkpoint(self, db: Session, name: str, restart: bool):
+        checkpoint = db.get(models.ReencryptionCheckpoint, name)
+        if checkpoint is None:
+            checkpoint = models.ReencryptionCheckpoint(target=name)
+            db.add(checkpoint)
+        elif checkpoint.key_id == phi.PRIMARY_KEY_ID and not restart:
+            return checkpoint  # Resume (or nothing to do, if completed)
+        # New primary key (or a forced restart): walk the table from the start
+        checkpoint.key_id = phi.PRIMARY_KEY_ID
+        checkpoint.last_id = 0
+        checkpoint.rows_scanned = 0
+        checkpoint.rows_rewritten = 0
+        checkpoint.started_at = checkpoint.updated_at = datetime.utcnow()
+        checkpoint.completed_at = None
+        db.commit()
+        return checkpoint
+
+    def _run_target(self, db: Session, name: str, model, restart: bool):
+        target, names = _target_table(model)
+        checkpoint = self._checkpoint(db, name, restart)
+        if checkpoint.completed_at is not None:
+            logger.info(f"🔑 {name}: already re-encrypted with key {phi.PRIMARY_KEY_ID}")
+            return
+        logger.info(f"🔑 {name}: re-encrypting with key {phi.PRIMARY_KEY_ID} from id {checkpoint.last_id}")
+
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                rows, rewritten = _reencrypt_batch(db, target, names, checkpoint.last_id, self.batch_size)
+            except OperationalError as e:
+                # Lock timeout or a dropped connection: back off and retry the same batch
+                db.rollback()
+                logger.warning(f"⚠️ {name}: batch after id {checkpoint.last_id} failed, retrying: {e.orig}")
+                self._stop.wait(1)
+                continue
+
+            # The checkpoint commits with the batch, so a crash never skips rows
+            checkpoint.updated_at = datetime.utcnow()
+            if not rows:
+                checkpoint.completed_at = checkpoint.updated_at
+                db.commit()
+                logger.info(f"✅ {name}: {checkpoint.rows_rewritten} of {checkpoint.rows_scanned} row(s) re-encrypted")
+                return
+            checkpoint.last_id = rows[-1][0]
+            checkpoint.rows_scanned += len(rows)
+            checkpoint.rows_rewritten += rewritten
+            db.commit()
+
+            if self.rows_per_second > 0:
+                self._stop.wait(max(0.0, len(rows) / self.rows_per_second - (time.monotonic() - started)))
+
+    def run(self, restart: bool = False):
+        """Re-encrypt every target (blocking); stop() makes it return after the current batch"""
+        with self._lock:
+            if self._running:
+                raise RuntimeError("PHI re-encryption is already running")
+            self._running = True
+        self._stop.clear()
+        db = database.SessionLocal()
+        try:
+            for name, model in TARGET_MODELS.items():
+                if self._stop.is_set():
+                    break
+                self._run_target(db, name, model, restart)
+        finally:
+            db.close()
+            self._running = False
+
+    def _run_logged(self, restart: bool):
+        try:
+            self.run(restart)
+        except Exception as e:
+            logger.error(f"PHI re-encryption failed: {e}")
+
+    def start(self, restart: bool = False) -> bool:
+        """Run in a background thread; False if a run is already in progress"""
+        if self._running or (self._thread is not None and self._thread.is_alive()):
+            return False
+        self._thread = threading.Thread(target=self._run_logged, args=(restart,), name="phi-reencryption", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+reencryption_job = ReencryptionJob()
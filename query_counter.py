@@ -0,0 +1,46 @@
+# --- SQL Query Counter ---
+# Counts statements sent to the database so read paths can be checked for N+1
+# regressions (tests/test_patient_queries.py, benchmark_patient_queries.py).
+from sqlalchemy import event
+
+class QueryCountExceeded(AssertionError):
+    pass
+
+class QueryCounter:
+    """
+    Context manager counting the SQL statements executed on an engine while it is open.
+
+        with QueryCounter(engine) as counter:
+            crud.get_patients(db)
+        print(counter.count, counter.statements)
+    """
+
+    def __init__(self, engine, max_queries: int = None):
+        self.engine = engine
+        self.max_queries = max_queries
+        self.statements = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        if exc_type is None and self.max_queries is not None and self.count > self.max_queries:
+            listing = "\n".join(f"  {i + 1}. {s.splitlines()[0]}" for i, s in enumerate(self.statements))
+            raise QueryCountExceeded(
+                f"Expected at most {self.max_queries} queries, got {self.count}:\n{listing}"
+            )
+        return False
+
+def assert_max_queries(engine, max_queries: int):
+    """QueryCounter that raises QueryCountExceeded on exit if more than max_queries ran"""
+    return QueryCounter(engine, max_queries=max_queries)
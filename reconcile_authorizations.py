@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Rebuild the authorization unit ledger from the services table.
+
+Every attended service uses one unit of the authorization covering its date. The app
+keeps authorizations.units_used up to date as attendance is recorded; run this after
+writes that bypass it (SQL fixes, data loads) or on a schedule to correct any drift.
+It runs in one transaction; attendance being recorded meanwhile waits for it to finish.
+
+Usage:
+    python reconcile_authorizations.py
+"""
+import argparse
+import logging
+from database import SessionLocal
+import authorization_ledger
+
+def main():
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    db = SessionLocal()
+    try:
+        result = authorization_ledger.reconcile(db)
+    finally:
+        db.close()
+    print(f"📒 {result['services_charged']} attended service(s) charged across {result['authorizations']} "
+          f"authorization(s); {result['authorizations_corrected']} balance(s) corrected")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Re-encrypt stored PHI with the primary (first) key in ENCRYPTION_KEYS.
+
+Rotating the PHI encryption key:
+    1. Generate a key:  python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
+    2. Put it first:    ENCRYPTION_KEYS=<new key>,<old key>   and restart the app (new writes use it)
+    3. Run this script. It is throttled, runs alongside the live app and resumes
+       from its checkpoint if stopped (Ctrl-C) and started again
+    4. Once --status shows every table completed with the new key, remove the old key.
+       If BLIND_INDEX_KEY is not set, pin it first (--print-blind-index-key): by default
+       it is derived from the oldest key, and the app refuses to start if the search
+       tokens were built with a different blind-index key
+
+Usage:
+    python rotate_phi_keys.py                        # run, or resume an interrupted run
+    python rotate_phi_keys.py --status
+    python rotate_phi_keys.py --rate 200 --batch-size 100
+    python rotate_phi_keys.py --restart              # walk every table again from the start
+"""
+import argparse
+import logging
+from database import SessionLocal
+import phi
+import phi_rotation
+
+def print_status():
+    db = SessionLocal()
+    try:
+        print(f"🔑 Primary key: {phi.PRIMARY_KEY_ID}  (configured: {', '.join(phi.KEY_IDS)}); "
+              f"blind-index key: {phi.BLIND_INDEX_KEY_ID}")
+        checkpoints = phi_rotation.checkpoint_status(db)
+    finally:
+        db.close()
+    if not checkpoints:
+        print("   No re-encryption has run yet")
+    for c in checkpoints:
+        state = "completed" if c["completed_at"] else f"in progress (last id {c['last_id']})"
+        key_note = "" if c["current_key"] else " - older key, re-run to rotate to the primary key"
+        print(f"   {c['target']}: key {c['key_id']} {state}, "
+              f"{c['rows_rewritten']} of {c['rows_scanned']} row(s) rewritten{key_note}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="Show checkpoints and exit")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints for the current key")
+    parser.add_argument("--batch-size", type=int, default=phi_rotation.PHI_REENCRYPT_BATCH_SIZE)
+    parser.add_argument("--rate", type=float, default=phi_rotation.PHI_REENCRYPT_ROWS_PER_SECOND,
+                        help="Rows scanned per second (0 = unthrottled)")
+    parser.add_argument("--print-blind-index-key", action="store_true",
+                        help="Print the blind-index key in use, to pin it as BLIND_INDEX_KEY")
+    args = parser.parse_args()
+
+    if args.print_blind_index_key:
+        print(phi.BLIND_INDEX_KEY)
+        return
+    if args.status:
+        print_status()
+        return
+    if phi.EPHEMERAL_KEY:
+        parser.error("ENCRYPTION_KEYS (or ENCRYPTION_KEY) is not set")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    db = SessionLocal()
+    try:
+        phi_rotation.verify_keys(db)
+    finally:
+        db.close()
+
+    job = phi_rotation.ReencryptionJob(batch_size=args.batch_size, rows_per_second=args.rate)
+    try:
+        job.run(restart=args.restart)
+    except KeyboardInterrupt:
+        print("⏸️  Stopped; run again to resume from the last checkpoint")
+    print_status()
+
+if __name__ == "__main__":
+    main()
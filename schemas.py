@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, computed_field, validator
 from datetime import datetime, date
 from typing import Optional, List
 
@@ -49,6 +49,20 @@ class Patient(PatientBase):
     class Config:
         from_attributes = True
 
+class PatientSummary(BaseModel):
+    """Patient table row: no PHI blobs (address, diagnosis, notes) and no authorizations"""
+    id: int
+    patient_number: str
+    first_name: str
+    last_name: str
+    phone: Optional[str] = None
+    insurance: Optional[str] = None
+    auth_end_date: Optional[date] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 # Authorization Schemas
 class AuthorizationBase(BaseModel):
     # Make auth_number optional and integer type
@@ -91,9 +105,18 @@ class AuthorizationUpdate(AuthorizationBase):
 class Authorization(AuthorizationBase):
     id: int
     patient_id: int
+    units_used: int = 0  # Attended services charged to it (maintained by authorization_ledger.py)
     created_at: datetime
     updated_at: datetime
     
+    @computed_field
+    @property
+    def units_remaining(self) -> Optional[int]:
+        """Negative when more services were attended than authorized"""
+        if self.auth_units is None:
+            return None
+        return self.auth_units - self.units_used
+    
     class Config:
         from_attributes = True
 
@@ -182,6 +205,11 @@ class ServiceCreate(BaseModel):
     recurring_end_date: Optional[date] = None
     parent_service_id: Optional[int] = None
 
+# Calendar view: a service with its patient's name already joined in
+class CalendarService(Service):
+    patient_name: str
+    patient_number: str
+
 # New schemas for attendance-based services
 class AttendanceWeekCreate(BaseModel):
     service_type: str  # PSR or TMS
@@ -189,6 +217,32 @@ class AttendanceWeekCreate(BaseModel):
     selected_days: List[int]  # Days of the week [0=Monday, 1=Tuesday, ..., 4=Friday]
     service_time: str
 
+class AttendanceRosterEntry(BaseModel):
+    patient_id: int
+    selected_days: List[int]  # Days of the week [0=Monday, 1=Tuesday, ..., 4=Friday]
+
+class AttendanceRosterCreate(BaseModel):
+    service_type: str  # PSR or TMS
+    week_start_date: date  # Start of the week (Monday)
+    service_time: str
+    entries: List[AttendanceRosterEntry]  # One entry per patient in the group
+
+class ResumableUploadCreate(BaseModel):
+    filename: str
+    length: int = Field(ge=0)  # Total size in bytes (tus Upload-Length)
+    content_type: Optional[str] = None  # Guessed from the filename when omitted
+
+class PatientFile(BaseModel):
+    id: str
+    filename: str
+    size: int
+    content_type: str
+    sha256: str
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 class AttendanceEntry(BaseModel):
     id: int
     patient_id: int
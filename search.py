@@ -0,0 +1,270 @@
+# --- Patient Search Engine ---
+# Plaintext fields are matched by substring:
+#   PostgreSQL: trigram (pg_trgm) GIN index over a single search document expression,
+#   created by the alembic migration "add_patient_search_index".
+#   SQLite (local/test runs): in-process n-gram index, updated when a session commits
+#   patient changes. It is a single-process dev/test fallback: each worker process keeps
+#   its own copy and only sees its own writes, so run several workers on PostgreSQL only.
+# Encrypted fields (phi.BLIND_INDEX_FIELDS) are matched by word prefix or exact
+# identifier through HMAC tokens in patient_search_tokens, also kept in sync by ORM events.
+from collections import defaultdict
+from sqlalchemy import and_, case, delete, event, func, insert, inspect, literal_column, or_, select
+from sqlalchemy.orm import Session, object_session
+import threading
+import models
+import phi
+
+# Default and maximum page size for search results
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_RESULTS = 100
+
+# Plaintext columns searched by substring, in the same order as the PostgreSQL index expression
+SEARCH_FIELDS = [
+    "patient_number",
+    "insurance",
+    "referal",
+]
+
+# The indexed expression. Must stay byte-for-byte identical to the migration so
+# PostgreSQL's planner matches it to ix_patients_search_trgm.
+SEARCH_DOCUMENT_SQL = "lower(" + " || ' ' || ".join(
+    f"coalesce({field}, '')" for field in SEARCH_FIELDS
+) + ")"
+
+NGRAM_SIZE = 3
+
+def _normalize(value) -> str:
+    return str(value).lower() if value else ""
+
+def _ngrams(text: str) -> set:
+    """Split text into overlapping n-grams (text shorter than NGRAM_SIZE yields nothing)"""
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+def _rank(fields: list, query: str) -> int:
+    """Rank tier: 2 = exact patient number, 1 = some field starts with the query, 0 = substring"""
+    if fields[0] == query:
+        return 2
+    if any(field.startswith(query) for field in fields):
+        return 1
+    return 0
+
+class NgramIndex:
+    """Pure-Python n-gram inverted index over the patient search fields"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(set)  # n-gram -> patient ids
+        self._documents = {}               # patient id -> (normalized field values, joined document)
+        self.loaded = False
+
+    def load(self, db: Session):
+        columns = [getattr(models.Patient, field) for field in SEARCH_FIELDS]
+        rows = db.query(models.Patient.id, *columns).yield_per(5000)
+        with self._lock:
+            self._postings.clear()
+            self._documents.clear()
+            for row in rows:
+                self._add(row[0], row[1:])
+            self.loaded = True
+
+    def _add(self, patient_id: int, values):
+        fields = [_normalize(v) for v in values]
+        document = " ".join(fields)
+        self._documents[patient_id] = (fields, document)
+        for gram in _ngrams(document):
+            self._postings[gram].add(patient_id)
+
+    def _remove(self, patient_id: int):
+        entry = self._documents.pop(patient_id, None)
+        if entry is None:
+            return
+        for gram in _ngrams(entry[1]):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(patient_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def upsert_values(self, patient_id: int, values: dict):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._remove(patient_id)
+            self._add(patient_id, [values.get(field) for field in SEARCH_FIELDS])
+
+    def remove(self, patient_id: int):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._remove(patient_id)
+
+    def search(self, query: str) -> list:
+        """Return (-rank, patient number, patient id) for each match, best match first"""
+        query = _normalize(query)
+        with self._lock:
+            grams = _ngrams(query)
+            if grams:
+                # Intersect postings, starting from the rarest n-gram
+                postings = sorted((self._postings.get(g, set()) for g in grams), key=len)
+                candidates = set(postings[0])
+                for ids in postings[1:]:
+                    candidates &= ids
+                    if not candidates:
+                        break
+            else:
+                candidates = self._documents.keys()
+
+            matches = []
+            for patient_id in candidates:
+                fields, document = self._documents[patient_id]
+                # n-gram intersection can over-match; confirm the real substring
+                if query in document:
+                    matches.append((-_rank(fields, query), fields[0], patient_id))
+        matches.sort()
+        return matches
+
+ngram_index = NgramIndex()
+
+def search_token_rows(patient_id: int, values: dict) -> list:
+    """patient_search_tokens rows for a patient's plaintext field values (for bulk inserts)"""
+    tokens = set()
+    for field in phi.BLIND_INDEX_FIELDS:
+        tokens |= phi.blind_index_tokens(field, values.get(field))
+    return [{"token": token, "patient_id": patient_id} for token in tokens]
+
+def insert_search_tokens(connection, patients: list):
+    """Blind-index tokens for patients bulk-inserted with Core (dicts with id and plaintext values)
+
+    ORM events don't fire for Core inserts; after committing, also pass each patient
+    to ngram_index.upsert_values.
+    """
+    rows = [token for patient in patients for token in search_token_rows(patient["id"], patient)]
+    if rows:
+        connection.execute(insert(models.PatientSearchToken), rows)
+
+def _write_search_tokens(connection, patient: models.Patient):
+    rows = search_token_rows(patient.id, {field: getattr(patient, field) for field in phi.BLIND_INDEX_FIELDS})
+    if rows:
+        connection.execute(insert(models.PatientSearchToken), rows)
+
+def _delete_search_tokens(connection, patient_id: int):
+    connection.execute(delete(models.PatientSearchToken).where(models.PatientSearchToken.patient_id == patient_id))
+
+def _queue_ngram_change(target: models.Patient, deleted: bool = False):
+    """Record a flushed patient change; the n-gram index applies it when the session commits"""
+    session = object_session(target)
+    if session is None or not ngram_index.loaded:
+        return
+    values = None if deleted else {field: getattr(target, field) for field in SEARCH_FIELDS}
+    session.info.setdefault("ngram_pending", {})[target.id] = values
+
+@event.listens_for(Session, "after_commit")
+def _apply_ngram_changes(session):
+    for patient_id, values in session.info.pop("ngram_pending", {}).items():
+        if values is None:
+            ngram_index.remove(patient_id)
+        else:
+            ngram_index.upsert_values(patient_id, values)
+
+@event.listens_for(Session, "after_rollback")
+def _drop_ngram_changes(session):
+    session.info.pop("ngram_pending", None)
+
+@event.listens_for(models.Patient, "after_insert")
+def _index_new_patient(mapper, connection, target):
+    _queue_ngram_change(target)
+    _write_search_tokens(connection, target)
+
+@event.listens_for(models.Patient, "after_update")
+def _index_patient(mapper, connection, target):
+    _queue_ngram_change(target)
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in phi.BLIND_INDEX_FIELDS):
+        _delete_search_tokens(connection, target.id)
+        _write_search_tokens(connection, target)
+
+@event.listens_for(models.Patient, "after_delete")
+def _unindex_patient(mapper, connection, target):
+    _queue_ngram_change(target, deleted=True)
+    # ON DELETE CASCADE covers PostgreSQL; SQLite runs without foreign key enforcement
+    _delete_search_tokens(connection, target.id)
+
+def _blind_index_match(query: str):
+    """Filter on patients whose encrypted fields match the query, or None if nothing is searchable"""
+    word_tokens, identifier_tokens = phi.query_tokens(query)
+    token = models.PatientSearchToken
+
+    def has_token(tokens):
+        return models.Patient.id.in_(select(token.patient_id).where(token.token.in_(sorted(tokens))))
+
+    conditions = []
+    if word_tokens:
+        conditions.append(and_(*(has_token(tokens) for tokens in word_tokens)))
+    if identifier_tokens:
+        conditions.append(has_token(identifier_tokens))
+    return or_(*conditions) if conditions else None
+
+def _clamp_limit(limit: int) -> int:
+    return max(1, min(limit or SEARCH_DEFAULT_LIMIT, SEARCH_MAX_RESULTS))
+
+def _search_postgresql(db: Session, query: str, skip: int, limit: int, options: tuple = ()):
+    document = literal_column(SEARCH_DOCUMENT_SQL)
+    term = query.lower()
+    # Escape LIKE wildcards so user input is matched literally
+    pattern = term.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    starts_with = [func.lower(getattr(models.Patient, field)).like(f"{pattern}%", escape="!") for field in SEARCH_FIELDS]
+
+    substring_match = document.like(f"%{pattern}%", escape="!")
+    blind_match = _blind_index_match(query)
+    if blind_match is not None:
+        starts_with.append(blind_match)
+
+    rank = case(
+        (func.lower(models.Patient.patient_number) == term, 2),
+        (or_(*starts_with), 1),
+        else_=0
+    )
+    # Encrypted names cannot be sorted in SQL; ties are ordered by patient number
+    return db.query(models.Patient).options(*options).filter(
+        substring_match if blind_match is None else or_(substring_match, blind_match)
+    ).order_by(
+        rank.desc(),
+        func.similarity(document, term).desc(),
+        models.Patient.patient_number,
+        models.Patient.id
+    ).offset(skip).limit(limit).all()
+
+def _search_ngram(db: Session, query: str, skip: int, limit: int, options: tuple = ()):
+    if not ngram_index.loaded:
+        ngram_index.load(db)
+    matches = {match[2]: match for match in ngram_index.search(query)}
+    blind_match = _blind_index_match(query)
+    if blind_match is not None:
+        for patient_id, patient_number in db.query(models.Patient.id, models.Patient.patient_number).filter(blind_match):
+            # A blind-index hit is a prefix (or exact identifier) match: rank 1
+            rank = min(matches[patient_id][0], -1) if patient_id in matches else -1
+            matches[patient_id] = (rank, _normalize(patient_number), patient_id)
+    page_ids = [match[2] for match in sorted(matches.values())[skip:skip + limit]]
+    if not page_ids:
+        return []
+    patients = db.query(models.Patient).options(*options).filter(models.Patient.id.in_(page_ids)).all()
+    by_id = {p.id: p for p in patients}
+    return [by_id[pid] for pid in page_ids if pid in by_id]
+
+def search_patients(db: Session, query: str, skip: int = 0, limit: int = SEARCH_DEFAULT_LIMIT, options: tuple = ()):
+    """Ranked, paginated patient search
+
+    Plaintext fields match by case-insensitive substring; encrypted fields match by
+    word prefix (names, diagnosis, Medicaid ID) or exact identifier (SSN, insurance ID).
+
+    options are ORM loader options (e.g. selectinload) applied to the patient query.
+    """
+    query = (query or "").strip()
+    if not query:
+        return []
+    skip = max(skip or 0, 0)
+    limit = _clamp_limit(limit)
+
+    if db.get_bind().dialect.name == "postgresql":
+        return _search_postgresql(db, query, skip, limit, options)
+    return _search_ngram(db, query, skip, limit, options)
@@ -0,0 +1,70 @@
+# --- Response Serialization Helpers ---
+from datetime import datetime
+from functools import lru_cache
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# "16:30" / "08:05" style times
+TIME_24HR_PATTERN = re.compile(r"^(\d{1,2}):(\d{2})$")
+
+@lru_cache(maxsize=2048)
+def _format_time_str_12hr(value: str) -> str:
+    """Format a time string to 12-hour AM/PM (cached: sheets repeat the same few times)"""
+    # Handle empty or whitespace strings
+    if not value.strip():
+        return 'No time specified'
+    
+    # Try to parse string time like '16:30' or '08:05'
+    match = TIME_24HR_PATTERN.match(value.strip())
+    if match:
+        hour = int(match.group(1))
+        minute = int(match.group(2))
+        ampm = 'AM' if hour < 12 else 'PM'
+        hour12 = (hour % 12) or 12
+        return f"{hour12}:{minute:02d} {ampm}"
+    
+    # If it's already formatted (contains AM/PM), return as-is
+    if 'AM' in value.upper() or 'PM' in value.upper():
+        return value
+        
+    return 'No time specified'  # fallback for unrecognized format
+
+def format_time_12hr(dt):
+    """Format a datetime, time object, or string to 12-hour AM/PM string."""
+    if dt is None or dt == '':
+        return 'No time specified'
+    
+    if isinstance(dt, str):
+        return _format_time_str_12hr(dt)
+    elif isinstance(dt, datetime):
+        return dt.strftime("%I:%M %p").lstrip('0')
+    elif hasattr(dt, 'hour') and hasattr(dt, 'minute'):
+        return f"{(dt.hour % 12 or 12)}:{dt.minute:02d} {'AM' if dt.hour < 12 else 'PM'}"
+    
+    return 'No time specified'
+
+# Per-row diagnostic logging for the service sheet endpoints (very noisy; off by default)
+SHEET_DEBUG_LOGGING = os.getenv("SHEET_DEBUG_LOGGING", "False").lower() == "true"
+
+def serialize_service_rows(rows, label: str = "Service"):
+    """
+    Shared serialization for the service sheet endpoints.
+
+    Takes column rows from crud (see crud.SERVICE_SHEET_COLUMNS) and returns plain
+    dicts in the schemas.Service shape, with service_time replaced by its 12-hour
+    form (both fields are sent for frontend compatibility).
+    """
+    services = []
+    for row in rows:
+        service = row._asdict()
+        raw_time = service['service_time']
+        formatted_time = format_time_12hr(raw_time)
+        service['service_time_formatted'] = formatted_time
+        service['service_time'] = formatted_time
+        if SHEET_DEBUG_LOGGING:
+            logger.info(f"🔍 {label} {service['id']}: service_date={service['service_date']}, raw_time='{raw_time}', formatted='{formatted_time}'")
+        services.append(service)
+    return services
@@ -641,7 +641,7 @@
             document.getElementById('loading').style.display = 'block';
             
             try {
-                const response = await authenticatedFetch(`${API_BASE}/patients/`);
+                const response = await authenticatedFetch(`${API_BASE}/patients/summary`);
                 if (response && response.ok) {
                     allPatients = await response.json();
                     displayPatients(allPatients);
@@ -740,8 +740,8 @@
                         if (filesResp && filesResp.ok) {
                             const files = await filesResp.json();
                             if (files.length > 0) {
-                                filesHtml = `<div style="margin-top:20px;"><strong>Uploaded Files:</strong><ul style='margin-top:10px;'>` +
-                                    files.map(f => `<li><a href="#" onclick="openPatientFileInNewTab(${patientId}, '${f.id}', '${f.filename.replace(/'/g, "\\'")}'); return false;">${f.filename}</a></li>`).join('') +
+                                filesHtml = `<div style="margin-top:20px;"><strong>Uploaded Files:</strong> <a href="#" onclick="downloadPatientFilesArchive(${patientId}); return false;" style="margin-left:10px; font-size:0.9em;">Download all (.zip)</a><ul style='margin-top:10px;'>` +
+                                    files.map(f => `<li><a href="#" onclick="openPatientFileInNewTab(${patientId}, '${f.id}', '${f.filename.replace(/'/g, "\\'")}'); return false;">${f.filename}</a> <span style="color:#888; font-size:0.9em;">(${formatFileSize(f.size)}, ${f.content_type})</span></li>`).join('') +
                                     `</ul></div>`;
                             } else {
                                 filesHtml = `<div style='margin-top:20px; color:#888;'>No files uploaded for this patient.</div>`;
@@ -758,7 +758,7 @@
                     const uploadFormHtml = `
                         <form id=\"patientFileUploadForm\" enctype=\"multipart/form-data\" style=\"margin-top:20px;\">
                             <label><strong>Upload File for this Patient:</strong></label><br>
-                            <input type=\"file\" id=\"patientFileInput\" name=\"file\" required style=\"margin-top:8px;\" />
+                            <input type=\"file\" id=\"patientFileInput\" name=\"file\" multiple required style=\"margin-top:8px;\" />
                             <button type=\"submit\" class=\"btn btn-small\" style=\"margin-left:10px;\">Upload</button>
                             <div id=\"patientFileUploadAlert\" style=\"margin-top:10px;\"></div>
                         </form>
@@ -974,7 +974,9 @@
                                     return;
                                 }
                                 const formData = new FormData();
-                                formData.append('file', fileInput.files[0]);
+                                for (const selected of fileInput.files) {
+                                    formData.append('file', selected);
+                                }
                                 try {
                                     const resp = await fetch(`${API_BASE}/patients/${patient.id}/files`, {
                                         method: 'POST',
@@ -985,7 +987,8 @@
                                         alertDiv.innerHTML = '<span style="color:green;">File uploaded!</span>';
                                         setTimeout(() => viewPatient(patient.id), 1000);
                                     } else {
-                                        alertDiv.innerHTML = '<span style="color:red;">Upload failed.</span>';
+                                        const result = await resp.json().catch(() => ({}));
+                                        alertDiv.innerHTML = `<span style="color:red;">Upload failed${result.detail ? ': ' + result.detail : '.'}</span>`;
                                     }
                                 } catch (err) {
                                     alertDiv.innerHTML = '<span style="color:red;">Error uploading file.</span>';
@@ -1006,47 +1009,12 @@
         // Function to show services for a specific date (appointments only)
         async function showServicesByDate(dateString) {
             try {
-                // Fetch all patients
-                const patientsResponse = await authenticatedFetch(`${API_BASE}/patients/`);
-                if (!patientsResponse.ok) {
-                    showAlert('Failed to load patients', 'danger');
-                    return;
-                }
-                
-                const patients = await patientsResponse.json();
-                let servicesForDate = [];
-                
-                // Fetch appointment services for each patient on this date
-                const fetchPromises = patients.map(async patient => {
-                    try {
-                        const servicesResp = await authenticatedFetch(`${API_BASE}/patients/${patient.id}/services?service_category=appointment`);
-                        if (servicesResp.ok) {
-                            const services = await servicesResp.json();
-                            
-                            // Filter services for the specific date
-                            const dateServices = services.filter(service => service.service_date === dateString);
-                            dateServices.forEach(service => {
-                                servicesForDate.push({
-                                    ...service,
-                                    patient_name: `${patient.first_name} ${patient.last_name}`,
-                                    patient_number: patient.patient_number
-                                });
-                            });
-                        }
-                    } catch (err) {
-                        console.error(`Error fetching services for patient ${patient.id}:`, err);
-                    }
-                });
+                // Fetch the month containing this date and pick out the day
+                const [year, month] = dateString.split('-').map(Number);
+                const servicesByDate = await fetchServicesForMonth(year, month - 1);
                 
-                await Promise.all(fetchPromises);
-                
-                // Sort services by time
-                servicesForDate.sort((a, b) => {
-                    if (a.service_time && b.service_time) {
-                        return a.service_time.localeCompare(b.service_time);
-                    }
-                    return 0;
-                });
+                // Services come back sorted by time with patient_name/patient_number joined in
+                const servicesForDate = servicesByDate[dateString] || [];
                 
                 // Create modal content
                 let modalContent = `
@@ -1233,6 +1201,48 @@
         }
         window.closeSheetModal = closeSheetModal;
 
+        // Utility: Human-readable file size for the patient file list
+        function formatFileSize(bytes) {
+            if (bytes < 1024) return `${bytes} B`;
+            if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+            return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+        }
+
+        // Utility: Download all of a patient's files as one zip
+        async function downloadPatientFilesArchive(patientId) {
+            try {
+                const storedAuth = authManager.getAuth();
+                if (!storedAuth || !storedAuth.token) {
+                    showAlert('mainAlert', 'You are not authenticated. Please log in again.', 'error');
+                    window.location.href = '/static/login.html';
+                    return;
+                }
+                const response = await fetch(`${API_BASE}/patients/${patientId}/files/archive`, {
+                    method: 'GET',
+                    headers: {
+                        'Authorization': `Bearer ${storedAuth.token}`
+                    }
+                });
+                if (!response.ok) {
+                    showAlert('mainAlert', 'Failed to download files. You may not have access.', 'error');
+                    return;
+                }
+                const disposition = response.headers.get('Content-Disposition') || '';
+                const match = disposition.match(/filename="([^"]+)"/);
+                const blobUrl = window.URL.createObjectURL(await response.blob());
+                const link = document.createElement('a');
+                link.href = blobUrl;
+                link.download = match ? match[1] : `patient_${patientId}_files.zip`;
+                document.body.appendChild(link);
+                link.click();
+                link.remove();
+                setTimeout(() => window.URL.revokeObjectURL(blobUrl), 60000);
+            } catch (err) {
+                showAlert('mainAlert', 'Error downloading files.', 'error');
+            }
+        }
+        window.downloadPatientFilesArchive = downloadPatientFilesArchive;
+
         // Utility: Open patient file in new tab (view inline)
         async function openPatientFileInNewTab(patientId, fileId, filename) {
             try {
@@ -1319,39 +1329,15 @@
         // Function to fetch all services for a month
         async function fetchServicesForMonth(year, month) {
             try {
-                // Fetch all patients
-                const response = await authenticatedFetch(`${API_BASE}/patients/`);
+                // One request for the whole month; the server groups services by date
+                // and joins in patient names (month is 0-indexed here, 1-12 on the server)
+                const response = await authenticatedFetch(`${API_BASE}/calendar/${year}/${month + 1}`);
                 if (!response.ok) {
-                    console.error('Failed to load patients');
+                    console.error('Failed to load calendar services');
                     return {};
                 }
                 
-                const patients = await response.json();
-                let servicesByDate = {};
-                
-                // Fetch services for each patient (only appointment-based services for calendar)
-                const fetchPromises = patients.map(async patient => {
-                    try {
-                        const servicesResp = await authenticatedFetch(`${API_BASE}/patients/${patient.id}/services?service_category=appointment`);
-                        if (servicesResp.ok) {
-                            const services = await servicesResp.json();
-                            
-                            // Group services by date
-                            services.forEach(service => {
-                                if (!servicesByDate[service.service_date]) {
-                                    servicesByDate[service.service_date] = [];
-                                }
-                                servicesByDate[service.service_date].push(service);
-                            });
-                        }
-                    } catch (err) {
-                        console.error(`Error fetching services for patient ${patient.id}:`, err);
-                    }
-                });
-                
-                // Wait for all patient service fetches to complete
-                await Promise.all(fetchPromises);
-                return servicesByDate;
+                return await response.json();
             } catch (err) {
                 console.error('Error fetching services for month:', err);
                 return {};
@@ -1716,7 +1702,7 @@
                 suggestionsDiv.innerHTML = '';
                 return;
             }
-            const response = await authenticatedFetch(`${API_BASE}/patients/?q=${encodeURIComponent(query)}`);
+            const response = await authenticatedFetch(`${API_BASE}/patients/summary?q=${encodeURIComponent(query)}`);
             if (response && response.ok) {
                 const patients = await response.json();
                 suggestionsDiv.innerHTML = patients.map(p => `<div class='autocomplete-suggestion' data-id='${p.id}' data-name='${p.first_name} ${p.last_name}'>${p.first_name} ${p.last_name} (#${p.patient_number})</div>`).join('');
@@ -1939,7 +1925,7 @@
             }
 
             try {
-                const response = await fetch(`${API_BASE}/search/?q=${encodeURIComponent(query)}`, {
+                const response = await fetch(`${API_BASE}/search/?q=${encodeURIComponent(query)}&limit=10`, {
                     headers: {
                         'Authorization': `Bearer ${accessToken}`,
                         'Content-Type': 'application/json'
@@ -1973,7 +1959,7 @@
             }
 
             try {
-                const response = await fetch(`${API_BASE}/search/?q=${encodeURIComponent(query)}`, {
+                const response = await fetch(`${API_BASE}/search/?q=${encodeURIComponent(query)}&limit=10`, {
                     headers: {
                         'Authorization': `Bearer ${accessToken}`,
                         'Content-Type': 'application/json'
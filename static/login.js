@@ -201,7 +201,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     
                 } else {
                     console.log('❌ Login failed:', result.message);
-                    showAlert(result.message || 'Invalid username or password. Please try again.', 'error');
+                    showAlert(result.message || result.detail || 'Invalid username or password. Please try again.', 'error');
                     setLoadingState(false, loginBtn, loading);
                     
                     // Clear password field on failed login
@@ -0,0 +1,81 @@
+"""Query budgets for the patient read paths, so N+1 regressions fail the suite
+
+Each path serializes a page the way the API does (schemas.Patient with authorizations,
+or schemas.PatientSummary) inside assert_max_queries. The budgets match
+benchmark_patient_queries.py, which also reports timings.
+"""
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+import crud
+import models
+import schemas
+import search
+from query_counter import assert_max_queries
+
+PATIENTS = 50
+PAGE = 20
+
+# Queries per page for each PATIENT_AUTHORIZATIONS_LOADING mode (lazy lists are N+1 by design)
+LIST_BUDGETS = {"selectin": 2, "joined": 1}
+SEARCH_BUDGETS = {"selectin": 3, "joined": 2}  # Blind-index lookup, then the page (and its authorizations)
+SINGLE_PATIENT_BUDGETS = {"lazy": 2, "selectin": 2, "joined": 1}
+SUMMARY_BUDGET = 1
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('db')}/patients.db")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Patient), [
+            {"patient_number": f"P{i:06d}", "first_name": "Test", "last_name": f"Patient{i}"}
+            for i in range(PATIENTS)
+        ])
+        conn.execute(insert(models.Authorization), [
+            {
+                "patient_id": patient_id,
+                "auth_number": f"{patient_id}{n}",
+                "auth_units": 24,
+                "auth_start_date": date(2025, 1, 1) + timedelta(days=90 * n),
+                "auth_end_date": date(2025, 3, 31) + timedelta(days=90 * n),
+            }
+            for patient_id in range(1, PATIENTS + 1)
+            for n in range(2)
+        ])
+    # The in-process search index is built outside the counted blocks
+    search.ngram_index.loaded = False
+    with sessionmaker(bind=engine)() as db:
+        search.ngram_index.load(db)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    with sessionmaker(bind=engine)() as session:
+        yield session
+
+@pytest.mark.parametrize("strategy", sorted(LIST_BUDGETS))
+def test_patient_list(engine, db, strategy):
+    with assert_max_queries(engine, LIST_BUDGETS[strategy]):
+        patients = [schemas.Patient.model_validate(p) for p in crud.get_patients(db, limit=PAGE, strategy=strategy)]
+    assert len(patients) == PAGE
+    assert all(len(p.authorizations) == 2 for p in patients)
+
+def test_patient_summaries(engine, db):
+    with assert_max_queries(engine, SUMMARY_BUDGET):
+        summaries = [schemas.PatientSummary.model_validate(p) for p in crud.get_patient_summaries(db, limit=PAGE)]
+    assert len(summaries) == PAGE
+
+@pytest.mark.parametrize("strategy", sorted(SEARCH_BUDGETS))
+def test_patient_search(engine, db, strategy):
+    with assert_max_queries(engine, SEARCH_BUDGETS[strategy]):
+        patients = [schemas.Patient.model_validate(p) for p in crud.search_patients(db, "p00001", limit=PAGE, strategy=strategy)]
+    assert len(patients) == 10  # P000010 - P000019
+    assert all(len(p.authorizations) == 2 for p in patients)
+
+@pytest.mark.parametrize("strategy", sorted(SINGLE_PATIENT_BUDGETS))
+def test_single_patient(engine, db, strategy):
+    with assert_max_queries(engine, SINGLE_PATIENT_BUDGETS[strategy]):
+        patient = schemas.Patient.model_validate(crud.get_patient(db, 1, strategy=strategy))
+    assert len(patient.authorizations) == 2
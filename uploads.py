@@ -0,0 +1,636 @@
+# --- Patient File Storage ---
+# Uploads are parsed straight off the request stream instead of being spooled by
+# Starlette first, so the size limits apply while the bytes arrive. File data is
+# buffered into bounded chunks that are hashed and written on the threadpool, keeping
+# disk I/O off the event loop. Files are staged under .incoming until the whole batch
+# has been received (all or nothing).
+#
+# Stored content is deduplicated: each distinct file lives once under blobs/, named by
+# its SHA-256. patient_files rows (original name, size, type, hash) reference a blob,
+# and upload_blobs.ref_count counts those references. Blob files are only placed or
+# removed inside the transaction that changes the count, so the row lock on the
+# upload_blobs row orders concurrent uploads and deletions of the same content.
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+import anyio
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import ClientDisconnect
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock on partial uploads
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 1024 * 1024))  # Buffered bytes per threadpool write
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", 100 * 1024 * 1024))  # Per file
+UPLOAD_PATIENT_QUOTA_BYTES = int(os.getenv("UPLOAD_PATIENT_QUOTA_BYTES", 2 * 1024 * 1024 * 1024))  # All files of one patient
+UPLOAD_MAX_FILES_PER_REQUEST = int(os.getenv("UPLOAD_MAX_FILES_PER_REQUEST", 20))
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # Boundaries and part headers allowed on top of the file data
+RESUMABLE_UPLOAD_EXPIRE_HOURS = float(os.getenv("RESUMABLE_UPLOAD_EXPIRE_HOURS", 24))  # Since the last received chunk
+RESUMABLE_UPLOAD_SWEEP_MINUTES = float(os.getenv("RESUMABLE_UPLOAD_SWEEP_MINUTES", 30))
+UPLOAD_CACHE_MAX_AGE_SECONDS = int(os.getenv("UPLOAD_CACHE_MAX_AGE_SECONDS", 3600))  # Browser-only (private) caching of downloads
+
+INCOMING_DIR = Path(UPLOAD_DIR) / ".incoming"
+INCOMING_DIR.mkdir(parents=True, exist_ok=True)
+BLOB_DIR = Path(UPLOAD_DIR) / "blobs"
+BLOB_TRASH_DIR = BLOB_DIR / ".trash"
+
+class UploadRejected(Exception):
+    """An upload that breaks a limit or is not valid multipart (mapped to an HTTP error)"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def patient_folder(patient_id: int) -> Path:
+    return Path(UPLOAD_DIR) / str(patient_id)
+
+def blob_path(sha256: str) -> Path:
+    return BLOB_DIR / sha256[:2] / sha256[2:4] / sha256
+
+def guess_content_type(filename: str, declared: str = None) -> str:
+    if declared and declared != "application/octet-stream":
+        return declared
+    return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+def reserved_bytes(patient_id: int) -> int:
+    """Bytes reserved by a patient's open resumable uploads (blocking; call on the threadpool)"""
+    return sum(state["length"] for state in _partial_states(patient_folder(patient_id)))
+
+# --- Content-addressed blobs ---
+def place_blobs(staged: list):
+    """Move staged uploads into the blob store; content that is already stored is dropped"""
+    for row in staged:
+        path = blob_path(row["sha256"])
+        if path.exists():
+            Path(row["staged_path"]).unlink(missing_ok=True)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(row["staged_path"], path)
+
+def discard_staged(staged: list):
+    for row in staged:
+        Path(row["staged_path"]).unlink(missing_ok=True)
+
+def retire_blobs(hashes: list) -> list:
+    """Move unreferenced blobs aside until the transaction that released them commits"""
+    BLOB_TRASH_DIR.mkdir(parents=True, exist_ok=True)
+    retired = []
+    for sha256 in hashes:
+        trash_path = BLOB_TRASH_DIR / f"{sha256}.{uuid.uuid4().hex}"
+        try:
+            os.replace(blob_path(sha256), trash_path)
+        except FileNotFoundError:
+            continue
+        retired.append((sha256, trash_path))
+    return retired
+
+def restore_blobs(retired: list):
+    """The releasing transaction failed: put the blobs back"""
+    for sha256, trash_path in retired:
+        os.replace(trash_path, blob_path(sha256))
+
+def purge_blobs(retired: list):
+    for _, trash_path in retired:
+        trash_path.unlink(missing_ok=True)
+
+class IncomingFile:
+    """One file part being streamed to a staging file"""
+
+    def __init__(self, filename: str, content_type: str = None):
+        self.id = str(uuid.uuid4())
+        self.filename = filename
+        self.content_type = guess_content_type(filename, content_type)
+        self.temp_path = INCOMING_DIR / f"{self.id}.part"
+        self.size = 0
+        self.buffer = bytearray()
+        self._digest = hashlib.sha256()
+        self._handle = None
+
+    def write_chunk(self, data: bytes):
+        # Runs on the threadpool: hashlib and file writes release the GIL
+        if self._handle is None:
+            self._handle = open(self.temp_path, "wb")
+        self._digest.update(data)
+        self._handle.write(data)
+
+    async def flush(self):
+        if self.buffer:
+            data, self.buffer = bytes(self.buffer), bytearray()
+            await run_in_threadpool(self.write_chunk, data)
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def close(self):
+        if self._handle is None:
+            self._handle = open(self.temp_path, "wb")  # Empty file
+        self._handle.close()
+
+    def discard(self):
+        if self._handle is not None:
+            self._handle.close()
+        self.temp_path.unlink(missing_ok=True)
+
+    def manifest_row(self, patient_id: int) -> dict:
+        return {
+            "id": self.id,
+            "patient_id": patient_id,
+            "filename": self.filename,
+            "size": self.size,
+            "content_type": self.content_type,
+            "sha256": self.sha256,
+            "staged_path": str(self.temp_path),
+        }
+
+class _PartEvents:
+    """Collects python-multipart callbacks so they can be handled with await between writes"""
+
+    def __init__(self):
+        self.events = []
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._content_type = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": lambda: self.events.append(("end", None)),
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+    def on_part_begin(self):
+        self._disposition = b""
+        self._content_type = b""
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        self.events.append(("data", data[start:end]))
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        elif self._header_name.lower() == b"content-type":
+            self._content_type = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        filename = options.get(b"filename")
+        # Plain form fields (no filename) and empty file inputs are skipped
+        if filename:
+            self.events.append(("begin", (filename.decode("utf-8", "replace"), self._content_type.decode("latin-1") or None)))
+        else:
+            self.events.append(("begin", None))
+
+async def receive_patient_files(request, patient_id: int, stored_bytes: int) -> list:
+    """Stream every file in a multipart request into the patient's folder.
+
+    stored_bytes is the size of the patient's existing files (from the manifest).
+    Returns one manifest row (dict) per file; the caller stores or discards the staged files.
+
+    Raises UploadRejected (nothing is stored) when a file exceeds UPLOAD_MAX_FILE_BYTES,
+    the batch would exceed the patient's quota or UPLOAD_MAX_FILES_PER_REQUEST, or the
+    body is not multipart.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadRejected(400, "Expected a multipart/form-data upload")
+
+    used = stored_bytes + await run_in_threadpool(reserved_bytes, patient_id)
+    remaining = UPLOAD_PATIENT_QUOTA_BYTES - used
+    request_limit = min(remaining, UPLOAD_MAX_FILES_PER_REQUEST * UPLOAD_MAX_FILE_BYTES) + MULTIPART_OVERHEAD_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > request_limit:
+        # Reject before reading the body
+        raise UploadRejected(413, f"Upload of {content_length} bytes exceeds the {request_limit} bytes this patient may still receive")
+
+    parts = _PartEvents()
+    parser = MultipartParser(params[b"boundary"], parts.callbacks())
+    received = []
+    current = None
+    batch_bytes = 0
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except MultipartParseError:
+                raise UploadRejected(400, "Malformed multipart upload") from None
+            for kind, payload in parts.events:
+                if kind == "begin":
+                    current = None
+                    if payload:
+                        if len(received) >= UPLOAD_MAX_FILES_PER_REQUEST:
+                            raise UploadRejected(413, f"At most {UPLOAD_MAX_FILES_PER_REQUEST} files per upload")
+                        current = IncomingFile(*payload)
+                        received.append(current)
+                elif kind == "data" and current is not None:
+                    current.size += len(payload)
+                    batch_bytes += len(payload)
+                    if current.size > UPLOAD_MAX_FILE_BYTES:
+                        raise UploadRejected(413, f"{current.filename} exceeds the {UPLOAD_MAX_FILE_BYTES} byte file limit")
+                    if batch_bytes > remaining:
+                        raise UploadRejected(413, f"Upload exceeds the patient's remaining quota of {max(remaining, 0)} bytes")
+                    current.buffer += payload
+                    if len(current.buffer) >= UPLOAD_CHUNK_BYTES:
+                        await current.flush()
+                elif kind == "end" and current is not None:
+                    await current.flush()
+                    await run_in_threadpool(current.close)
+                    current = None
+            parts.events.clear()
+        parser.finalize()
+        if current is not None:
+            raise UploadRejected(400, "Incomplete multipart upload")
+        if not received:
+            raise UploadRejected(400, "No files in upload")
+        return [f.manifest_row(patient_id) for f in received]
+    except BaseException:
+        # Rejected, malformed or client went away: drop everything staged for this request
+        await run_in_threadpool(lambda: [f.discard() for f in received])
+        raise
+
+
+# --- Resumable Uploads (tus-style) ---
+# create -> PATCH chunks at Upload-Offset -> finalize. The partial file and a JSON state
+# file live in <patient folder>/.partial, so an upload survives a restart or a dropped
+# connection and is resumed from the partial file's size. Partials idle for longer than
+# RESUMABLE_UPLOAD_EXPIRE_HOURS are removed by PartialUploadSweeper.
+
+def _partial_dir(patient_id: int) -> Path:
+    return patient_folder(patient_id) / ".partial"
+
+def _partial_paths(patient_id: int, upload_id: str):
+    try:
+        upload_id = str(uuid.UUID(upload_id))
+    except ValueError:
+        raise UploadRejected(404, "Upload not found") from None
+    folder = _partial_dir(patient_id)
+    return folder / f"{upload_id}.json", folder / f"{upload_id}.part"
+
+def _partial_states(folder: Path):
+    partial_dir = folder / ".partial"
+    if not partial_dir.is_dir():
+        return []
+    states = []
+    for state_path in partial_dir.glob("*.json"):
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                states.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # Removed by a finalize/sweep in the meantime
+    return states
+
+def _expires_at(part_path: Path) -> str:
+    last_activity = datetime.utcfromtimestamp(part_path.stat().st_mtime)
+    return (last_activity + timedelta(hours=RESUMABLE_UPLOAD_EXPIRE_HOURS)).isoformat() + "Z"
+
+def create_partial_upload(patient_id: int, filename: str, length: int, username: str, stored_bytes: int,
+                          content_type: str = None) -> dict:
+    """Reserve a resumable upload of `length` bytes (blocking; call on the threadpool)"""
+    if length > UPLOAD_MAX_FILE_BYTES:
+        raise UploadRejected(413, f"{filename} exceeds the {UPLOAD_MAX_FILE_BYTES} byte file limit")
+    remaining = UPLOAD_PATIENT_QUOTA_BYTES - stored_bytes - reserved_bytes(patient_id)
+    if length > remaining:
+        raise UploadRejected(413, f"Upload exceeds the patient's remaining quota of {max(remaining, 0)} bytes")
+
+    upload_id = str(uuid.uuid4())
+    state_path, part_path = _partial_paths(patient_id, upload_id)
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    state = {
+        "id": upload_id,
+        "patient_id": patient_id,
+        "filename": filename,
+        "content_type": guess_content_type(filename, content_type),
+        "length": length,
+        "created_by": username,
+        "created_at": datetime.utcnow().isoformat() + "Z",
+    }
+    part_path.touch()
+    temp_state = state_path.with_suffix(".tmp")
+    with open(temp_state, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(temp_state, state_path)
+    return {**state, "offset": 0, "expires_at": _expires_at(part_path)}
+
+def get_partial_upload(patient_id: int, upload_id: str) -> dict:
+    """State of a resumable upload with its current offset (blocking; call on the threadpool)"""
+    state_path, part_path = _partial_paths(patient_id, upload_id)
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        offset = part_path.stat().st_size
+    except FileNotFoundError:
+        raise UploadRejected(404, "Upload not found") from None
+    return {**state, "offset": offset, "expires_at": _expires_at(part_path)}
+
+class _PartialLock:
+    """Exclusive, non-blocking lock on a partial file (one writer across all workers)"""
+
+    def __init__(self, part_path: Path):
+        self.part_path = part_path
+        self.handle = None
+
+    def __enter__(self):
+        try:
+            self.handle = open(self.part_path, "ab")
+        except FileNotFoundError:
+            raise UploadRejected(404, "Upload not found") from None
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                self.handle.close()
+                raise UploadRejected(409, "Another request is writing to this upload") from None
+        return self.handle
+
+    def __exit__(self, *exc):
+        self.handle.close()  # Releases the flock
+
+async def append_to_partial_upload(request, patient_id: int, upload_id: str, offset: int) -> int:
+    """Append the request body at `offset`; returns the new offset.
+
+    Bytes received before a dropped connection are kept, so the client can HEAD the
+    upload and resume from the returned offset.
+    """
+    state = await run_in_threadpool(get_partial_upload, patient_id, upload_id)
+    _, part_path = _partial_paths(patient_id, upload_id)
+    with _PartialLock(part_path) as handle:
+        current = part_path.stat().st_size
+        if offset != current:
+            raise UploadRejected(409, f"Upload-Offset {offset} does not match the current offset {current}")
+        buffer = bytearray()
+        try:
+            async for chunk in request.stream():
+                if current + len(buffer) + len(chunk) > state["length"]:
+                    raise UploadRejected(413, f"Chunk runs past the declared Upload-Length of {state['length']} bytes")
+                buffer += chunk
+                if len(buffer) >= UPLOAD_CHUNK_BYTES:
+                    data, buffer = bytes(buffer), bytearray()
+                    await run_in_threadpool(_append, handle, data)
+                    current += len(data)
+        except ClientDisconnect:
+            logger.info(f"📎 Upload {upload_id} interrupted at offset {current + len(buffer)}")
+        finally:
+            if buffer:
+                await run_in_threadpool(_append, handle, bytes(buffer))
+                current += len(buffer)
+    return current
+
+def _append(handle, data: bytes):
+    handle.write(data)
+    handle.flush()
+
+def finalize_partial_upload(patient_id: int, upload_id: str) -> dict:
+    """Hash the completed partial and stage it like a multipart upload (blocking; call on the threadpool)"""
+    state = get_partial_upload(patient_id, upload_id)
+    state_path, part_path = _partial_paths(patient_id, upload_id)
+    with _PartialLock(part_path):
+        offset = part_path.stat().st_size
+        if offset != state["length"]:
+            raise UploadRejected(409, f"Upload incomplete: {offset} of {state['length']} bytes received")
+        digest = hashlib.sha256()
+        with open(part_path, "rb") as f:
+            for block in iter(lambda: f.read(UPLOAD_CHUNK_BYTES), b""):
+                digest.update(block)
+        staged_path = INCOMING_DIR / f"{upload_id}.part"
+        os.replace(part_path, staged_path)
+        state_path.unlink(missing_ok=True)
+    return {
+        "id": upload_id,
+        "patient_id": patient_id,
+        "filename": state["filename"],
+        "size": state["length"],
+        "content_type": state["content_type"],
+        "sha256": digest.hexdigest(),
+        "staged_path": str(staged_path),
+    }
+
+def discard_partial_upload(patient_id: int, upload_id: str):
+    """Abort a resumable upload (blocking; call on the threadpool)"""
+    state_path, part_path = _partial_paths(patient_id, upload_id)
+    if not state_path.exists():
+        raise UploadRejected(404, "Upload not found")
+    with _PartialLock(part_path):
+        state_path.unlink(missing_ok=True)
+        part_path.unlink(missing_ok=True)
+
+def sweep_abandoned_uploads(max_age_seconds: float = None) -> int:
+    """Remove partial uploads (and staged multipart files) idle for longer than max_age_seconds"""
+    max_age_seconds = RESUMABLE_UPLOAD_EXPIRE_HOURS * 3600 if max_age_seconds is None else max_age_seconds
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    candidates = list(Path(UPLOAD_DIR).glob("*/.partial/*.part")) + list(INCOMING_DIR.glob("*.part"))
+    for part_path in candidates:
+        try:
+            if part_path.stat().st_mtime >= cutoff:
+                continue
+            with _PartialLock(part_path):
+                part_path.unlink(missing_ok=True)
+                part_path.with_suffix(".json").unlink(missing_ok=True)
+            removed += 1
+        except (OSError, UploadRejected):
+            continue  # Finalized, discarded or being written right now
+    return removed
+
+class PartialUploadSweeper:
+    """Background thread that periodically removes abandoned partial uploads"""
+
+    def __init__(self, interval_seconds: float = RESUMABLE_UPLOAD_SWEEP_MINUTES * 60):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                removed = sweep_abandoned_uploads()
+                if removed:
+                    logger.info(f"🧹 Removed {removed} abandoned partial upload(s)")
+            except Exception as e:
+                logger.error(f"Partial upload sweep failed: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="partial-upload-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+partial_upload_sweeper = PartialUploadSweeper()
+
+
+# --- Downloads (ETag, conditional GET, Range) ---
+# A file id always points at the same content, so its SHA-256 is a strong ETag. Browsers
+# may keep downloads in their private cache for UPLOAD_CACHE_MAX_AGE_SECONDS and then
+# revalidate with If-None-Match (304, no body). A single "bytes=" range is served as 206
+# so PDF viewers can fetch pages incrementally; multi-range requests get the whole file.
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+def parse_byte_range(range_header: str, size: int):
+    """(start, end) for a single byte range, None to ignore the header, or "unsatisfiable" """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    if not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if not first:  # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return "unsatisfiable"
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return "unsatisfiable"
+    return start, end
+
+class PartialFileResponse(FileResponse):
+    """206 response carrying bytes start..end (inclusive) of a file"""
+
+    def __init__(self, path, start: int, end: int, stat_result: os.stat_result, **kwargs):
+        super().__init__(path, status_code=206, stat_result=stat_result, **kwargs)
+        self.start = start
+        self.end = end
+        self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = self.end - self.start + 1
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def patient_file_response(request, path: Path, stat_result: os.stat_result, patient_file) -> Response:
+    """200, 206, 304 or 416 for a patient file download, depending on the conditional/range headers"""
+    etag = f'"{patient_file.sha256}"'
+    headers = {
+        "etag": etag,
+        "cache-control": f"private, max-age={UPLOAD_CACHE_MAX_AGE_SECONDS}",
+        "accept-ranges": "bytes",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    file_options = {
+        "headers": headers,
+        "media_type": patient_file.content_type,
+        "filename": patient_file.filename,
+        "content_disposition_type": "inline",
+    }
+    range_header = request.headers.get("range")
+    # If-Range: only honour the range if the client's copy is still current
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = parse_byte_range(range_header, stat_result.st_size)
+        if byte_range == "unsatisfiable":
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{stat_result.st_size}"})
+        if byte_range is not None:
+            return PartialFileResponse(path, *byte_range, stat_result=stat_result, **file_options)
+    return FileResponse(path, stat_result=stat_result, **file_options)
+
+
+# --- Zip archives ---
+# The archive is built while it is sent: zipfile writes into a small sink that is
+# drained after every block, and the output is not seekable, so each member gets a
+# data descriptor instead of a rewritten header. Memory stays at about one block and
+# nothing is written to disk. Content is mostly PDFs and images, so level 1 deflate.
+ARCHIVE_COMPRESS_LEVEL = 1
+
+class _ZipSink:
+    """Write-only, unseekable buffer that zipfile writes into"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self._buffer = bytes(self._buffer), bytearray()
+        return data
+
+def archive_names(filenames: list) -> list:
+    """Original filenames made safe and unique inside one archive"""
+    names, seen = [], set()
+    for filename in filenames:
+        name = filename.replace("/", "_").replace("\\", "_").lstrip(".") or "file"
+        stem, suffix = os.path.splitext(name)
+        candidate, n = name, 1
+        while candidate.lower() in seen:
+            n += 1
+            candidate = f"{stem} ({n}){suffix}"
+        seen.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+def stream_zip(entries: list):
+    """Yield a zip of (archive name, path, created_at) entries chunk by chunk (sync; runs on the threadpool)"""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=ARCHIVE_COMPRESS_LEVEL) as archive:
+        for name, path, created_at in entries:
+            info = zipfile.ZipInfo(name, date_time=(created_at or datetime.utcnow()).timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, "rb") as source, archive.open(info, "w", force_zip64=True) as member:
+                for block in iter(lambda: source.read(UPLOAD_CHUNK_BYTES), b""):
+                    member.write(block)
+                    yield from _drained(sink)
+            yield from _drained(sink)
+    yield from _drained(sink)  # Central directory
+
+def _drained(sink: _ZipSink):
+    data = sink.drain()
+    if data:
+        yield data
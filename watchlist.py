@@ -0,0 +1,182 @@
+# --- Authorization Watchlist ---
+# Clinic-wide list of authorizations that expire within WATCHLIST_EXPIRY_DAYS or are down
+# to WATCHLIST_LOW_UNITS remaining units (see authorization_ledger.py), soonest expiry
+# first. The expiry window is a range scan on the (auth_end_date, id) indexes of
+# authorizations and patients (for patient-level authorization fields). Once a day the
+# list is stored in authorization_watchlist_entries by a background thread, so the
+# dashboard reads one indexed page of the snapshot; live=true queries the tables instead.
+from datetime import date, datetime, timedelta
+from sqlalchemy import String, and_, case, cast, delete, exists, false, func, insert, literal, null, or_, select, text, union_all
+from sqlalchemy.orm import Session
+import database
+import logging
+import os
+import threading
+import models
+
+logger = logging.getLogger(__name__)
+
+WATCHLIST_EXPIRY_DAYS = int(os.getenv("WATCHLIST_EXPIRY_DAYS", 14))  # Expiring within this many days
+WATCHLIST_LOW_UNITS = int(os.getenv("WATCHLIST_LOW_UNITS", 2))  # Active authorizations with this many units left or fewer
+WATCHLIST_CHECK_MINUTES = float(os.getenv("WATCHLIST_CHECK_MINUTES", 15))  # How often the refresher looks for a new day
+WATCHLIST_DEFAULT_PAGE_SIZE = 50
+WATCHLIST_MAX_PAGE_SIZE = 500
+
+ENTRY_COLUMNS = ["authorization_id", "patient_id", "auth_number", "auth_start_date", "auth_end_date",
+                 "auth_units", "units_used", "expiring", "low_balance"]
+
+def _labeled(*columns):
+    return [c.label(name) for c, name in zip(columns, ENTRY_COLUMNS)]
+
+def watchlist_query(today: date, expiry_days: int = WATCHLIST_EXPIRY_DAYS, low_units: int = WATCHLIST_LOW_UNITS):
+    """SELECT of watchlist rows (ENTRY_COLUMNS), computed from the live tables"""
+    horizon = today + timedelta(days=expiry_days)
+    auth = models.Authorization
+    expiring = auth.auth_end_date.between(today, horizon)
+    active = and_(
+        or_(auth.auth_start_date.is_(None), auth.auth_start_date <= today),
+        or_(auth.auth_end_date.is_(None), auth.auth_end_date >= today),
+    )
+    low_balance = and_(active, auth.auth_units.is_not(None), auth.auth_units - auth.units_used <= low_units)
+
+    def authorizations(expiring_flag):
+        return select(*_labeled(
+            auth.id, auth.patient_id, cast(auth.auth_number, String), auth.auth_start_date, auth.auth_end_date,
+            auth.auth_units, auth.units_used, expiring_flag, case((low_balance, True), else_=False),
+        ))
+
+    # Two branches rather than one OR, so the expiry window stays an index range scan
+    expiring_soon = authorizations(literal(True)).where(expiring)
+    low_later = authorizations(false()).where(
+        low_balance, or_(auth.auth_end_date > horizon, auth.auth_end_date.is_(None))
+    )
+
+    # Patients whose authorization only exists in their own auth_* fields (no units ledger)
+    patient = models.Patient
+    patients = select(*_labeled(
+        null(), patient.id, patient.auth_number, patient.auth_start_date, patient.auth_end_date,
+        patient.auth_units, null(), literal(True), false(),
+    )).where(
+        patient.auth_end_date.between(today, horizon),
+        ~exists().where(auth.patient_id == patient.id),
+    )
+    return union_all(expiring_soon, low_later, patients).subquery("watchlist")
+
+def _page_statement(source, tiebreak: list, skip: int, limit: int):
+    """One page of watchlist rows with the patient's number and name, soonest expiry first"""
+    return (
+        select(source, models.Patient.patient_number, models.Patient.first_name, models.Patient.last_name)
+        .join(models.Patient, models.Patient.id == source.c.patient_id)
+        .order_by(source.c.auth_end_date.asc().nulls_last(), *tiebreak)
+        .offset(skip).limit(limit)
+    )
+
+def _entry(row, today: date) -> dict:
+    entry = {column: getattr(row, column) for column in ENTRY_COLUMNS}
+    entry.update(
+        expiring=bool(row.expiring),
+        low_balance=bool(row.low_balance),
+        units_remaining=None if row.auth_units is None or row.units_used is None else row.auth_units - row.units_used,
+        days_left=(row.auth_end_date - today).days if row.auth_end_date else None,
+        patient_number=row.patient_number,
+        first_name=row.first_name,
+        last_name=row.last_name,
+    )
+    return entry
+
+def get_watchlist(db: Session, expiry_days: int = WATCHLIST_EXPIRY_DAYS, low_units: int = WATCHLIST_LOW_UNITS,
+                  skip: int = 0, limit: int = WATCHLIST_DEFAULT_PAGE_SIZE, live: bool = False) -> dict:
+    """A page of the watchlist: today's snapshot when it matches the settings, else the live tables"""
+    today = date.today()
+    limit = max(1, min(limit, WATCHLIST_MAX_PAGE_SIZE))
+    snapshot = None if live else db.get(models.WatchlistSnapshot, today)
+    if snapshot is not None and (snapshot.expiry_days, snapshot.low_units) == (expiry_days, low_units):
+        source = models.WatchlistEntry.__table__
+        tiebreak = [source.c.id]  # Entries were stored in expiry order
+        total = snapshot.entries
+        as_of = snapshot.computed_at
+    else:
+        source = watchlist_query(today, expiry_days, low_units)
+        tiebreak = [source.c.authorization_id.asc().nulls_last(), source.c.patient_id]
+        total = db.scalar(select(func.count()).select_from(source))
+        as_of = datetime.utcnow()
+        snapshot = None
+    rows = db.execute(_page_statement(source, tiebreak, skip, limit)).all()
+    return {
+        "snapshot": snapshot is not None,
+        "as_of": as_of,
+        "expiry_days": expiry_days,
+        "low_units": low_units,
+        "total": total,
+        "skip": skip,
+        "limit": limit,
+        "items": [_entry(row, today) for row in rows],
+    }
+
+def refresh_snapshot(db: Session, force: bool = False) -> bool:
+    """Store today's watchlist (one transaction); False if it was already up to date"""
+    today = date.today()
+    if db.get_bind().dialect.name == "postgresql":
+        # Every worker runs a refresher: the first one in does the work, the others then skip
+        db.execute(text("LOCK TABLE authorization_watchlist_snapshots IN EXCLUSIVE MODE"))
+    current = db.get(models.WatchlistSnapshot, today)
+    if current is not None and not force and (current.expiry_days, current.low_units) == (WATCHLIST_EXPIRY_DAYS, WATCHLIST_LOW_UNITS):
+        db.rollback()
+        return False
+
+    db.execute(delete(models.WatchlistEntry))
+    db.execute(delete(models.WatchlistSnapshot))
+    source = watchlist_query(today)
+    db.execute(
+        insert(models.WatchlistEntry).from_select(
+            ENTRY_COLUMNS,
+            select(*(source.c[column] for column in ENTRY_COLUMNS))
+            .order_by(source.c.auth_end_date.asc().nulls_last(),
+                      source.c.authorization_id.asc().nulls_last(), source.c.patient_id)
+        )
+    )
+    entries = db.scalar(select(func.count()).select_from(models.WatchlistEntry))
+    db.add(models.WatchlistSnapshot(
+        snapshot_date=today, computed_at=datetime.utcnow(),
+        expiry_days=WATCHLIST_EXPIRY_DAYS, low_units=WATCHLIST_LOW_UNITS, entries=entries,
+    ))
+    db.commit()
+    logger.info(f"📋 Authorization watchlist for {today}: {entries} entr{'y' if entries == 1 else 'ies'}")
+    return True
+
+class WatchlistRefresher:
+    """Background thread that stores a new watchlist snapshot once a day"""
+
+    def __init__(self, interval_seconds: float = WATCHLIST_CHECK_MINUTES * 60):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _refresh(self):
+        db = database.SessionLocal()
+        try:
+            refresh_snapshot(db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Watchlist refresh failed: {e}")
+        finally:
+            db.close()
+
+    def _run(self):
+        self._refresh()  # A snapshot for today right after startup
+        while not self._stop.wait(self.interval_seconds):
+            self._refresh()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="watchlist-refresher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+watchlist_refresher = WatchlistRefresher()